@@ -0,0 +1,103 @@
+import hashlib
+import os
+import shutil
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor
+from copy import deepcopy
+from typing import Callable, Dict, List, Optional
+
+from model import Experiment
+
+# Builds of redis-build-utils/build are cached by their content: the hash of the commit, the build script (it defines
+# the build flags) and the patches the tags of the repository are created from (see setup-redis). A build is stored
+# in <build output>/cache/<key> and is only moved there once it is complete.
+EXPERIMENTS_DIR = os.path.realpath(
+    os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+)
+
+BUILD_SCRIPT = os.path.join(EXPERIMENTS_DIR, "redis-build-utils", "build")
+
+PATCH_FILES = [
+    os.path.join(EXPERIMENTS_DIR, "patches", "redis-live-patch.patch"),
+    os.path.join(EXPERIMENTS_DIR, "patches", "redis-network-single-latencies.patch"),
+]
+
+
+def uses_generated_patches(experiment: Experiment) -> bool:
+    # The binary of generated patches is used instead of the build (see executor.create_patches).
+    return (
+        experiment.patch_generation is not None
+        and not experiment.patch.skip_patch_application
+        and not experiment.patch.skip_patch_file
+    )
+
+
+def commit_hash(experiment: Experiment) -> str:
+    # experiment.commit may be a tag or branch (e.g. livepatch)
+    return subprocess.run(
+        ["git", "rev-parse", "--verify", f"{experiment.commit}^{{commit}}"],
+        cwd=os.path.join(experiment.build.dir, experiment.build.git_dir_name),
+        check=True,
+        stdout=subprocess.PIPE,
+        text=True,
+    ).stdout.strip()
+
+
+def _file_hash(file: str) -> str:
+    if not os.path.exists(file):
+        return ""
+    with open(file, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def cache_key(experiment: Experiment) -> str:
+    parts = [commit_hash(experiment), _file_hash(BUILD_SCRIPT)] + [
+        _file_hash(patch_file) for patch_file in PATCH_FILES
+    ]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def entry_dir(experiment: Experiment) -> str:
+    # build.output is <build output>/<commit> (see executor.main)
+    return os.path.join(
+        os.path.dirname(experiment.build.output), "cache", cache_key(experiment)
+    )
+
+
+def store(build_dir: str, entry: str) -> None:
+    # Only complete builds are stored
+    os.makedirs(os.path.dirname(entry), exist_ok=True)
+    if os.path.exists(entry):
+        shutil.rmtree(build_dir)
+        return
+    os.rename(build_dir, entry)
+
+
+class BuildPipeline:
+    # Builds the commits of upcoming experiments in the background while the current experiment runs. Builds run
+    # one after another (they share the repository) on CPUs that no experiment uses.
+    def __init__(
+        self,
+        build: Callable[[Experiment, Optional[List[int]]], None],
+        cpus: List[int],
+    ):
+        self._build = build
+        self.cpus: List[int] = cpus
+        self._pool = ThreadPoolExecutor(max_workers=1)
+        # By cache entry
+        self._futures: Dict[str, Future] = {}
+
+    def submit(self, experiment: Experiment) -> None:
+        entry = entry_dir(experiment)
+        if entry not in self._futures:
+            # build sets the output of the experiment. The experiment itself gets it when it is executed.
+            self._futures[entry] = self._pool.submit(
+                self._build, deepcopy(experiment), self.cpus
+            )
+
+    def wait(self, experiment: Experiment) -> None:
+        self.submit(experiment)
+        self._futures[entry_dir(experiment)].result()
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(cancel_futures=True)
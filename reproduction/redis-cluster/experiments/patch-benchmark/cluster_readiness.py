@@ -0,0 +1,145 @@
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import redis
+import yaml
+
+from model import Experiment
+
+# Readiness of a cluster: CLUSTER INFO and INFO replication of all nodes are polled concurrently until
+#  - every node knows all nodes of the cluster and reports cluster_state:ok with all slots assigned and
+#  - every replica has master_link_status:up.
+# Then every master's replication offset is read once. A master is synchronized as soon as all its replicas
+# acknowledged at least this offset (e.g. the data that was loaded). The offsets are not compared continuously: Masters
+# ping their replicas every repl-ping-replica-period, so a master and its replicas are rarely at the same offset.
+
+CLUSTER_SLOTS = 16384
+
+POLL_INTERVAL_S = 0.1
+
+# Time the cluster gets to become ready: The base time and the time per node (e.g. to synchronize its replicas)
+READY_TIMEOUT_BASE_S = 300
+READY_TIMEOUT_PER_NODE_S = 1
+
+# Nodes that are probed at the same time
+PROBE_THREADS = 64
+
+
+def cluster_ports(experiment: Experiment) -> List[int]:
+    # Same ports as the redis-cluster-manager creates them (create_cluster.create_cluster)
+    with open(experiment.redis_cluster.config) as f:
+        cluster_config = yaml.safe_load(f)["cluster"]
+    nodes = cluster_config["masters"] * (1 + cluster_config["replicas_per_master"])
+    return list(
+        range(cluster_config["start_port"], cluster_config["start_port"] + nodes)
+    )
+
+
+def default_timeout_s(nodes: int) -> float:
+    return READY_TIMEOUT_BASE_S + READY_TIMEOUT_PER_NODE_S * nodes
+
+
+def _replication(port: int, nodes: int) -> Optional[Dict]:
+    # INFO replication of the node if it is part of the complete cluster (and its master link is up), otherwise None
+    con = redis.Redis(host="127.0.0.1", port=port, socket_timeout=1)
+    try:
+        cluster_info = con.cluster("INFO")
+        if (
+            cluster_info["cluster_state"] != "ok"
+            or int(cluster_info["cluster_slots_assigned"]) != CLUSTER_SLOTS
+            or int(cluster_info["cluster_known_nodes"]) != nodes
+        ):
+            return None
+        replication = con.info("replication")
+        if replication["role"] == "slave" and replication["master_link_status"] != "up":
+            return None
+        return replication
+    except (redis.RedisError, KeyError, ValueError):
+        # Not started (yet) or not part of the cluster (yet)
+        return None
+    finally:
+        con.close()
+
+
+def _synchronized(port: int, replicas: int, offset: int) -> bool:
+    # Whether all replicas of the master acknowledged the offset
+    con = redis.Redis(host="127.0.0.1", port=port, socket_timeout=1)
+    try:
+        replication = con.info("replication")
+        # slave<i>: {ip, port, state, offset, lag}
+        acknowledged = [
+            replication[f"slave{i}"]
+            for i in range(replication["connected_slaves"])
+            if replication[f"slave{i}"]["state"] == "online"
+            and replication[f"slave{i}"]["offset"] >= offset
+        ]
+        return len(acknowledged) >= replicas
+    except (redis.RedisError, KeyError, ValueError):
+        return False
+    finally:
+        con.close()
+
+
+def wait_until_ready(
+    ports: List[int],
+    cluster_proc: Optional[subprocess.Popen] = None,
+    timeout_s: Optional[float] = None,
+) -> float:
+    # Returns the time it took until the cluster was ready. timeout_s: Default see default_timeout_s.
+    if timeout_s is None:
+        timeout_s = default_timeout_s(len(ports))
+    start = time.monotonic()
+    # master port -> (replicas, offset to acknowledge). Set once the cluster is complete.
+    pending: Optional[Dict[int, Tuple[int, int]]] = None
+    with ThreadPoolExecutor(max_workers=min(PROBE_THREADS, len(ports))) as pool:
+        while True:
+            if pending is None:
+                replications = dict(
+                    zip(
+                        ports,
+                        pool.map(lambda port: _replication(port, len(ports)), ports),
+                    )
+                )
+                not_ready = [
+                    port
+                    for port, replication in replications.items()
+                    if not replication
+                ]
+                if len(not_ready) == 0:
+                    replica_masters = [
+                        replication["master_port"]
+                        for replication in replications.values()
+                        if replication["role"] == "slave"
+                    ]
+                    pending = {
+                        port: (
+                            replica_masters.count(port),
+                            replication["master_repl_offset"],
+                        )
+                        for port, replication in replications.items()
+                        if replication["role"] == "master"
+                    }
+            if pending is not None:
+                synchronized = list(
+                    pool.map(lambda port: _synchronized(port, *pending[port]), pending)
+                )
+                pending = {
+                    port: pending[port]
+                    for port, done in zip(list(pending), synchronized)
+                    if not done
+                }
+                if len(pending) == 0:
+                    return time.monotonic() - start
+                not_ready = list(pending)
+
+            if cluster_proc is not None and cluster_proc.poll() is not None:
+                raise RuntimeError(
+                    f"The cluster exited with {cluster_proc.returncode} before it was ready."
+                )
+            if time.monotonic() - start > timeout_s:
+                raise TimeoutError(
+                    f"The cluster was not ready after {timeout_s}s, e.g. the nodes {not_ready[:10]}."
+                )
+            time.sleep(POLL_INTERVAL_S)
@@ -1,5 +1,7 @@
+import contextlib
 import datetime
-import io
+import fcntl
+import multiprocessing
 import os
 import shutil
 import subprocess
@@ -7,18 +9,43 @@ import sys
 import tempfile
 import time
 from argparse import ArgumentParser, Namespace
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
 from multiprocessing.pool import ThreadPool
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import yaml
 
+import build_cache
+import cluster_readiness
 import crc16
 import process
+import scheduler
+import warm_cluster
+from build_cache import BuildPipeline
 from config import parse_config
 from model import Experiment
+from scheduler import Placement, ResourcePool
+from warm_cluster import WarmCluster
 
 VERBOSE = False
 
+# Concurrently executed experiments build one after another, as the builds share the build directory. Patches are
+# generated one after another per commit (see _patches_lock), they only share the output directories of the commit.
+BUILD_LOCK: Optional["multiprocessing.synchronize.Lock"] = None
+
+# Number of patches that are compiled in parallel (--patch-jobs)
+PATCH_JOBS = os.cpu_count()
+
+# Time a cluster gets to become ready (--ready-timeout-s). None scales it with the nodes (see cluster_readiness).
+READY_TIMEOUT_S: Optional[float] = None
+
+# Builds the commits of the upcoming experiments in the background (--prebuild)
+BUILD_PIPELINE: Optional[BuildPipeline] = None
+
+# CPUs of the experiment a worker executes concurrently with others (see _execute_placed). The cluster manager and
+# the data load run on them, so they do not disturb the other experiments.
+EXPERIMENT_CPUS: Optional[List[int]] = None
+
 log_buffer: List[str] = []
 
 
@@ -84,7 +111,8 @@ def _cluster_work_dir(experiment: Experiment) -> str:
 
 
 def _cluster_command(experiment: Experiment) -> List[str]:
-    return [
+    taskset = process.taskset_cpus_cmd(EXPERIMENT_CPUS) if EXPERIMENT_CPUS else []
+    return taskset + [
         "pipenv",
         "run",
         "python",
@@ -94,7 +122,22 @@ def _cluster_command(experiment: Experiment) -> List[str]:
     ]
 
 
-def build(experiment: Experiment) -> None:
+def build(
+    experiment: Experiment, cpus: Optional[List[int]] = None, background: bool = False
+) -> None:
+    # Builds are cached by commit hash, build script and patches (see build_cache).
+    # cpus: The CPUs the build runs on (taskset), e.g. to not disturb a running benchmark.
+    # background: Built by the BuildPipeline. The log of the running experiment is not written.
+    report = print if background else log
+    entry = build_cache.entry_dir(experiment)
+    if os.path.exists(entry):
+        report(f"[BUILD - Cached] {entry}")
+        experiment.build.output = entry
+        experiment.build.bin_dir = os.path.join(experiment.build.output, "build-new")
+        return
+
+    build_dir = f"{entry}.{os.getpid()}.tmp"
+    shutil.rmtree(build_dir, ignore_errors=True)
     command = [
         get_path_from_root(["redis-build-utils", "build"]),
         "--commit",
@@ -104,15 +147,34 @@ def build(experiment: Experiment) -> None:
         "--git-name",
         experiment.build.git_dir_name,
         "--output-dir",
-        experiment.build.output,
+        build_dir,
     ]
+    if cpus:
+        command = process.taskset_cpus_cmd(cpus) + command
 
-    log(f"[BUILD] {command}")
+    report(f"[BUILD] {command}")
     process.run2(command, verbose=VERBOSE)
+    build_cache.store(build_dir, entry)
+    experiment.build.output = entry
     experiment.build.bin_dir = os.path.join(experiment.build.output, "build-new")
 
 
-def create_patches(experiment: Experiment) -> bool:
+@contextlib.contextmanager
+def _patches_lock(commit: str):
+    # Held while the patches of the commit are generated. The lock file is next to the patches of the commit.
+    lock_file = get_path_from_root(
+        ["patches", "generate-redis-getPatch-patches", f"patches-{commit}.lock"]
+    )
+    with open(lock_file, "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def create_patches(experiment: Experiment, cpus: Optional[List[int]] = None) -> bool:
+    # cpus: The CPUs the patches are compiled on (taskset), e.g. to not disturb other running experiments.
     if not experiment.patch_generation:
         return False
     if experiment.patch.skip_patch_application:
@@ -132,10 +194,15 @@ def create_patches(experiment: Experiment) -> bool:
         ),
         f"{experiment.patch_generation.patches}",
         f"{experiment.commit}",
+        f"{min(PATCH_JOBS, len(cpus)) if cpus else PATCH_JOBS}",
     ]
+    if cpus:
+        command = process.taskset_cpus_cmd(cpus) + command
 
+    # Only patches that are not cached yet are generated (see generate-patches-build).
     log(f"[CREATE PATCHES] {command}")
-    process.run2(command, verbose=VERBOSE)
+    with _patches_lock(experiment.commit):
+        process.run2(command, verbose=VERBOSE)
     # We use the binary of the first compiled patch as binary for execution
     experiment.build.bin_dir = get_path_from_root(
         [
@@ -147,6 +214,7 @@ def create_patches(experiment: Experiment) -> bool:
         ]
     )
 
+    # The first N patches of the series, in the order they are applied
     experiment.patch_generation.patch_paths = [
         os.path.join(
             get_path_from_root(
@@ -156,26 +224,25 @@ def create_patches(experiment: Experiment) -> bool:
                     f"patches-{experiment.commit}",
                 ]
             ),
-            f,
+            f"livepatch-{i}.o",
         )
-        for f in os.listdir(
-            get_path_from_root(
-                [
-                    "patches",
-                    "generate-redis-getPatch-patches",
-                    f"patches-{experiment.commit}",
-                ]
-            )
-        )
-    ][0 : experiment.patch_generation.patches]
+        for i in range(1, experiment.patch_generation.patches + 1)
+    ]
 
-    # Copy all patches to the cluster directory
+    # Link all patches into the cluster directory
     experiment.redis_cluster.patches_dir = os.path.join(
         _cluster_work_dir(experiment), "patches"
     )
     os.mkdir(experiment.redis_cluster.patches_dir)
     for patch in experiment.patch_generation.patch_paths:
-        shutil.copy(patch, experiment.redis_cluster.patches_dir)
+        dst = os.path.join(
+            experiment.redis_cluster.patches_dir, os.path.basename(patch)
+        )
+        try:
+            os.link(patch, dst)
+        except OSError:
+            # E.g. the cluster directory is on another file system
+            shutil.copy(patch, dst)
     return True
 
 
@@ -204,20 +271,15 @@ def start_cluster(
 
     cluster_proc = process.run_async(
         command,
-        stdout_pipe=subprocess.PIPE,
+        stdout_pipe=None if VERBOSE else subprocess.DEVNULL,
         stderr_pipe=None if VERBOSE else subprocess.DEVNULL,
         env=_wfpatch_env(experiment, experiment_specific_benchmark_result_dir),
     )
 
-    cluster_output = io.BytesIO()
-    for c in iter(lambda: cluster_proc.stdout.read(1), b""):
-        cluster_output.write(c)
-        if "[OK] All 16384 slots covered." in cluster_output.getvalue().decode("UTF-8"):
-            break
-    cluster_output.close()
-
-    print("Cluster is ready. We start in 10s..")
-    time.sleep(10)
+    bootstrap_s = cluster_readiness.wait_until_ready(
+        cluster_readiness.cluster_ports(experiment), cluster_proc, READY_TIMEOUT_S
+    )
+    log(f"[Start Cluster] Cluster is ready after {bootstrap_s:.1f}s.")
 
     return cluster_proc
 
@@ -283,12 +345,16 @@ def load_data(experiment: Experiment, ports: List[int], cluster_status: Dict) ->
     )
     # if experiment.benchmark.incr_key_only:
     # command += process.memtier_incr_key_addition()
+    if EXPERIMENT_CPUS:
+        command = process.taskset_cpus_cmd(EXPERIMENT_CPUS) + command
     log(f"[DATA - Load Data] {command}")
     process.run2(command, verbose=VERBOSE)
 
-    sleep_time = max(len(ports) / 3, 5)
-    print(f"Cluster is loaded.. We start in {sleep_time}s..")
-    time.sleep(sleep_time)
+    # The replicas have to catch up with the loaded data
+    sync_s = cluster_readiness.wait_until_ready(
+        cluster_readiness.cluster_ports(experiment), timeout_s=READY_TIMEOUT_S
+    )
+    log(f"[DATA - Load Data] Cluster is loaded and replicated after {sync_s:.1f}s.")
 
 
 def failover(
@@ -589,7 +655,11 @@ def benchmark(
     return experiment_specific_benchmark_result_dir
 
 
-def store_metadata(experiment: Experiment, experiment_result_dir: str) -> None:
+def store_metadata(
+    experiment: Experiment,
+    experiment_result_dir: str,
+    warm: Optional[WarmCluster] = None,
+) -> None:
     output = experiment.benchmark.output
 
     if experiment.benchmark.dump_db_at_stop:
@@ -603,6 +673,9 @@ def store_metadata(experiment: Experiment, experiment_result_dir: str) -> None:
             os.path.join(experiment_result_dir, "cluster"),
             ignore=shutil.ignore_patterns("*.rdb"),
         )
+    if warm is not None:
+        # The node logs contain all experiments on the cluster.
+        warm.store_logs(os.path.join(experiment_result_dir, "cluster"))
 
 
 def notify(message: str) -> None:
@@ -626,40 +699,86 @@ def teardown_system():
     process.run2(teardown_benchmark_command, verbose=VERBOSE, exception_on_error=False)
 
 
-def execute(experiment: Experiment) -> None:
-    # Prepare system before we create a cluster
-    prepare_system()
-    # 1. Create cluster (prepares directory etc.)
-    prepare_cluster(experiment)
+def create_result_dir(experiment: Experiment) -> str:
+    # Get next free index for a result directory. Concurrent experiments may get the same index; the one that
+    # creates the directory first wins, the others try the next index.
+    specific_experiment_dir_counter = 0
+    while True:
+        if os.path.exists(experiment.benchmark.output) and any(
+            file.startswith(str(specific_experiment_dir_counter))
+            for file in os.listdir(experiment.benchmark.output)
+        ):
+            specific_experiment_dir_counter += 1
+            continue
+
+        experiment_specific_benchmark_result_dir = os.path.join(
+            experiment.benchmark.output, (f"{specific_experiment_dir_counter}")
+        )
+        try:
+            os.makedirs(experiment_specific_benchmark_result_dir)
+            return experiment_specific_benchmark_result_dir
+        except FileExistsError:
+            specific_experiment_dir_counter += 1
+
+
+def stop_warm_cluster(warm: WarmCluster) -> None:
+    if warm.alive():
+        stop_cluster(warm.experiment)
+    # The system is not torn down while a cluster is reused.
+    teardown_system()
+
+
+def execute(
+    experiment: Experiment,
+    prepare: bool = True,
+    reuse: bool = False,
+    warm: Optional[WarmCluster] = None,
+    build_cpus: Optional[List[int]] = None,
+) -> Optional[WarmCluster]:
+    # With reuse, the cluster is kept running after the experiment if it is unchanged (see warm_cluster.reusable).
+    # The returned cluster is passed to the next experiment, which reuses it if it is compatible.
+    key = warm_cluster.compatibility_key(experiment, _wfpatch_env(experiment, None))
+    if warm is not None and (warm.key != key or not warm.alive()):
+        log(f"[STOP WARM CLUSTER] {warm.work_dir}")
+        stop_warm_cluster(warm)
+        warm = None
+
+    if warm is None:
+        # Prepare system before we create a cluster
+        # Concurrent experiments prepare (and teardown) the system once for all of them.
+        if prepare:
+            prepare_system()
+        # 1. Create cluster (prepares directory etc.)
+        prepare_cluster(experiment)
+    else:
+        log(f"[RESET WARM CLUSTER] {warm.work_dir}")
+        warm.reset(experiment.redis_cluster.status_file)
 
     # 2. Compile binary
     # We use the binary of patch generation, as patches are compiled exactly for this binary.
     # If we do not have a binary of patch application, we compile our own binary...
-    if not create_patches(experiment):
-        build(experiment)
+    if not create_patches(experiment, build_cpus):
+        with BUILD_LOCK if BUILD_LOCK is not None else contextlib.nullcontext():
+            if BUILD_PIPELINE is not None:
+                BUILD_PIPELINE.wait(experiment)
+            build(experiment, build_cpus)
 
-    # Get next free index for a result directory
-    specific_experiment_dir_counter = 0
-    if os.path.exists(experiment.benchmark.output):
-        while True:
-            if any(
-                file.startswith(str(specific_experiment_dir_counter))
-                for file in os.listdir(experiment.benchmark.output)
-            ):
-                specific_experiment_dir_counter += 1
-            else:
-                break
-
-    experiment_specific_benchmark_result_dir = os.path.join(
-        experiment.benchmark.output, (f"{specific_experiment_dir_counter}")
-    )
-    os.makedirs(experiment_specific_benchmark_result_dir)
+    experiment_specific_benchmark_result_dir = create_result_dir(experiment)
 
     # 4. Start cluster
-    cluster_proc = start_cluster(experiment, experiment_specific_benchmark_result_dir)
+    if warm is None:
+        cluster_proc = start_cluster(
+            experiment, experiment_specific_benchmark_result_dir
+        )
+    else:
+        cluster_proc = warm.cluster_proc
 
     # 5. Get status of cluster (master/replicas)
     status = cluster_status(experiment)
+    if reuse and warm is None:
+        warm = WarmCluster(
+            experiment, key, cluster_proc, _cluster_work_dir(experiment), status
+        )
 
     # Get one master port
     ports = _cluster_status_master_ports(status)
@@ -680,15 +799,144 @@ def execute(experiment: Experiment) -> None:
     print("Benchmark done")
 
     # 8. Stop cluster
-    stop_cluster(experiment)
+    keep_cluster = warm is not None and warm_cluster.reusable(experiment)
+    if not keep_cluster:
+        stop_cluster(experiment)
 
-    # Teardown system after benchmarking
-    teardown_system()
+        # Teardown system after benchmarking
+        if prepare:
+            teardown_system()
 
     # 9. Store some meta data
-    store_metadata(experiment, experiment_result_dir)
+    store_metadata(experiment, experiment_result_dir, warm)
 
     write_log(os.path.join(experiment.benchmark.output, "log"))
+    return warm if keep_cluster else None
+
+
+def _init_worker(
+    verbose: bool,
+    patch_jobs: int,
+    ready_timeout_s: Optional[float],
+    build_lock: "multiprocessing.synchronize.Lock",
+) -> None:
+    global VERBOSE, PATCH_JOBS, READY_TIMEOUT_S, BUILD_LOCK
+    VERBOSE = verbose
+    PATCH_JOBS = patch_jobs
+    READY_TIMEOUT_S = ready_timeout_s
+    BUILD_LOCK = build_lock
+    # Forked workers inherit the log of the main process. It belongs to no experiment.
+    log_buffer.clear()
+
+
+def _execute_placed(
+    experiment: Experiment, counter: int, total: int, placement: Placement
+) -> Experiment:
+    global EXPERIMENT_CPUS
+    log(yaml.safe_dump(experiment.to_dict(), sort_keys=False))
+    log(f"Executing experiment {counter}/{total} ({placement})")
+    EXPERIMENT_CPUS = sorted(placement.cpus)
+    # The CPUs of the experiment are idle until its cluster is started.
+    execute(experiment, prepare=False, build_cpus=EXPERIMENT_CPUS)
+    return experiment
+
+
+def _notify_experiment(
+    counter: int, total: int, experiment: Experiment, state: str
+) -> None:
+    notify(
+        f"{counter}/{total} {experiment.benchmark.output_name} {experiment.commit} {state}"
+    )
+
+
+def execute_concurrently(
+    experiments: List[Experiment], jobs: int, resources: ResourcePool
+) -> None:
+    # Up to jobs experiments run at the same time, each in its own process. An experiment is started as soon as
+    # its CPUs, ports and memory are free (experiments that fit are started before larger ones waiting in front of
+    # them). After a failed experiment, no new experiment is started; the running ones are finished.
+    total = len(experiments)
+    pending: List[Tuple[int, Experiment, scheduler.Requirements]] = [
+        (counter, experiment, scheduler.requirements(experiment))
+        for counter, experiment in enumerate(experiments, start=1)
+    ]
+    for counter, experiment, requirements in pending:
+        if not resources.fits(requirements):
+            raise ValueError(
+                f"Experiment {counter}/{total} does not fit the resources "
+                f"({len(requirements.cpus)} CPUs, {requirements.nodes} ports, {requirements.memory_gb} GB)."
+            )
+
+    prepare_system()
+    running: Dict[Future, Tuple[int, Experiment, Placement]] = {}
+    error: Optional[Exception] = None
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(VERBOSE, PATCH_JOBS, READY_TIMEOUT_S, multiprocessing.Lock()),
+    ) as workers:
+        while len(pending) > 0 or len(running) > 0:
+            for entry in list(pending) if error is None else []:
+                counter, experiment, requirements = entry
+                if len(running) >= jobs:
+                    break
+                placement = resources.acquire(requirements)
+                if placement is None:
+                    continue
+                pending.remove(entry)
+                scheduler.place(experiment, placement)
+                print(f"Starting experiment {counter}/{total} on {placement}")
+                _notify_experiment(counter, total, experiment, "Start")
+                future = workers.submit(
+                    _execute_placed, experiment, counter, total, placement
+                )
+                running[future] = (counter, experiment, placement)
+            if error is not None:
+                pending.clear()
+            if len(running) == 0:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                counter, experiment, placement = running.pop(future)
+                resources.release(placement)
+                try:
+                    future.result()
+                    _notify_experiment(counter, total, experiment, "End")
+                except Exception as e:
+                    print(f"Experiment {counter}/{total} failed: {e}")
+                    _notify_experiment(counter, total, experiment, "ERROR")
+                    error = error or e
+    teardown_system()
+    if error is not None:
+        raise error
+
+
+def start_build_pipeline(
+    experiments: List[Experiment], cpus: Optional[List[int]]
+) -> Optional[BuildPipeline]:
+    if cpus is None:
+        used_cpus = {
+            cpu
+            for experiment in experiments
+            for cpu in scheduler.requirements(experiment).cpus
+        }
+        cpus = sorted(os.sched_getaffinity(0) - used_cpus)
+    if len(cpus) == 0:
+        print(
+            "No CPUs left for background builds. Experiments are built when they are executed."
+        )
+        return None
+
+    log(f"[BUILD PIPELINE] CPUs: {cpus}")
+    pipeline = BuildPipeline(
+        lambda experiment, cpus: build(experiment, cpus, background=True), cpus
+    )
+    # In the order of the experiments, so the build of the next experiment is the next build.
+    for experiment in experiments:
+        if not build_cache.uses_generated_patches(experiment):
+            pipeline.submit(experiment)
+    return pipeline
 
 
 def parse_args(input_args: List[str]) -> Namespace:
@@ -705,14 +953,89 @@ def parse_args(input_args: List[str]) -> Namespace:
         nargs="+",
         required=False,
     )
+
+    parser.add_argument(
+        "--jobs",
+        help="The number of experiments that are executed concurrently. Every experiment gets its own CPUs, ports and "
+        "cluster work dir (<redis_cluster.output>/lane-<n>). 1 executes the experiments one after another as "
+        "configured.",
+        type=int,
+        default=1,
+    )
+
+    parser.add_argument(
+        "--cpus",
+        help="CPUs (taskset -c format, e.g. 0-95) on which concurrent experiments are placed. "
+        "Default: all CPUs available to this process.",
+        type=scheduler.parse_cpu_list,
+        default=sorted(os.sched_getaffinity(0)),
+    )
+
+    parser.add_argument(
+        "--ports",
+        help="Port range (e.g. 7000-16999) from which concurrent experiments get the ports of their nodes. "
+        "It must not be larger than 10000 ports, as the cluster bus uses port + 10000.",
+        type=scheduler.parse_port_range,
+        default="7000-16999",
+    )
+
+    parser.add_argument(
+        "--memory-gb",
+        help="Memory shared by concurrent experiments. An experiment requires the maximum of data.max_memory_usage_gb "
+        "and benchmark.max_memory_usage_gb. Default: the memory of the machine.",
+        type=float,
+        default=scheduler.total_memory_gb(),
+    )
+
+    parser.add_argument(
+        "--reuse-cluster",
+        help="Keep the cluster running between experiments with the same commit, build and cluster config. "
+        "It is flushed before the next experiment instead of being recreated. Experiments that patch, fail over, "
+        "record the network or dump the database stop the cluster afterwards. Requires --jobs 1.",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--patch-jobs",
+        help="The number of patches that are compiled in parallel. Patches are cached by commit and index, so only "
+        "missing patches of a series are generated. With --jobs > 1, patches are compiled on the CPUs of the "
+        "experiment, at most one per CPU.",
+        type=int,
+        default=os.cpu_count(),
+    )
+
+    parser.add_argument(
+        "--ready-timeout-s",
+        help="Time a cluster gets to become ready after its start and to replicate the loaded data. Default: "
+        f"{cluster_readiness.READY_TIMEOUT_BASE_S}s + {cluster_readiness.READY_TIMEOUT_PER_NODE_S}s per node.",
+        type=float,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--prebuild",
+        help="Build the commits of upcoming experiments in the background while the current experiment runs. "
+        "Requires --jobs 1.",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--build-cpus",
+        help="CPUs (taskset -c format) of background builds. "
+        "Default: all CPUs available to this process that no experiment (cluster or benchmark) uses.",
+        type=scheduler.parse_cpu_list,
+        default=None,
+    )
     return parser.parse_args(input_args)
 
 
 def main(input_args: List[str]) -> None:
     args = parse_args(input_args)
 
-    global VERBOSE
+    global VERBOSE, PATCH_JOBS, READY_TIMEOUT_S, BUILD_PIPELINE
     VERBOSE = args.verbose
+    PATCH_JOBS = args.patch_jobs
+    READY_TIMEOUT_S = args.ready_timeout_s
 
     experiments: List[Experiment] = parse_config(args.config, args.overwrite)
 
@@ -727,26 +1050,47 @@ def main(input_args: List[str]) -> None:
             f"{experiment.commit}-{experiment.benchmark.output_name}",
         )
 
-    counter = 1
     for experiment in experiments:
         prepare_experiment_directories(experiment)
-        log(yaml.safe_dump(experiment.to_dict(), sort_keys=False))
-        log(f"Executing experiment {counter}/{len(experiments)}")
-        if not args.dry_run:
-            notify(
-                f"{counter}/{len(experiments)} {experiment.benchmark.output_name} {experiment.benchmark.output_name} {experiment.commit} Start"  # noqa: E501
-            )
-            try:
-                execute(experiment)
-            except Exception as e:
-                notify(
-                    f"{counter}/{len(experiments)} {experiment.benchmark.output_name} {experiment.benchmark.output_name} {experiment.commit} ERROR"  # noqa: E501
-                )
-                raise e
-            notify(
-                f"{counter}/{len(experiments)} {experiment.benchmark.output_name} {experiment.benchmark.output_name} {experiment.commit} End"  # noqa: E501
-            )
-        counter += 1
+
+    if args.reuse_cluster and args.jobs > 1:
+        print("--reuse-cluster is only supported with --jobs 1!")
+        exit(1)
+    if args.prebuild and args.jobs > 1:
+        print("--prebuild is only supported with --jobs 1!")
+        exit(1)
+
+    if args.jobs > 1 and not args.dry_run:
+        execute_concurrently(
+            experiments, args.jobs, ResourcePool(args.cpus, args.ports, args.memory_gb)
+        )
+        return
+
+    if args.prebuild and not args.dry_run:
+        BUILD_PIPELINE = start_build_pipeline(experiments, args.build_cpus)
+
+    counter = 1
+    warm: Optional[WarmCluster] = None
+    try:
+        for experiment in experiments:
+            log(yaml.safe_dump(experiment.to_dict(), sort_keys=False))
+            log(f"Executing experiment {counter}/{len(experiments)}")
+            if not args.dry_run:
+                _notify_experiment(counter, len(experiments), experiment, "Start")
+                try:
+                    warm = execute(experiment, reuse=args.reuse_cluster, warm=warm)
+                except Exception as e:
+                    _notify_experiment(counter, len(experiments), experiment, "ERROR")
+                    raise e
+                _notify_experiment(counter, len(experiments), experiment, "End")
+            counter += 1
+        if warm is not None:
+            log(f"[STOP WARM CLUSTER] {warm.work_dir}")
+            stop_warm_cluster(warm)
+    finally:
+        # Queued builds are cancelled. Otherwise, a failed campaign waits for them before it exits.
+        if BUILD_PIPELINE is not None:
+            BUILD_PIPELINE.shutdown()
 
 
 if __name__ == "__main__":
@@ -7,6 +7,10 @@ def taskset_cmd(start: int, end: int, step: int) -> List[str]:
     return ["taskset", "-c", f"{start}-{end}:{step}"]
 
 
+def taskset_cpus_cmd(cpus: List[int]) -> List[str]:
+    return ["taskset", "-c", ",".join(str(cpu) for cpu in cpus)]
+
+
 def timeout_cmd(timeout_min: int) -> List[str]:
     return ["timeout", "-k", "30s", f"{timeout_min}m"]
 
@@ -0,0 +1,232 @@
+import math
+import os
+from typing import Dict, List, Optional, Set
+
+import psutil
+import yaml
+
+from model import Experiment
+
+# Resources of experiments that are executed concurrently. Every experiment gets
+#  - a disjoint set of CPUs: the CPUs of its cluster (taskset of the cluster config) and of the benchmark
+#    (benchmark.taskset_*) are shifted by the same offset, a multiple of the taskset steps if possible, so the layout
+#    (e.g. cluster on odd, benchmark on even CPUs) stays the same,
+#  - a disjoint port range for its nodes,
+#  - its own cluster work dir (a lane, reused by the next experiment when the experiment is done),
+#  - its share of the memory.
+
+# The cluster bus of a node listens on its port + 10000. Port ranges must not contain bus ports of other clusters.
+CLUSTER_BUS_PORT_OFFSET = 10000
+
+
+def parse_cpu_list(cpu_list: str) -> List[int]:
+    # Same format as taskset -c, e.g. 0-47,96-143 or 1-47:2
+    cpus: Set[int] = set()
+    for part in cpu_list.split(","):
+        cpu_range, _, step = part.partition(":")
+        start, _, end = cpu_range.partition("-")
+        cpus.update(range(int(start), int(end or start) + 1, int(step or 1)))
+    return sorted(cpus)
+
+
+def parse_port_range(port_range: str) -> range:
+    # E.g. 7000-16999
+    start, _, end = port_range.partition("-")
+    ports = range(int(start), int(end or start) + 1)
+    if (
+        len(ports) > CLUSTER_BUS_PORT_OFFSET
+        or ports.stop + CLUSTER_BUS_PORT_OFFSET > 65536
+    ):
+        raise ValueError(
+            f"Port range {port_range} overlaps with the cluster bus ports (port + {CLUSTER_BUS_PORT_OFFSET})."
+        )
+    return ports
+
+
+def total_memory_gb() -> float:
+    return psutil.virtual_memory().total / 1024 / 1024 / 1024
+
+
+def _taskset_cpus(start: int, end: int, step: int) -> Set[int]:
+    return set(range(start, end + 1, step))
+
+
+class Requirements:
+    def __init__(
+        self,
+        cpus: Set[int],
+        cpu_period: int,
+        start_port: int,
+        nodes: int,
+        memory_gb: float,
+    ):
+        # CPUs as configured; the placement shifts them.
+        self.cpus: Set[int] = cpus
+        # Shifts by a multiple of the period keep the layout of the CPUs (the least common multiple of the steps).
+        self.cpu_period: int = cpu_period
+        self.start_port: int = start_port
+        self.nodes: int = nodes
+        self.memory_gb: float = memory_gb
+
+
+class Placement:
+    def __init__(
+        self, lane: int, cpu_shift: int, cpus: Set[int], ports: range, memory_gb: float
+    ):
+        self.lane: int = lane
+        self.cpu_shift: int = cpu_shift
+        self.cpus: Set[int] = cpus
+        self.ports: range = ports
+        self.memory_gb: float = memory_gb
+
+    def __str__(self):
+        return (
+            f"lane {self.lane}, CPUs {min(self.cpus)}-{max(self.cpus)} (shifted by {self.cpu_shift}), "
+            f"ports {self.ports.start}-{self.ports.stop - 1}, {self.memory_gb} GB"
+        )
+
+
+def requirements(experiment: Experiment) -> Requirements:
+    with open(experiment.redis_cluster.config) as f:
+        config = yaml.safe_load(f)
+    cluster_config = config["cluster"]
+    nodes = cluster_config["masters"] * (1 + cluster_config["replicas_per_master"])
+
+    # Same tasksets as the redis-cluster-manager creates them (create_cluster._transform)
+    taskset_config = config.get("settings", {}).get("taskset")
+    if not taskset_config:
+        raise ValueError(
+            f"{experiment.redis_cluster.config} does not pin its nodes (settings.taskset). "
+            "It cannot be executed concurrently with other experiments."
+        )
+    start: int = taskset_config.get("start", 0)
+    steps: int = taskset_config.get("steps", 1)
+    cores: int = taskset_config.get("cores", 1)
+    cpus: Set[int] = set()
+    for _ in range(nodes):
+        end = start + (cores - 1) * steps
+        cpus |= _taskset_cpus(start, end, steps)
+        if taskset_config.get("fixed"):
+            break
+        start = end + steps
+
+    cpus |= _taskset_cpus(
+        experiment.benchmark.taskset_start,
+        experiment.benchmark.taskset_end,
+        experiment.benchmark.taskset_step,
+    )
+
+    # max_memory_usage_gb is the memory of all nodes (masters and replicas), see calculate_maximum_keyspace.
+    memory_gb = max(
+        experiment.data.max_memory_usage_gb or 0,
+        experiment.benchmark.max_memory_usage_gb or 0,
+    )
+    cpu_period = math.lcm(steps, experiment.benchmark.taskset_step)
+    return Requirements(
+        cpus, cpu_period, cluster_config["start_port"], nodes, memory_gb
+    )
+
+
+class ResourcePool:
+    def __init__(self, cpus: List[int], ports: range, memory_gb: float):
+        self.cpus: Set[int] = set(cpus)
+        self.ports: range = ports
+        self.memory_gb: float = memory_gb
+
+        # By lane
+        self.placements: Dict[int, Placement] = {}
+
+    def _used_cpus(self) -> Set[int]:
+        return {cpu for placement in self.placements.values() for cpu in placement.cpus}
+
+    def _cpu_shift(self, cpus: Set[int], period: int) -> Optional[int]:
+        # The configured CPUs (shift 0) are preferred, otherwise the smallest shift that keeps the layout (a multiple
+        # of the period), otherwise the smallest shift.
+        free_cpus = self.cpus - self._used_cpus()
+        if len(free_cpus) == 0:
+            return None
+        shifts = range(min(free_cpus) - min(cpus), max(free_cpus) - max(cpus) + 1)
+        for shift in sorted(
+            shifts, key=lambda shift: (shift % period != 0, abs(shift), shift)
+        ):
+            if all(cpu + shift in free_cpus for cpu in cpus):
+                return shift
+        return None
+
+    def _ports(self, start_port: int, nodes: int) -> Optional[range]:
+        # The configured ports are preferred, otherwise the lowest free ports.
+        used = [placement.ports for placement in self.placements.values()]
+        for start in [start_port, *self.ports]:
+            ports = range(start, start + nodes)
+            if (
+                ports.start >= self.ports.start
+                and ports.stop <= self.ports.stop
+                and all(
+                    ports.stop <= other.start or ports.start >= other.stop
+                    for other in used
+                )
+            ):
+                return ports
+        return None
+
+    def acquire(self, requirements: Requirements) -> Optional[Placement]:
+        # None if the resources are not free (yet).
+        used_memory_gb = sum(
+            placement.memory_gb for placement in self.placements.values()
+        )
+        if used_memory_gb + requirements.memory_gb > self.memory_gb:
+            return None
+        cpu_shift = self._cpu_shift(requirements.cpus, requirements.cpu_period)
+        if cpu_shift is None:
+            return None
+        ports = self._ports(requirements.start_port, requirements.nodes)
+        if ports is None:
+            return None
+
+        lane = min(set(range(len(self.placements) + 1)) - set(self.placements))
+        placement = Placement(
+            lane,
+            cpu_shift,
+            {cpu + cpu_shift for cpu in requirements.cpus},
+            ports,
+            requirements.memory_gb,
+        )
+        self.placements[lane] = placement
+        return placement
+
+    def release(self, placement: Placement) -> None:
+        del self.placements[placement.lane]
+
+    def fits(self, requirements: Requirements) -> bool:
+        # Whether the experiment can be executed at all (on the otherwise idle machine)
+        return (
+            ResourcePool(list(self.cpus), self.ports, self.memory_gb).acquire(
+                requirements
+            )
+            is not None
+        )
+
+
+def place(experiment: Experiment, placement: Placement) -> None:
+    # Moves the experiment onto its resources: The cluster config is rewritten with the CPUs and ports of the placement
+    # into the directory of the lane, which becomes the output of the cluster (its work dir is <lane>/<config name>).
+    lane_dir = os.path.join(experiment.redis_cluster.output, f"lane-{placement.lane}")
+    os.makedirs(lane_dir, exist_ok=True)
+
+    with open(experiment.redis_cluster.config) as f:
+        config = yaml.safe_load(f)
+    config["settings"]["taskset"]["start"] = (
+        config["settings"]["taskset"].get("start", 0) + placement.cpu_shift
+    )
+    config["cluster"]["start_port"] = placement.ports.start
+
+    config_file = os.path.join(
+        lane_dir, os.path.basename(experiment.redis_cluster.config)
+    )
+    with open(config_file, "w") as f:
+        yaml.safe_dump(config, f, sort_keys=False)
+
+    experiment.redis_cluster.config = config_file
+    experiment.redis_cluster.output = lane_dir
+    experiment.benchmark.taskset_start += placement.cpu_shift
+    experiment.benchmark.taskset_end += placement.cpu_shift
@@ -0,0 +1,178 @@
+import os
+import shutil
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+import redis
+import yaml
+
+import build_cache
+from model import Experiment
+
+# A cluster that is kept running between compatible experiments (--reuse-cluster). Experiments are compatible if they
+# run the same binary (commit, build, patch generation) on the same cluster (config, WfPatch environment). Before an
+# experiment reuses the cluster, it is reset: the pids of the nodes are checked, the data is flushed and replicated,
+# the stats are reset and a new segment of every node log starts. The logs of an experiment's result contain the start
+# of the cluster (header) and the segment of the experiment.
+
+# Time replicas get to acknowledge the FLUSHALL of their master
+RESET_TIMEOUT_S = 60
+
+
+def compatibility_key(experiment: Experiment, env: Dict) -> Tuple:
+    # env: The environment the cluster is started with
+    return (
+        experiment.commit,
+        experiment.build.output,
+        build_cache.uses_generated_patches(experiment),
+        experiment.redis_cluster.config,
+        experiment.redis_cluster.output,
+        tuple(sorted(env.items())),
+    )
+
+
+def _cluster_config(experiment: Experiment) -> Dict:
+    with open(experiment.redis_cluster.config) as f:
+        return yaml.safe_load(f)
+
+
+def reusable(experiment: Experiment) -> bool:
+    # Whether the cluster is unchanged (except for its data) after the experiment.
+    if "network" in experiment.commit.split("-"):
+        # Network recording is enabled for the rest of the lifetime of the nodes.
+        return False
+    if experiment.benchmark.dump_db_at_stop:
+        return False
+    if (
+        experiment.patch
+        and experiment.patch.apply_patch_after_s
+        and len(experiment.patch_generation.patch_paths) > 0
+        and not experiment.patch.skip_patch_application
+    ):
+        # Patched nodes run another binary.
+        return False
+    if experiment.failover and experiment.failover.failover_after_s:
+        # Failovers change the roles and restart nodes.
+        return False
+    # Log segments require that nodes write their logs directly to the files.
+    return bool(
+        _cluster_config(experiment)
+        .get("settings", {})
+        .get("log", {})
+        .get("direct_pipe")
+    )
+
+
+def _read_pid(pid_file: str) -> Optional[int]:
+    try:
+        with open(pid_file) as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _size(file: str) -> int:
+    return os.path.getsize(file) if os.path.exists(file) else 0
+
+
+class WarmCluster:
+    def __init__(
+        self,
+        experiment: Experiment,
+        key: Tuple,
+        cluster_proc: subprocess.Popen,
+        work_dir: str,
+        status: Dict,
+    ):
+        self.key: Tuple = key
+        # The experiment that started the cluster. It is used to stop the cluster.
+        self.experiment: Experiment = experiment
+        self.cluster_proc: subprocess.Popen = cluster_proc
+        self.work_dir: str = work_dir
+
+        # Status as written by 'Status' of the redis-cluster-manager: {time: {port: {role, master_port, ...}}}
+        initial_state = status[sorted(status.keys())[0]]
+        self.masters: List[int] = [
+            port for port, node in initial_state.items() if node["role"] == "master"
+        ]
+        self.replicas: Dict[int, int] = {
+            master: len(
+                [
+                    node
+                    for node in initial_state.values()
+                    if node["master_port"] == master
+                ]
+            )
+            for master in self.masters
+        }
+        self.pids: Dict[int, Optional[int]] = {
+            port: _read_pid(self._pid_file(port)) for port in initial_state
+        }
+
+        log_config = _cluster_config(experiment).get("settings", {}).get("log", {})
+        self.log_files: List[str] = [
+            os.path.join(work_dir, str(port), log_config[name])
+            for port in initial_state
+            for name in ["stdout", "stderr"]
+            if log_config.get(name) and not os.path.isabs(log_config[name])
+        ]
+        # Start of the current segment. Everything before the first segment is the header.
+        self.log_header: Dict[str, int] = {file: _size(file) for file in self.log_files}
+        self.log_start: Dict[str, int] = dict(self.log_header)
+
+    def _pid_file(self, port: int) -> str:
+        return os.path.join(self.work_dir, str(port), "redis.pid")
+
+    def alive(self) -> bool:
+        if self.cluster_proc.poll() is not None:
+            return False
+        for port, pid in self.pids.items():
+            if pid is None or _read_pid(self._pid_file(port)) != pid:
+                return False
+            try:
+                os.kill(pid, 0)
+            except OSError:
+                return False
+        return True
+
+    def reset(self, status_file: str) -> None:
+        for master, replicas in self.replicas.items():
+            con = redis.Redis(host="127.0.0.1", port=master)
+            try:
+                con.flushall()
+                acknowledged = con.execute_command(
+                    "WAIT", replicas, RESET_TIMEOUT_S * 1000
+                )
+                if acknowledged < replicas:
+                    raise RuntimeError(
+                        f"Only {acknowledged}/{replicas} replicas of {master} acknowledged FLUSHALL."
+                    )
+            finally:
+                con.close()
+        for port in self.pids:
+            con = redis.Redis(host="127.0.0.1", port=port)
+            try:
+                con.config_resetstat()
+            finally:
+                con.close()
+
+        # Files of the previous experiment
+        status_file = os.path.join(self.work_dir, status_file)
+        if os.path.exists(status_file):
+            os.remove(status_file)
+        shutil.rmtree(os.path.join(self.work_dir, "patches"), ignore_errors=True)
+
+        self.log_start = {file: _size(file) for file in self.log_files}
+
+    def store_logs(self, cluster_result_dir: str) -> None:
+        # The logs in the result (a copy of the work dir) contain the header and the current segment only.
+        for file in self.log_files:
+            result_file = os.path.join(
+                cluster_result_dir, os.path.relpath(file, self.work_dir)
+            )
+            if not os.path.exists(file):
+                continue
+            with open(file, "rb") as src, open(result_file, "wb") as dst:
+                dst.write(src.read(self.log_header[file]))
+                src.seek(self.log_start[file])
+                shutil.copyfileobj(src, dst)
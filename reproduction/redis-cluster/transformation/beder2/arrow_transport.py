@@ -0,0 +1,44 @@
+import os
+import tempfile
+import uuid
+from contextlib import contextmanager
+from typing import Iterator
+
+import pandas as pd
+import pyarrow as pa
+
+# Files in here are kept in memory (tmpfs). Fall back to the default temp dir if it does not exist.
+SHM_DIR = "/dev/shm"
+
+
+# Descriptor of a DataFrame that was written as Arrow IPC file. Only this descriptor is sent through the queue, the
+# data itself is memory mapped by the storage thread.
+class ArrowInput:
+    def __init__(self, file: str, rows: int):
+        self.file: str = file
+        self.rows: int = rows
+
+
+def create_transport_dir() -> str:
+    return tempfile.mkdtemp(
+        prefix="beder2-", dir=SHM_DIR if os.path.isdir(SHM_DIR) else None
+    )
+
+
+def write(transport_dir: str, df: pd.DataFrame) -> ArrowInput:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    file = os.path.join(transport_dir, f"{uuid.uuid4().hex}.arrow")
+    with pa.OSFile(file, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return ArrowInput(file, table.num_rows)
+
+
+@contextmanager
+def read(arrow_input: ArrowInput) -> Iterator[pa.Table]:
+    # The table references the memory mapped file (zero-copy). It must not be used after leaving the context.
+    try:
+        with pa.memory_map(arrow_input.file) as source:
+            yield pa.ipc.open_file(source).read_all()
+    finally:
+        os.remove(arrow_input.file)
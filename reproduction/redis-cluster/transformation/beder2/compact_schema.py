@@ -0,0 +1,246 @@
+from typing import List, Tuple
+
+import duckdb
+
+# Compact physical schema (see beder2 --compact-schema):
+# - LOGICAL_SCHEMA contains the tables of queries/create.sql. They are always empty and only define the columns.
+# - COMPACT_SCHEMA contains the same tables in a compact representation. Inserts are converted while loading.
+# - main contains one view per table that decodes the compact representation, so all analysis queries keep working.
+#   The views join the run dimension to get the run_id. Queries that need to be fast use the tables in
+#   COMPACT_SCHEMA directly.
+# The names must not collide with the name of the database (e.g. compact.duckdb), DuckDB cannot bind the schema then.
+LOGICAL_SCHEMA = "beder2_logical"
+COMPACT_SCHEMA = "beder2_compact"
+
+# The run table is the dimension of all runs. Every other table only references the INTEGER surrogate key.
+RUN_TABLE = "run"
+RUN_ID = "run_id"
+RUN_KEY = "run_key"
+
+# Ports are stored as USMALLINT. A SMALLINT is too small for ports > 32767.
+PORT_COLUMNS = ["port", "master_port"]
+
+# Keys (memtier-<n>) are split into the prefix (key_prefix) and the number (key_id). The number is only split off if
+# it has no leading zeros and fits into a BIGINT, so the key can always be restored.
+KEY_COLUMNS = ["key"]
+KEY_NUMBER_PATTERN = "(0|[1-9][0-9]{0,17})$"
+
+# Repeated labels are stored as ENUM. All columns with the same name share one ENUM type (<column>_label) that
+# contains all values loaded so far. Only columns with a small domain are labels: Every new value recreates the ENUM
+# and converts all columns of the type twice. (name is not a label, it contains e.g. patch hashes and file names.)
+LABEL_COLUMNS = ["thread_name", "thread_group_name", "role", "action"]
+
+
+def _columns(
+    con: duckdb.DuckDBPyConnection, schema: str, table: str
+) -> List[Tuple[str, str]]:
+    return con.execute(
+        "SELECT column_name, data_type FROM information_schema.columns WHERE table_schema = ? AND table_name = ? "
+        "ORDER BY ordinal_position;",
+        [schema, table],
+    ).fetchall()
+
+
+def _has_run(columns: List[Tuple[str, str]]) -> bool:
+    # Tables without run_id (e.g. content addressed objects) are not joined with the run dimension.
+    return RUN_ID in [column for column, _ in columns]
+
+
+def _label_type(column: str) -> str:
+    return f"{column}_label"
+
+
+def _is_label(column: str, data_type: str) -> bool:
+    return column in LABEL_COLUMNS and data_type == "VARCHAR"
+
+
+def _compact_column_definitions(
+    table: str, columns: List[Tuple[str, str]]
+) -> List[str]:
+    definitions = []
+    for column, data_type in columns:
+        if column == RUN_ID:
+            if table == RUN_TABLE:
+                definitions.append(f"{RUN_KEY} INTEGER PRIMARY KEY")
+                definitions.append(f"{RUN_ID} VARCHAR UNIQUE")
+            else:
+                # Fails the insert if the run is not loaded yet.
+                definitions.append(f"{RUN_KEY} INTEGER NOT NULL")
+        elif column in PORT_COLUMNS and data_type == "INTEGER":
+            definitions.append(f"{column} USMALLINT")
+        elif column in KEY_COLUMNS and data_type == "VARCHAR":
+            definitions.append(f"{column}_prefix VARCHAR")
+            definitions.append(f"{column}_id BIGINT")
+        else:
+            # Labels are VARCHAR until the first values are loaded (see _update_label_type).
+            definitions.append(f"{column} {data_type}")
+    return definitions
+
+
+def _encode_expressions(table: str, columns: List[Tuple[str, str]]) -> List[str]:
+    # Selects from the input (i) joined with the run dimension (r).
+    expressions = []
+    for column, data_type in columns:
+        if column == RUN_ID:
+            if table == RUN_TABLE:
+                # New keys continue after the largest key. No sequence is used: A DEFAULT nextval(...) breaks
+                # ATTACHing the database.
+                expressions.append(
+                    f"(SELECT COALESCE(max({RUN_KEY}), 0) FROM {COMPACT_SCHEMA}.{RUN_TABLE}) + row_number() OVER () "
+                    f"AS {RUN_KEY}"
+                )
+                expressions.append(f"i.{RUN_ID}")
+            else:
+                expressions.append(f"r.{RUN_KEY}")
+        elif column in KEY_COLUMNS and data_type == "VARCHAR":
+            number = f"regexp_extract(i.{column}, '{KEY_NUMBER_PATTERN}')"
+            expressions.append(
+                f"left(i.{column}, length(i.{column}) - length({number})) AS {column}_prefix"
+            )
+            expressions.append(f"TRY_CAST({number} AS BIGINT) AS {column}_id")
+        else:
+            expressions.append(f"i.{column}")
+    return expressions
+
+
+def _decode_expressions(table: str, columns: List[Tuple[str, str]]) -> List[str]:
+    # Selects from the compact table (c) joined with the run dimension (r). The columns are in the order of the
+    # logical table.
+    expressions = []
+    for column, data_type in columns:
+        if column == RUN_ID:
+            expressions.append(f"{'c' if table == RUN_TABLE else 'r'}.{RUN_ID}")
+        elif column in PORT_COLUMNS and data_type == "INTEGER":
+            expressions.append(f"c.{column}::INTEGER AS {column}")
+        elif column in KEY_COLUMNS and data_type == "VARCHAR":
+            expressions.append(
+                f"c.{column}_prefix || COALESCE(c.{column}_id::VARCHAR, '') AS {column}"
+            )
+        elif _is_label(column, data_type):
+            expressions.append(f"c.{column}::VARCHAR AS {column}")
+        else:
+            expressions.append(f"c.{column}")
+    return expressions
+
+
+def exists(con: duckdb.DuckDBPyConnection) -> bool:
+    return COMPACT_SCHEMA in [
+        row[0]
+        for row in con.execute("SELECT schema_name FROM duckdb_schemas();").fetchall()
+    ]
+
+
+def create(con: duckdb.DuckDBPyConnection, create_sql: str, tables: List[str]):
+    con.execute(f"CREATE SCHEMA IF NOT EXISTS {LOGICAL_SCHEMA};")
+    con.execute(f"CREATE SCHEMA IF NOT EXISTS {COMPACT_SCHEMA};")
+    con.execute(f"SET schema = '{LOGICAL_SCHEMA}';")
+    try:
+        con.execute(create_sql)
+    finally:
+        con.execute("SET schema = 'main';")
+
+    for table in tables:
+        columns = _columns(con, LOGICAL_SCHEMA, table)
+        con.execute(
+            f"CREATE TABLE IF NOT EXISTS {COMPACT_SCHEMA}.{table} "
+            f"({', '.join(_compact_column_definitions(table, columns))});"
+        )
+        join = (
+            ""
+            if table == RUN_TABLE or not _has_run(columns)
+            else f" LEFT JOIN {COMPACT_SCHEMA}.{RUN_TABLE} AS r ON c.{RUN_KEY} = r.{RUN_KEY}"
+        )
+        con.execute(
+            f"CREATE OR REPLACE VIEW main.{table} AS SELECT {', '.join(_decode_expressions(table, columns))} "
+            f"FROM {COMPACT_SCHEMA}.{table} AS c{join};"
+        )
+
+
+def _label_values(con: duckdb.DuckDBPyConnection, type_name: str) -> List[str]:
+    if (
+        con.execute(
+            "SELECT count(*) FROM duckdb_types() WHERE schema_name = 'main' AND type_name = ?;",
+            [type_name],
+        ).fetchone()[0]
+        == 0
+    ):
+        return []
+    return [
+        row[0]
+        for row in con.execute(
+            f"SELECT unnest(enum_range(NULL::{type_name}));"
+        ).fetchall()
+    ]
+
+
+def _update_label_type(con: duckdb.DuckDBPyConnection, column: str, query: str):
+    # ENUM types cannot be extended. If the input contains new values, the columns are converted back to VARCHAR,
+    # the type is created again with all values and the columns are converted to the new type. This happens whenever
+    # a new value is loaded, so it is only cheap for columns whose values are known after a few runs (LABEL_COLUMNS).
+    type_name = _label_type(column)
+    values = _label_values(con, type_name)
+    new_values = [
+        row[0]
+        for row in con.execute(
+            f"SELECT DISTINCT {column}::VARCHAR AS v FROM ({query}) WHERE v IS NOT NULL ORDER BY v;"
+        ).fetchall()
+        if row[0] not in values
+    ]
+    if len(new_values) == 0:
+        return
+
+    tables = [
+        row[0]
+        for row in con.execute(
+            "SELECT table_name FROM information_schema.columns WHERE table_schema = ? AND column_name = ?;",
+            [COMPACT_SCHEMA, column],
+        ).fetchall()
+    ]
+    for table in tables:
+        con.execute(
+            f"ALTER TABLE {COMPACT_SCHEMA}.{table} ALTER {column} TYPE VARCHAR;"
+        )
+    if len(values) > 0:
+        con.execute(f"DROP TYPE {type_name};")
+    literals = ", ".join(
+        "'" + value.replace("'", "''") + "'" for value in values + new_values
+    )
+    con.execute(f"CREATE TYPE {type_name} AS ENUM ({literals});")
+    for table in tables:
+        con.execute(
+            f"ALTER TABLE {COMPACT_SCHEMA}.{table} ALTER {column} TYPE {type_name};"
+        )
+
+
+def insert(con: duckdb.DuckDBPyConnection, table: str, query: str):
+    # Converts the result of the query into the compact representation. Like INSERT ... BY NAME, missing columns are
+    # NULL.
+    columns = _columns(con, LOGICAL_SCHEMA, table)
+    query = f"SELECT * FROM {LOGICAL_SCHEMA}.{table} UNION ALL BY NAME ({query})"
+    for column, data_type in columns:
+        if _is_label(column, data_type):
+            _update_label_type(con, column, query)
+
+    join = (
+        ""
+        if table == RUN_TABLE or not _has_run(columns)
+        else f" LEFT JOIN {COMPACT_SCHEMA}.{RUN_TABLE} AS r ON i.{RUN_ID} = r.{RUN_ID}"
+    )
+    con.execute(
+        f"INSERT INTO {COMPACT_SCHEMA}.{table} BY NAME "
+        f"SELECT {', '.join(_encode_expressions(table, columns))} FROM ({query}) AS i{join};"
+    )
+
+
+def delete_run(con: duckdb.DuckDBPyConnection, tables: List[str], run_id: str):
+    run_key = con.execute(
+        f"SELECT {RUN_KEY} FROM {COMPACT_SCHEMA}.{RUN_TABLE} WHERE {RUN_ID} = ?;",
+        [run_id],
+    ).fetchone()
+    if run_key is None:
+        return
+    # The run itself last, the other tables reference it.
+    for table in sorted(tables, key=lambda t: t == RUN_TABLE):
+        con.execute(
+            f"DELETE FROM {COMPACT_SCHEMA}.{table} WHERE {RUN_KEY} = ?;", run_key
+        )
@@ -0,0 +1,61 @@
+import os
+import sys
+from argparse import ArgumentParser
+
+import data.db_keys as db_keys
+
+# Compares the keys of the RDB parser (data/rdb.py) with the expected keys or with the keys of a Redis server that
+# loaded the RDB file (the previous way to read them), e.g.:
+#   python beder2/compare_rdb_keys.py
+#   python beder2/compare_rdb_keys.py --rdb dump.rdb --redis-server redis-server --redis-cli redis-cli
+# The default fixture is written by hand following the RDB format of Redis 7. It covers the encodings of keys (plain,
+# integer, LZF), expire times, LRU/LFU opcodes and values of several types. "load-" keys are not expected.
+FIXTURES_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "fixtures"
+)
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--rdb",
+        default=os.path.join(FIXTURES_DIR, "keys.rdb"),
+        help="The RDB file to read",
+    )
+    parser.add_argument(
+        "--keys",
+        default=os.path.join(FIXTURES_DIR, "keys.txt"),
+        help="The expected keys, one per line. Not used if --redis-server is given.",
+    )
+    parser.add_argument(
+        "--redis-server",
+        help="Load the RDB file into this redis-server to get the expected keys",
+    )
+    parser.add_argument(
+        "--redis-cli",
+        default="redis-cli",
+        help="The redis-cli used with --redis-server",
+    )
+    args = parser.parse_args()
+
+    keys = set(db_keys.read_rdb_keys(args.rdb)["key"])
+    if args.redis_server is not None:
+        df = db_keys.read_redis_rdb_keys(args.rdb, args.redis_server, args.redis_cli)
+        expected = set(df["key"])
+    else:
+        with open(args.keys) as f:
+            expected = {line.rstrip("\n") for line in f if line.rstrip("\n")}
+
+    missing = sorted(expected - keys)
+    unexpected = sorted(keys - expected)
+    print(f"{len(keys)} keys, {len(missing)} missing, {len(unexpected)} unexpected")
+    for key in missing[:10]:
+        print(f"Missing: {key}")
+    for key in unexpected[:10]:
+        print(f"Unexpected: {key}")
+    if missing or unexpected:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,25 @@
-from functools import reduce
-
 import pandas as pd
 import yaml
 
+from data.records import Field, RecordSpec
+
+CLUSTER_STATUS = RecordSpec(
+    [
+        Field("time"),
+        Field("port"),
+        Field("master_port"),
+        Field("role"),
+    ]
+)
+
 
 def read_cluster_status_data(file: str) -> pd.DataFrame:
     with open(file) as f:
         status = yaml.safe_load(f)
-    return reduce(
-        lambda x, y: pd.concat([x, y]),
+    return CLUSTER_STATUS.to_data_frame(
         [
-            pd.DataFrame(
-                {
-                    "time": [time],
-                    "port": [port],
-                    "master_port": [values["master_port"]],
-                    "role": [values["role"]],
-                }
-            )
+            (time, port, values["master_port"], values["role"])
             for time, port_group in status.items()
             for port, values in port_group.items()
-        ],
-        pd.DataFrame(),
+        ]
     )
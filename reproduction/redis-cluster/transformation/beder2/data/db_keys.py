@@ -10,6 +10,21 @@ import redis
 import yaml
 from redis.exceptions import BusyLoadingError
 
+import data.rdb as rdb
+
+# Keys written to fill the database before the benchmark
+LOAD_KEY_PREFIX = b"load-"
+
+
+def read_rdb_keys(rdb_file: str) -> pd.DataFrame:
+    # Parses the RDB file directly instead of loading it into a Redis server (see read_redis_rdb_keys).
+    keys = [
+        key.decode("utf-8", errors="replace")
+        for key in rdb.read_keys(rdb_file)
+        if not key.startswith(LOAD_KEY_PREFIX)
+    ]
+    return pd.DataFrame({"key": pd.Series(keys, dtype=str)})
+
 
 def read_redis_rdb_keys(
     rdb_file: str, redis_server_bin: str, redis_cli_bin: str
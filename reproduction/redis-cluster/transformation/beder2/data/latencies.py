@@ -1,10 +1,21 @@
 import time
 
 import dask.dataframe as dd
+import numpy as np
 import pandas as pd
 import yaml
 
 HEADER_CONVERSIONS = {"start_time": "start_time", "end_time": "end_time"}
+# Log-linear (HDR-style) buckets: Every power of two (in µs) is split into this many buckets (< 1.6 % error).
+HISTOGRAM_SUB_BUCKETS = 64
+COLUMNS = {
+    "thread_id": "INTEGER",
+    "latency_ms": "DOUBLE",
+    "time": "DOUBLE",
+    "port": "INTEGER",
+    "client_id": "INTEGER",
+    "key": "VARCHAR",
+}
 
 
 # def _latencies_file_content(file: str) -> List[str]:
@@ -33,14 +44,7 @@ def read_latencies(file: str) -> pd.DataFrame:
         file,
         skiprows=len(HEADER_CONVERSIONS),  # Skip first two rows
         header=0,
-        names=[
-            "thread_id",
-            "latency_ms",
-            "time",
-            "port",
-            "client_id",
-            "key",
-        ],
+        names=list(COLUMNS.keys()),
     ).compute()
 
     df["time_s"] = None
@@ -50,3 +54,99 @@ def read_latencies(file: str) -> pd.DataFrame:
         exit(1)
 
     return df
+
+
+def read_latencies_query(file: str, run_id: str, start_time: float) -> str:
+    # Same as read_latencies, but the file is read by DuckDB itself (parallel CSV reader). The query is executed
+    # by the storage, so the latencies never have to be loaded into pandas.
+    columns = ", ".join(f"'{name}': '{type}'" for name, type in COLUMNS.items())
+    file = file.replace("'", "''")
+    return f"""
+        SELECT
+            thread_id,
+            CASE
+                WHEN latency_ms < 0
+                    THEN error('{file} contains negative latency. Maybe a overflow happened?')
+                ELSE latency_ms
+            END AS latency_ms,
+            time,
+            port,
+            client_id,
+            key,
+            time - {start_time} AS time_s,
+            '{run_id}' AS run_id
+        FROM read_csv('{file}', skip={len(HEADER_CONVERSIONS)}, header=true, columns={{{columns}}})
+    """
+
+
+def _bucket_bounds_ms(bucket: np.ndarray) -> (np.ndarray, np.ndarray):
+    exponent = np.exp2(bucket // HISTOGRAM_SUB_BUCKETS)
+    sub_bucket = bucket % HISTOGRAM_SUB_BUCKETS
+    return (
+        exponent * (1.0 + sub_bucket / HISTOGRAM_SUB_BUCKETS) / 1000.0,
+        exponent * (1.0 + (sub_bucket + 1) / HISTOGRAM_SUB_BUCKETS) / 1000.0,
+    )
+
+
+def histogram(df: pd.DataFrame) -> pd.DataFrame:
+    # Expects time_s to be set. One row per (port, second, bucket) with the number of requests.
+    latency_us = np.maximum(df["latency_ms"].to_numpy(dtype=float) * 1000.0, 1.0)
+    exponent = np.floor(np.log2(latency_us))
+    sub_bucket = np.floor(
+        (latency_us / np.exp2(exponent) - 1.0) * HISTOGRAM_SUB_BUCKETS
+    )
+    hist = (
+        pd.DataFrame(
+            {
+                "port": df["port"].to_numpy(),
+                "time_bucket_s": np.floor(df["time_s"].to_numpy(dtype=float)).astype(
+                    np.int64
+                ),
+                "bucket": (exponent * HISTOGRAM_SUB_BUCKETS + sub_bucket).astype(
+                    np.int64
+                ),
+            }
+        )
+        .groupby(["port", "time_bucket_s", "bucket"])
+        .size()
+        .reset_index(name="count")
+    )
+    hist["lower_ms"], hist["upper_ms"] = _bucket_bounds_ms(hist["bucket"].to_numpy())
+    return hist
+
+
+def histogram_query(latencies_query: str) -> str:
+    # Same as histogram, but computed by DuckDB on the result of read_latencies_query.
+    return f"""
+        SELECT
+            port,
+            time_bucket_s,
+            bucket,
+            pow(2, bucket // {HISTOGRAM_SUB_BUCKETS})
+                * (1.0 + (bucket % {HISTOGRAM_SUB_BUCKETS}) / {HISTOGRAM_SUB_BUCKETS}) / 1000.0 AS lower_ms,
+            pow(2, bucket // {HISTOGRAM_SUB_BUCKETS})
+                * (1.0 + (bucket % {HISTOGRAM_SUB_BUCKETS} + 1) / {HISTOGRAM_SUB_BUCKETS}) / 1000.0 AS upper_ms,
+            count,
+            run_id
+        FROM (
+            SELECT
+                run_id,
+                port,
+                time_bucket_s,
+                (exponent * {HISTOGRAM_SUB_BUCKETS}
+                    + floor((latency_us / pow(2, exponent) - 1.0) * {HISTOGRAM_SUB_BUCKETS}))::BIGINT AS bucket,
+                count(*) AS count
+            FROM (
+                SELECT
+                    run_id,
+                    port,
+                    floor(time_s)::BIGINT AS time_bucket_s,
+                    latency_us,
+                    floor(log2(latency_us)) AS exponent
+                FROM (
+                    SELECT *, greatest(latency_ms * 1000.0, 1.0) AS latency_us FROM ({latencies_query})
+                )
+            )
+            GROUP BY ALL
+        )
+    """
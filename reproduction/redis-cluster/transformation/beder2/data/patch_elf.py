@@ -1,20 +1,66 @@
+import hashlib
 import os
+import tempfile
 from typing import List
 
 import pandas as pd
 from elftools.elf.descriptions import describe_sh_type
 from elftools.elf.elffile import ELFFile
+from elftools.elf.relocation import RelocationSection
+from elftools.elf.sections import SymbolTableSection
 
+# The sections of a patch are cached by the hash of the file (<hash>.v<CACHE_VERSION>.parquet). Runs of a campaign
+# use the same patches, so every patch is only read once.
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "beder2",
+    "patch-elf",
+)
 
-def read_patch_elf(file: List[str]) -> pd.DataFrame:
-    df = None
-    for f in file:
+# Increment if the columns or their contents change (see _read). Files of other versions are not read.
+CACHE_VERSION = 1
+
+
+def read_patch_elf_files(file: List[str], cache_dir: str) -> pd.DataFrame:
+    # Returns the hash of every file. The sections of new files are written to the cache.
+    hashes = [_hash(f) for f in file]
+    for f, file_hash in zip(file, hashes):
+        cache_file = _cache_file(cache_dir, file_hash)
+        if os.path.exists(cache_file):
+            continue
         df_file = _read(f)
+        df_file.insert(0, "hash", file_hash)
+        os.makedirs(cache_dir, exist_ok=True)
+        # Other processes may read the same patch at the same time. Only complete files are visible.
+        fd, tmp_file = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        os.close(fd)
+        df_file.to_parquet(tmp_file, index=False)
+        os.replace(tmp_file, cache_file)
+    return pd.DataFrame(
+        {"file_name": [os.path.basename(f) for f in file], "hash": hashes}
+    )
+
+
+def read_patch_elf_object_query(cache_dir: str, file_hash: str) -> str:
+    # Sections of the cached file, unless the object is already in the database.
+    cache_file = _cache_file(cache_dir, file_hash).replace("'", "''")
+    return f"""
+        SELECT *
+        FROM read_parquet('{cache_file}')
+        WHERE hash NOT IN (SELECT hash FROM patch_elf_object)
+    """
 
-        df_file["file_name"] = os.path.basename(f)
 
-        df = df_file if df is None else pd.concat([df, df_file], ignore_index=True)
-    return df
+def _cache_file(cache_dir: str, file_hash: str) -> str:
+    return os.path.join(cache_dir, f"{file_hash}.v{CACHE_VERSION}.parquet")
+
+
+def _hash(file: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(file, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
 
 
 def _read(file: str) -> pd.DataFrame:
@@ -23,10 +69,21 @@ def _read(file: str) -> pd.DataFrame:
 
         data = [
             {
+                "section_index": index,
                 "section_name": sec.name,
                 "size_bytes": sec.data_size,
                 "type": describe_sh_type(sec["sh_type"]),
+                "symbols": (
+                    sec.num_symbols() if isinstance(sec, SymbolTableSection) else None
+                ),
+                "relocations": (
+                    sec.num_relocations()
+                    if isinstance(sec, RelocationSection)
+                    else None
+                ),
             }
-            for sec in elffile.iter_sections()
+            for index, sec in enumerate(elffile.iter_sections())
         ]
-        return pd.DataFrame(data=data)
+        return pd.DataFrame(data=data).astype(
+            {"symbols": "Int64", "relocations": "Int64"}
+        )
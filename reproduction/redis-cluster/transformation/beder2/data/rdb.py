@@ -0,0 +1,341 @@
+import mmap
+import struct
+from typing import Iterator, Tuple
+
+# Streaming reader of the key names of a Redis RDB file (see rdb.h/rdb.c of Redis 7). Values are skipped without
+# decoding them, so only the keys are kept in memory.
+RDB_MAGIC = b"REDIS"
+
+# Opcodes
+OPCODE_SLOT_INFO = 244
+OPCODE_FUNCTION2 = 245
+OPCODE_FUNCTION_PRE_GA = 246
+OPCODE_MODULE_AUX = 247
+OPCODE_IDLE = 248
+OPCODE_FREQ = 249
+OPCODE_AUX = 250
+OPCODE_RESIZEDB = 251
+OPCODE_EXPIRETIME_MS = 252
+OPCODE_EXPIRETIME = 253
+OPCODE_SELECTDB = 254
+OPCODE_EOF = 255
+
+# Object types
+TYPE_STRING = 0
+TYPE_LIST = 1
+TYPE_SET = 2
+TYPE_ZSET = 3
+TYPE_HASH = 4
+TYPE_ZSET_2 = 5
+TYPE_MODULE_PRE_GA = 6
+TYPE_MODULE_2 = 7
+TYPE_HASH_ZIPMAP = 9
+TYPE_LIST_ZIPLIST = 10
+TYPE_SET_INTSET = 11
+TYPE_ZSET_ZIPLIST = 12
+TYPE_HASH_ZIPLIST = 13
+TYPE_LIST_QUICKLIST = 14
+TYPE_STREAM_LISTPACKS = 15
+TYPE_HASH_LISTPACK = 16
+TYPE_ZSET_LISTPACK = 17
+TYPE_LIST_QUICKLIST_2 = 18
+TYPE_STREAM_LISTPACKS_2 = 19
+TYPE_SET_LISTPACK = 20
+TYPE_STREAM_LISTPACKS_3 = 21
+
+# Types that are stored as a single (ziplist, listpack, intset, ...) blob
+BLOB_TYPES = [
+    TYPE_HASH_ZIPMAP,
+    TYPE_LIST_ZIPLIST,
+    TYPE_SET_INTSET,
+    TYPE_ZSET_ZIPLIST,
+    TYPE_HASH_ZIPLIST,
+    TYPE_HASH_LISTPACK,
+    TYPE_ZSET_LISTPACK,
+    TYPE_SET_LISTPACK,
+]
+STREAM_TYPES = [TYPE_STREAM_LISTPACKS, TYPE_STREAM_LISTPACKS_2, TYPE_STREAM_LISTPACKS_3]
+
+# Special encodings of strings (length type 11)
+ENC_INT8 = 0
+ENC_INT16 = 1
+ENC_INT32 = 2
+ENC_LZF = 3
+
+# Opcodes of module values (RDB_MODULE_OPCODE_*)
+MODULE_OPCODE_EOF = 0
+MODULE_OPCODE_SINT = 1
+MODULE_OPCODE_UINT = 2
+MODULE_OPCODE_FLOAT = 3
+MODULE_OPCODE_DOUBLE = 4
+MODULE_OPCODE_STRING = 5
+
+STREAM_ID_BYTES = 16
+
+
+def lzf_decompress(data: bytes, expected_length: int) -> bytes:
+    out = bytearray()
+    pos = 0
+    while pos < len(data):
+        ctrl = data[pos]
+        pos += 1
+        if ctrl < 32:
+            # Literal run
+            end = pos + ctrl + 1
+            out += data[pos:end]
+            pos = end
+            continue
+        # Back reference (may overlap with the bytes it produces)
+        length = ctrl >> 5
+        if length == 7:
+            length += data[pos]
+            pos += 1
+        ref = len(out) - ((ctrl & 0x1F) << 8) - data[pos] - 1
+        pos += 1
+        for i in range(length + 2):
+            out.append(out[ref + i])
+    if len(out) != expected_length:
+        raise ValueError(
+            f"Invalid LZF data. Expected {expected_length} bytes, got {len(out)} bytes."
+        )
+    return bytes(out)
+
+
+class RdbKeyReader:
+    def __init__(self, data: bytes):
+        # data can be anything that supports slicing, e.g. a memory mapped file.
+        self._data = data
+        self._pos = 0
+
+    def _read(self, n: int) -> bytes:
+        if self._pos + n > len(self._data):
+            raise ValueError("Unexpected end of RDB file.")
+        start = self._pos
+        end = start + n
+        value = self._data[start:end]
+        self._pos = end
+        return value
+
+    def _skip(self, n: int):
+        if self._pos + n > len(self._data):
+            raise ValueError("Unexpected end of RDB file.")
+        self._pos += n
+
+    def _byte(self) -> int:
+        if self._pos >= len(self._data):
+            raise ValueError("Unexpected end of RDB file.")
+        value = self._data[self._pos]
+        self._pos += 1
+        return value
+
+    def _length(self) -> Tuple[int, bool]:
+        # Returns (length, is_encoded). If is_encoded is set, the length is the special string encoding.
+        first = self._byte()
+        kind = first >> 6
+        if kind == 0:
+            return first & 0x3F, False
+        if kind == 1:
+            return ((first & 0x3F) << 8) | self._byte(), False
+        if kind == 3:
+            return first & 0x3F, True
+        if first == 0x80:
+            return struct.unpack(">I", self._read(4))[0], False
+        if first == 0x81:
+            return struct.unpack(">Q", self._read(8))[0], False
+        raise ValueError(
+            f"Unknown length encoding {first:#x} at offset {self._pos - 1}."
+        )
+
+    def _len(self) -> int:
+        length, is_encoded = self._length()
+        if is_encoded:
+            raise ValueError(f"Unexpected encoded length at offset {self._pos}.")
+        return length
+
+    def _string(self) -> bytes:
+        length, is_encoded = self._length()
+        if not is_encoded:
+            return bytes(self._read(length))
+        if length == ENC_INT8:
+            return str(struct.unpack("<b", self._read(1))[0]).encode()
+        if length == ENC_INT16:
+            return str(struct.unpack("<h", self._read(2))[0]).encode()
+        if length == ENC_INT32:
+            return str(struct.unpack("<i", self._read(4))[0]).encode()
+        if length == ENC_LZF:
+            compressed_length = self._len()
+            uncompressed_length = self._len()
+            return lzf_decompress(
+                bytes(self._read(compressed_length)), uncompressed_length
+            )
+        raise ValueError(f"Unknown string encoding {length} at offset {self._pos}.")
+
+    def _skip_string(self):
+        length, is_encoded = self._length()
+        if not is_encoded:
+            self._skip(length)
+        elif length == ENC_INT8:
+            self._skip(1)
+        elif length == ENC_INT16:
+            self._skip(2)
+        elif length == ENC_INT32:
+            self._skip(4)
+        elif length == ENC_LZF:
+            compressed_length = self._len()
+            self._len()
+            self._skip(compressed_length)
+        else:
+            raise ValueError(f"Unknown string encoding {length} at offset {self._pos}.")
+
+    def _skip_strings(self, n: int):
+        for _ in range(n):
+            self._skip_string()
+
+    def _skip_module_value(self):
+        while True:
+            opcode = self._len()
+            if opcode == MODULE_OPCODE_EOF:
+                return
+            if opcode in [MODULE_OPCODE_SINT, MODULE_OPCODE_UINT]:
+                self._len()
+            elif opcode == MODULE_OPCODE_FLOAT:
+                self._skip(4)
+            elif opcode == MODULE_OPCODE_DOUBLE:
+                self._skip(8)
+            elif opcode == MODULE_OPCODE_STRING:
+                self._skip_string()
+            else:
+                raise ValueError(
+                    f"Unknown module opcode {opcode} at offset {self._pos}."
+                )
+
+    def _skip_stream(self, object_type: int):
+        # Listpacks: (master ID, listpack) per node
+        self._skip_strings(2 * self._len())
+        # Length, last ID (ms, seq)
+        for _ in range(3):
+            self._len()
+        if object_type != TYPE_STREAM_LISTPACKS:
+            # First ID, max deleted ID, entries added
+            for _ in range(5):
+                self._len()
+        for _ in range(self._len()):
+            # Consumer group: Name, last ID (ms, seq)
+            self._skip_string()
+            self._len()
+            self._len()
+            if object_type != TYPE_STREAM_LISTPACKS:
+                # Entries read
+                self._len()
+            # Pending entries: ID, delivery time, delivery count
+            for _ in range(self._len()):
+                self._skip(STREAM_ID_BYTES + 8)
+                self._len()
+            for _ in range(self._len()):
+                # Consumer: Name, seen time, (active time), pending entry IDs
+                self._skip_string()
+                self._skip(8)
+                if object_type == TYPE_STREAM_LISTPACKS_3:
+                    self._skip(8)
+                self._skip(STREAM_ID_BYTES * self._len())
+
+    def _skip_value(self, object_type: int):
+        if object_type == TYPE_STRING or object_type in BLOB_TYPES:
+            self._skip_string()
+        elif object_type in [TYPE_LIST, TYPE_SET, TYPE_LIST_QUICKLIST]:
+            self._skip_strings(self._len())
+        elif object_type == TYPE_HASH:
+            self._skip_strings(2 * self._len())
+        elif object_type == TYPE_ZSET:
+            for _ in range(self._len()):
+                self._skip_string()
+                # Score as string. 253, 254, 255 are NaN, +inf, -inf.
+                length = self._byte()
+                if length < 253:
+                    self._skip(length)
+        elif object_type == TYPE_ZSET_2:
+            for _ in range(self._len()):
+                self._skip_string()
+                self._skip(8)
+        elif object_type == TYPE_LIST_QUICKLIST_2:
+            for _ in range(self._len()):
+                # Container type, node
+                self._len()
+                self._skip_string()
+        elif object_type in STREAM_TYPES:
+            self._skip_stream(object_type)
+        elif object_type == TYPE_MODULE_2:
+            # Module ID
+            self._len()
+            self._skip_module_value()
+        else:
+            raise ValueError(
+                f"Unsupported object type {object_type} at offset {self._pos}."
+            )
+
+    def keys(self) -> Iterator[bytes]:
+        if bytes(self._read(len(RDB_MAGIC))) != RDB_MAGIC:
+            raise ValueError("Not an RDB file.")
+        # Version (4 ASCII digits)
+        self._skip(4)
+        while True:
+            opcode = self._byte()
+            if opcode == OPCODE_EOF:
+                # The checksum follows. It is not verified.
+                return
+            if opcode == OPCODE_SELECTDB:
+                self._len()
+            elif opcode == OPCODE_RESIZEDB:
+                self._len()
+                self._len()
+            elif opcode == OPCODE_SLOT_INFO:
+                # Slot, slot size, expires slot size
+                for _ in range(3):
+                    self._len()
+            elif opcode == OPCODE_AUX:
+                self._skip_strings(2)
+            elif opcode == OPCODE_FUNCTION2:
+                self._skip_string()
+            elif opcode == OPCODE_MODULE_AUX:
+                # Module ID, when opcode, when
+                for _ in range(3):
+                    self._len()
+                self._skip_module_value()
+            elif opcode == OPCODE_EXPIRETIME_MS:
+                self._skip(8)
+            elif opcode == OPCODE_EXPIRETIME:
+                self._skip(4)
+            elif opcode == OPCODE_IDLE:
+                self._len()
+            elif opcode == OPCODE_FREQ:
+                self._skip(1)
+            elif opcode == OPCODE_FUNCTION_PRE_GA or opcode == TYPE_MODULE_PRE_GA:
+                raise ValueError(f"Unsupported opcode {opcode} at offset {self._pos}.")
+            elif (
+                opcode == TYPE_STRING
+                and self._pos < len(self._data)
+                and self._data[self._pos] < 64
+            ):
+                # Fast path for the most common case: String values with a short plain key.
+                data = self._data
+                key_start = self._pos + 1
+                key_end = key_start + data[self._pos]
+                if key_end > len(data):
+                    raise ValueError("Unexpected end of RDB file.")
+                key = data[key_start:key_end]
+                self._pos = key_end
+                yield key
+                self._skip_string()
+            else:
+                # Key value pair
+                yield self._string()
+                self._skip_value(opcode)
+
+
+def read_keys(file: str) -> Iterator[bytes]:
+    with open(file, "rb") as f:
+        # An empty file cannot be memory mapped.
+        if f.seek(0, 2) == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield from RdbKeyReader(data).keys()
@@ -0,0 +1,66 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import pandas as pd
+
+
+# A typed column of a record, e.g. Field("thread_name", strip_quotes=True) for '"connection_handler"'.
+class Field:
+    def __init__(
+        self,
+        name: str,
+        type: Optional[Callable[[Any], Any]] = None,
+        strip_quotes: bool = False,
+    ):
+        self.name: str = name
+        # None keeps the value as it is.
+        self.type: Optional[Callable[[Any], Any]] = type
+        # Remove leading and trailing " (e.g. "(null)")
+        self.strip_quotes: bool = strip_quotes
+
+    def convert_all(self, values: List[Any]) -> List[Any]:
+        if self.strip_quotes:
+            values = [value[1:-1] for value in values]
+        if self.type is not None:
+            values = [self.type(value) for value in values]
+        return values
+
+
+# Turns records (one sequence of raw attributes per record) into a DataFrame column by column.
+# The DataFrame is built only once instead of concatenating one DataFrame per record.
+class RecordSpec:
+    def __init__(
+        self,
+        fields: List[Field],
+        ignore_missmatch: bool = True,
+        attrs_must_match_fields: bool = True,
+    ):
+        self.fields: List[Field] = fields
+        self.ignore_missmatch: bool = ignore_missmatch
+        self.attrs_must_match_fields: bool = attrs_must_match_fields
+
+    def _check(self, records: Iterable[Sequence[Any]]) -> List[Sequence[Any]]:
+        if not self.attrs_must_match_fields:
+            return list(records)
+        valid = []
+        for record in records:
+            if len(record) != len(self.fields):
+                if not self.ignore_missmatch:
+                    raise ValueError(
+                        "Invalid length of attribute conversions. It must be less or equal the amount of attrs"
+                        f" available. Attributes: {len(record)}. Conversions: {len(self.fields)}."
+                        f"{record}"
+                    )
+                # Skip record
+                continue
+            valid.append(record)
+        return valid
+
+    def to_data_frame(self, records: Iterable[Sequence[Any]]) -> pd.DataFrame:
+        records = self._check(records)
+        if len(records) == 0:
+            return pd.DataFrame()
+        columns: Dict[str, List[Any]] = {
+            field.name: field.convert_all([record[idx] for record in records])
+            for idx, field in enumerate(self.fields)
+        }
+        return pd.DataFrame(columns)
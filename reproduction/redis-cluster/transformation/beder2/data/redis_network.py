@@ -1,5 +1,25 @@
+from typing import List
+
 import pandas as pd
 
+COLUMNS = {"bytes": "BIGINT", "time": "DOUBLE"}
+
 
 def read_redis_network(file: str) -> pd.DataFrame:
-    return pd.read_csv(file, header=None, names=["bytes", "time"])
+    return pd.read_csv(file, header=None, names=list(COLUMNS.keys()))
+
+
+def read_redis_network_query(files: List[str], run_id: str, start_time: float) -> str:
+    # Same as read_redis_network, but all files (of all nodes) are read by DuckDB in a single scan. The port is
+    # the name of the node directory (cluster/<port>/<file>).
+    columns = ", ".join(f"'{name}': '{type}'" for name, type in COLUMNS.items())
+    files = ", ".join("'" + file.replace("'", "''") + "'" for file in files)
+    return f"""
+        SELECT
+            bytes,
+            time,
+            time - {start_time} AS time_s,
+            regexp_extract(filename, '([0-9]+)/[^/]*$', 1)::INTEGER AS port,
+            '{run_id}' AS run_id
+        FROM read_csv([{files}], header=false, auto_detect=false, columns={{{columns}}}, filename=true)
+    """
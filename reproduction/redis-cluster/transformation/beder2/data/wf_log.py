@@ -1,201 +1,275 @@
-from functools import reduce
-from typing import Any, Callable, Dict, List
+from typing import Iterable, List
 
 import pandas as pd
 
-
-def _read_data(
-    file: str,
-    line_prefixes: List[str],
-    attribute_conversions: List[Callable[[str], Dict[str, Any]]],
-    ignore_missmatch: bool = True,
-    attrs_must_match_conversions: bool = True,
-) -> pd.DataFrame:
+from data.records import Field, RecordSpec
+
+# All WfPatch log entries start with this prefix.
+LINE_PREFIX = "- ["
+
+
+# A WfPatch log entry (e.g. '- [birth, ...]') and the fields of its attributes.
+class LogEntry:
+    def __init__(
+        self,
+        line_prefixes: List[str],
+        fields: List[Field],
+        ignore_missmatch: bool = True,
+        attrs_must_match_conversions: bool = True,
+    ):
+        self.line_prefixes: List[str] = line_prefixes
+        self.spec: RecordSpec = RecordSpec(
+            fields, ignore_missmatch, attrs_must_match_conversions
+        )
+
+    def select(self, line: str) -> List[str]:
+        # One entry per matching prefix, just like reading the file for each prefix would do.
+        return [
+            line.strip() for prefix in self.line_prefixes if line.startswith(prefix)
+        ]
+
+    def to_data_frame(self, lines: List[str]) -> pd.DataFrame:
+        return self.spec.to_data_frame(
+            [
+                [
+                    attr.strip()
+                    for attr in line.removeprefix("- [").removesuffix("]").split(",")
+                ]
+                for line in lines
+            ]
+        )
+
+
+def select_lines(lines: Iterable[str], entry: LogEntry) -> List[str]:
+    return [selected for line in lines for selected in entry.select(line)]
+
+
+def _read_data(file: str, entry: LogEntry) -> pd.DataFrame:
     with open(file) as f:
-        lines = []
-        for line in f.readlines():
-            for prefix in line_prefixes:
-                if line.startswith(prefix):
-                    lines.append(line.strip())
-
-    def extract_infos(info_line: str) -> pd.DataFrame:
-        info_line = info_line.removeprefix("- [").removesuffix("]")
-        attrs = [attr.strip() for attr in info_line.split(",")]
-        if attrs_must_match_conversions and len(attrs) != len(attribute_conversions):
-            if not ignore_missmatch:
-                raise ValueError(
-                    "Invalid length of attribute conversions. It must be less or equal the amount of attrs"
-                    f" available. Attributes: {len(attrs)}. Conversions: {len(attribute_conversions)}."
-                    f"{info_line}"
-                )
-            # Return empty data frame
-            return pd.DataFrame()
-        df_data = {
-            key: [value]
-            for idx, fn in enumerate(attribute_conversions)
-            for key, value in fn(attrs[idx]).items()
-        }
-        return pd.DataFrame(df_data)
-
-    return reduce(
-        lambda x, y: pd.concat([x, y]),
-        [extract_infos(line) for line in lines],
-        pd.DataFrame(),
-    )
+        return entry.to_data_frame(select_lines(f, entry))
+
+
+PTE = LogEntry(
+    ["- [VmPTE-"],
+    [
+        Field("name"),
+        Field("size_kB", int),
+    ],
+)
 
 
 def read_pte_data(file: str) -> pd.DataFrame:
-    conversions = [
-        lambda x: {"name": x},
-        lambda x: {"size_kB": int(x)},
-    ]
-    return _read_data(file, ["- [VmPTE-"], conversions)
+    return _read_data(file, PTE)
+
+
+# - [vma-count-startup, 0, rw-p, FILE-BACKED, 25, 864, 0, 0, 68, 524]
+VMA = LogEntry(
+    ["- [vma-count-"],
+    [
+        Field("name"),
+        Field("wfpatch_generation", int),
+        Field("perm"),
+        Field("type"),
+        Field("count", int),
+        Field("size", int),
+        Field("shared_clean", int),
+        Field("shared_dirty", int),
+        Field("private_clean", int),
+        Field("private_dirty", int),
+    ],
+)
 
 
 def read_vma_data(file: str) -> pd.DataFrame:
-    # - [vma-count-startup, 0, rw-p, FILE-BACKED, 25, 864, 0, 0, 68, 524]
-    conversions = [
-        lambda x: {"name": x},
-        lambda x: {"wfpatch_generation": int(x)},
-        lambda x: {"perm": x},
-        lambda x: {"type": x},
-        lambda x: {"count": int(x)},
-        lambda x: {"size": int(x)},
-        lambda x: {"shared_clean": int(x)},
-        lambda x: {"shared_dirty": int(x)},
-        lambda x: {"private_clean": int(x)},
-        lambda x: {"private_dirty": int(x)},
-    ]
-    return _read_data(file, ["- [vma-count-"], conversions)
+    return _read_data(file, VMA)
+
+
+E2E_PATCHED = LogEntry(
+    ["- [e2e-patch"],
+    [
+        Field("name"),
+        Field("time", float),
+        Field("duration_ms", float),
+        Field("patch_method", int),
+        Field("thread_group_name", strip_quotes=True),
+    ],
+)
 
 
 def read_e2e_patched_data(file: str) -> pd.DataFrame:
-    conversions = [
-        lambda x: {"name": x},
-        lambda x: {"time": float(x)},
-        lambda x: {"duration_ms": float(x)},
-        lambda x: {"patch_method": int(x)},
-        lambda x: {"thread_group_name": x[1:-1]},
-    ]
-    return _read_data(file, ["- [e2e-patch"], conversions)
+    return _read_data(file, E2E_PATCHED)
+
+
+# - [patched, 13059.2741, "/home/michael/hotpatch/development/mariadb-patch-benchmark/build-output/wfpatch.patch-06fae75859821fe36f68eb2d77f007f014143282/patch--table_cache.cc.o", "(null)"]  # noqa: E501
+PATCHED = LogEntry(
+    ["- [patched"],
+    [
+        Field("name"),
+        Field("duration_ms", float),
+    ],
+    attrs_must_match_conversions=False,
+)
 
 
 def read_patched_data(file: str) -> pd.DataFrame:
-    # - [patched, 13059.2741, "/home/michael/hotpatch/development/mariadb-patch-benchmark/build-output/wfpatch.patch-06fae75859821fe36f68eb2d77f007f014143282/patch--table_cache.cc.o", "(null)"]  # noqa: E501
-    conversions = [
-        lambda x: {"name": x},
-        lambda x: {"duration_ms": float(x)},
-    ]
-    return _read_data(
-        file, ["- [patched"], conversions, attrs_must_match_conversions=False
-    )
+    return _read_data(file, PATCHED)
+
+
+# - [address-space-new, 2.0505, "(null)"]
+AS_NEW = LogEntry(
+    ["- [address-space-new"],
+    [
+        Field("name"),
+        Field("duration_ms", float),
+        Field("thread_group_name", strip_quotes=True),
+    ],
+)
 
 
 def read_as_new_data(file: str) -> pd.DataFrame:
-    # - [address-space-new, 2.0505, "(null)"]
-    conversions = [
-        lambda x: {"name": x},
-        lambda x: {"duration_ms": float(x)},
-        lambda x: {"thread_group_name": x[1:-1]},
-    ]
-    return _read_data(file, ["- [address-space-new"], conversions)
+    return _read_data(file, AS_NEW)
+
+
+# - [address-space-switch, 0.0148]
+AS_SWITCH = LogEntry(
+    ["- [address-space-switch"],
+    [
+        Field("name"),
+        Field("duration_ms", float),
+    ],
+)
 
 
 def read_as_switch_data(file: str) -> pd.DataFrame:
-    # - [address-space-switch, 0.0148]
-    conversions = [
-        lambda x: {"name": x},
-        lambda x: {"duration_ms": float(x)},
-    ]
-    return _read_data(file, ["- [address-space-switch"], conversions)
+    return _read_data(file, AS_SWITCH)
+
+
+# - [address-space-delete, 0.0004, "(null)"]
+AS_DELETE = LogEntry(
+    ["- [address-space-delete"],
+    [
+        Field("name"),
+        Field("duration_ms", float),
+        Field("thread_group_name", strip_quotes=True),
+    ],
+)
 
 
 def read_as_delete_data(file: str) -> pd.DataFrame:
-    # - [address-space-delete, 0.0004, "(null)"]
-    conversions = [
-        lambda x: {"name": x},
-        lambda x: {"duration_ms": float(x)},
-        lambda x: {"thread_group_name": x[1:-1]},
-    ]
-    return _read_data(file, ["- [address-space-delete"], conversions)
+    return _read_data(file, AS_DELETE)
+
+
+# - [reach-quiescence-point, 0.0050, "connection_handler", "(null)", 2006706]
+REACH_QUIESCENCE = LogEntry(
+    ["- [reach-quiescence-point"],
+    [
+        Field("name"),
+        Field("duration_ms", float),
+        Field("thread_name", strip_quotes=True),  # remove leading and trailing "
+        Field("thread_group_name", strip_quotes=True),
+        Field("thread_id", int),
+    ],
+)
 
 
 def read_reach_quiescence_data(file: str) -> pd.DataFrame:
-    # - [reach-quiescence-point, 0.0050, "connection_handler", "(null)", 2006706]
-    conversions = [
-        lambda x: {"name": x},
-        lambda x: {"duration_ms": float(x)},
-        lambda x: {"thread_name": x[1:-1]},  # remove leading and trailing "
-        lambda x: {"thread_group_name": x[1:-1]},
-        lambda x: {"thread_id": int(x)},
-    ]
-    return _read_data(file, ["- [reach-quiescence-point"], conversions)
+    return _read_data(file, REACH_QUIESCENCE)
+
+
+# - [quiescence, 0.2762, "(null)"]
+QUIESCENCE = LogEntry(
+    ["- [quiescence"],
+    [
+        Field("name"),
+        Field("duration_ms", float),
+        Field("thread_group_name", strip_quotes=True),
+    ],
+)
 
 
 def read_quiescence_data(file: str) -> pd.DataFrame:
-    # - [quiescence, 0.2762, "(null)"]
-    conversions = [
-        lambda x: {"name": x},
-        lambda x: {"duration_ms": float(x)},
-        lambda x: {"thread_group_name": x[1:-1]},
-    ]
-    return _read_data(file, ["- [quiescence"], conversions)
+    return _read_data(file, QUIESCENCE)
+
+
+# - [migrated, 0.2556, 1, "connection_handler", "(null)", 2006709]
+MIGRATED = LogEntry(
+    ["- [migrated"],
+    [
+        Field("name"),
+        Field("duration_ms", float),
+        Field("current_address_space_version", int),
+        Field("thread_name", strip_quotes=True),  # remove leading and trailing "
+        Field("thread_group_name", strip_quotes=True),
+        Field("thread_id", int),
+    ],
+)
 
 
 def read_migrated_data(file: str) -> pd.DataFrame:
-    # - [migrated, 0.2556, 1, "connection_handler", "(null)", 2006709]
-    conversions = [
-        lambda x: {"name": x},
-        lambda x: {"duration_ms": float(x)},
-        lambda x: {"current_address_space_version": int(x)},
-        lambda x: {"thread_name": x[1:-1]},  # remove leading and trailing "
-        lambda x: {"thread_group_name": x[1:-1]},
-        lambda x: {"thread_id": int(x)},
-    ]
-    return _read_data(file, ["- [migrated"], conversions)
+    return _read_data(file, MIGRATED)
+
+
+# - [apply, 1665070492.768831972, local, 11, "(null)"]
+APPLY = LogEntry(
+    ["- [apply"],
+    [
+        Field("name"),
+        Field("time", float),
+        Field("quiescence"),
+        Field("amount_threads", int),
+        Field("thread_group_name", strip_quotes=True),  # remove leading and trailing "
+    ],
+)
 
 
 def read_apply_data(file: str) -> pd.DataFrame:
-    # - [apply, 1665070492.768831972, local, 11, "(null)"]
-    conversions = [
-        lambda x: {"name": x},
-        lambda x: {"time": float(x)},
-        lambda x: {"quiescence": x},
-        lambda x: {"amount_threads": int(x)},
-        lambda x: {"thread_group_name": x[1:-1]},  # remove leading and trailing "
-    ]
-    return _read_data(file, ["- [apply"], conversions)
+    return _read_data(file, APPLY)
+
+
+# - [finished, 13125.5862, "(null)"]
+FINISHED = LogEntry(
+    ["- [finished"],
+    [
+        Field("name"),
+        Field("duration_ms", float),
+        Field("thread_group_name", strip_quotes=True),  # remove leading and trailing "
+    ],
+)
 
 
 def read_finished_data(file: str) -> pd.DataFrame:
-    # - [finished, 13125.5862, "(null)"]
-    conversions = [
-        lambda x: {"name": x},
-        lambda x: {"duration_ms": float(x)},
-        lambda x: {"thread_group_name": x[1:-1]},  # remove leading and trailing "
-    ]
-    return _read_data(file, ["- [finished"], conversions)
+    return _read_data(file, FINISHED)
+
+
+# - [birth, 1665070477709.47, "connection_handler", "(null)", 2006698]
+BIRTH = LogEntry(
+    ["- [birth"],
+    [
+        Field("name"),
+        Field("time", float),
+        Field("thread_name", strip_quotes=True),
+        Field("thread_group_name", strip_quotes=True),
+        Field("thread_id", int),
+    ],
+)
 
 
 def read_birth_data(file: str) -> pd.DataFrame:
-    # - [birth, 1665070477709.47, "connection_handler", "(null)", 2006698]
-    conversions = [
-        lambda x: {"name": x},
-        lambda x: {"time": float(x)},
-        lambda x: {"thread_name": x[1:-1]},
-        lambda x: {"thread_group_name": x[1:-1]},
-        lambda x: {"thread_id": int(x)},
-    ]
-    return _read_data(file, ["- [birth"], conversions)
+    return _read_data(file, BIRTH)
+
+
+# - [death, 58245.94, "connection_handler", "(null)", 2006705]
+DEATH = LogEntry(
+    ["- [death"],
+    [
+        Field("name"),
+        Field("duration_ms", float),
+        Field("thread_name", strip_quotes=True),
+        Field("thread_group_name", strip_quotes=True),
+        Field("thread_id", int),
+    ],
+)
 
 
 def read_death_data(file: str) -> pd.DataFrame:
-    # - [death, 58245.94, "connection_handler", "(null)", 2006705]
-    conversions = [
-        lambda x: {"name": x},
-        lambda x: {"duration_ms": float(x)},
-        lambda x: {"thread_name": x[1:-1]},
-        lambda x: {"thread_group_name": x[1:-1]},
-        lambda x: {"thread_id": int(x)},
-    ]
-    return _read_data(file, ["- [death"], conversions)
+    return _read_data(file, DEATH)
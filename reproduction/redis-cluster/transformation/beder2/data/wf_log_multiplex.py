@@ -0,0 +1,127 @@
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+import pandas as pd
+
+import data.wf_log as wf_log
+import data.wf_log_redis as wf_log_redis
+from data.wf_log import LogEntry
+from data.wf_log_redis import RedisEntry
+
+# Logs larger than this are split into chunks of this size (aligned to lines) that are parsed in parallel.
+CHUNK_BYTES = 16 * 1024 * 1024
+
+
+def _select_lines(
+    lines: Iterable[str], entries: Dict[str, Union[LogEntry, RedisEntry]]
+) -> Dict[str, List]:
+    selected: Dict[str, List] = {table: [] for table in entries}
+
+    log_entries: List[Tuple[str, LogEntry]] = [
+        (table, entry)
+        for table, entry in entries.items()
+        if isinstance(entry, LogEntry)
+    ]
+    redis_routes: Dict[str, List[str]] = {}
+    for table, entry in entries.items():
+        if isinstance(entry, RedisEntry):
+            for action in entry.actions:
+                redis_routes.setdefault(action, []).append(table)
+
+    for line in lines:
+        if line.startswith(wf_log_redis.LINE_PREFIX):
+            infos = wf_log_redis.split_line(line)
+            if not infos:
+                continue
+            for table in redis_routes.get(infos[0], []):
+                # Strip the action name (e.g. New Patch Registered)
+                selected[table].append(infos[1:])
+        elif line.startswith(wf_log.LINE_PREFIX):
+            for table, entry in log_entries:
+                selected[table] += entry.select(line)
+    return selected
+
+
+def read_lines(
+    file: str, entries: Dict[str, Union[LogEntry, RedisEntry]]
+) -> Dict[str, List]:
+    # Reads the WfPatch log once and routes every line to the entries (by table) it belongs to.
+    # The selected lines of a table are converted with entries[table].to_data_frame(lines[table]).
+    with open(file) as f:
+        return _select_lines(f, entries)
+
+
+def _to_data_frames(
+    lines: Dict[str, List], entries: Dict[str, Union[LogEntry, RedisEntry]]
+) -> Dict[str, pd.DataFrame]:
+    data_frames = {}
+    for table, entry in entries.items():
+        try:
+            data_frames[table] = entry.to_data_frame(lines[table])
+        except Exception as e:
+            raise ValueError(f"Error while loading data for table {table}: {e}") from e
+    return data_frames
+
+
+def _chunks(file: str, chunk_bytes: int) -> List[Tuple[int, int]]:
+    # (start, end) of chunks of about chunk_bytes. Every chunk ends after a newline (or at the end of the file).
+    chunks = []
+    with open(file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        start = 0
+        while start < len(m):
+            newline = m.find(b"\n", min(start + chunk_bytes, len(m)) - 1)
+            end = len(m) if newline == -1 else newline + 1
+            chunks.append((start, end))
+            start = end
+    return chunks
+
+
+def _mapped_lines(m: mmap.mmap, start: int, end: int) -> Iterator[str]:
+    # Lines are read from the mapped file one by one. The chunk is never copied as a whole.
+    m.seek(start)
+    while m.tell() < end:
+        yield m.readline().decode()
+
+
+def _read_chunk(
+    file: str,
+    start: int,
+    end: int,
+    entries: Dict[str, Union[LogEntry, RedisEntry]],
+) -> Dict[str, pd.DataFrame]:
+    with open(file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        return _to_data_frames(
+            _select_lines(_mapped_lines(m, start, end), entries), entries
+        )
+
+
+def read_data_frames(
+    file: str,
+    entries: Dict[str, Union[LogEntry, RedisEntry]],
+    workers: int = 1,
+    chunk_bytes: int = CHUNK_BYTES,
+) -> Dict[str, pd.DataFrame]:
+    # Same as converting the result of read_lines, but a log larger than chunk_bytes is split into chunks that are
+    # parsed by up to workers processes. The data frames of the chunks are concatenated in the order of the chunks,
+    # so the rows are in the order of the log (e.g. for the entry_counter).
+    if workers <= 1 or os.path.getsize(file) <= chunk_bytes:
+        return _to_data_frames(read_lines(file, entries), entries)
+
+    chunks = _chunks(file, chunk_bytes)
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        results = list(
+            pool.map(
+                _read_chunk,
+                *zip(*[(file, start, end, entries) for start, end in chunks]),
+            )
+        )
+
+    data_frames = {}
+    for table in entries:
+        frames = [result[table] for result in results if len(result[table]) > 0]
+        data_frames[table] = (
+            pd.concat(frames, ignore_index=True) if len(frames) > 0 else pd.DataFrame()
+        )
+    return data_frames
@@ -1,117 +1,154 @@
 import re
-from functools import reduce
-from typing import Any, Callable, Dict, List
+from typing import Iterable, List, Optional
 
 import pandas as pd
 
+from data.records import Field, RecordSpec
 
-def _read_data(
-    file: str,
-    line_prefixes: List[str],
-    attribute_conversions: List[Callable[[str], Dict[str, Any]]],
-    ignore_missmatch: bool = True,
-    attrs_must_match_conversions: bool = True,
-) -> pd.DataFrame:
-    redis_pattern = re.compile("\[.*?\]")
+LINE_PREFIX = "[REDIS]"
+REDIS_PATTERN = re.compile(r"\[.*?\]")
+
+
+# A '[REDIS] [<action>] ...' log entry and the fields of its attributes.
+class RedisEntry:
+    def __init__(
+        self,
+        actions: List[str],
+        fields: List[Field],
+        ignore_missmatch: bool = True,
+        attrs_must_match_conversions: bool = True,
+    ):
+        self.actions: List[str] = actions
+        self.spec: RecordSpec = RecordSpec(
+            fields, ignore_missmatch, attrs_must_match_conversions
+        )
+
+    def to_data_frame(self, lines: List[List[str]]) -> pd.DataFrame:
+        return self.spec.to_data_frame(lines)
+
+
+def _to_bool(value: str) -> bool:
+    return int(value) == 1
+
+
+def split_line(line: str) -> Optional[List[str]]:
+    if not line.startswith(LINE_PREFIX):
+        return None
+    # The list looks like this:
+    # ['[REDIS]', '[New Patch Registered]', '[1692389869508.875000]', '[5b1a20d833e88703832b6a0bf7ec99d5dae17bbb]', '[5]', '[5]']  # noqa: E501
+    # We strip the brackets.
+    # And we remove the 'REDIS' from the beginning
+    return [i[1:-1] for i in REDIS_PATTERN.findall(line.strip())][1:]
+
+
+def select_lines(lines: Iterable[str], entry: RedisEntry) -> List[List[str]]:
+    selected: List[List[str]] = []
+    for line in lines:
+        infos = split_line(line)
+        if infos is not None and infos[0] in entry.actions:
+            # And now strip the action name (e.g. New Patch Registered)
+            selected.append(infos[1:])
+    return selected
+
+
+def _read_data(file: str, entry: RedisEntry) -> pd.DataFrame:
     with open(file) as f:
-        lines: List[List[str]] = []
-        for line in [l.strip() for l in f.readlines() if l.startswith("[REDIS]")]:
-            # The list looks like this:
-            # ['[REDIS]', '[New Patch Registered]', '[1692389869508.875000]', '[5b1a20d833e88703832b6a0bf7ec99d5dae17bbb]', '[5]', '[5]']
-            # We strip the brackets.
-            # And we remove the 'REDIS' from the beginning
-            infos = [i[1:-1] for i in redis_pattern.findall(line)][1:]
-            if infos[0] in line_prefixes:
-                # And now strip the action name (e.g. New Patch Registered)
-                lines.append(infos[1:])
-
-    def extract_infos(infos: List[str]) -> pd.DataFrame:
-        if attrs_must_match_conversions and len(infos) != len(attribute_conversions):
-            if not ignore_missmatch:
-                raise ValueError(
-                    "Invalid length of attribute conversions. It must be less or equal the amount of attrs"
-                    f" available. Attributes: {len(attrs)}. Conversions: {len(attribute_conversions)}."
-                    f"{info_line}"
-                )
-            # Return empty data frame
-            return pd.DataFrame()
-        df_data = {
-            key: [value]
-            for idx, fn in enumerate(attribute_conversions)
-            for key, value in fn(infos[idx]).items()
-        }
-        return pd.DataFrame(df_data)
-
-    return reduce(
-        lambda x, y: pd.concat([x, y]),
-        [extract_infos(line) for line in lines],
-        pd.DataFrame(),
-    )
+        return entry.to_data_frame(select_lines(f, entry))
+
+
+# [REDIS] [New Patch Registered] [1692389869508.875000] [5b1a20d833e88703832b6a0bf7ec99d5dae17bbb] [5] [5]
+NEW_PATCH = RedisEntry(
+    ["New Patch Registered"],
+    [
+        Field("time", float),
+        Field("name"),
+        Field("version", int),
+        Field("method", int),
+        Field("from_client", _to_bool),
+    ],
+)
 
 
 def read_new_patch(file: str) -> pd.DataFrame:
-    # [REDIS] [New Patch Registered] [1692389869508.875000] [5b1a20d833e88703832b6a0bf7ec99d5dae17bbb] [5] [5]
-    conversions = [
-        lambda x: {"time": float(x)},
-        lambda x: {"name": x},
-        lambda x: {"version": int(x)},
-        lambda x: {"method": int(x)},
-        lambda x: {"from_client": True if int(x) == 1 else False},
-    ]
-    return _read_data(file, ["New Patch Registered"], conversions)
+    return _read_data(file, NEW_PATCH)
+
+
+# [REDIS] [Patch Applied] [1692389870056.492920] [5b1a20d833e88703832b6a0bf7ec99d5dae17bbb] [11] [5]
+PATCH_APPLIED = RedisEntry(
+    ["Patch Applied"],
+    [
+        Field("time", float),
+        Field("name"),
+        Field("version", int),
+        Field("method", int),
+    ],
+)
 
 
 def read_patch_applied(file: str) -> pd.DataFrame:
-    # [REDIS] [Patch Applied] [1692389870056.492920] [5b1a20d833e88703832b6a0bf7ec99d5dae17bbb] [11] [5]
-    conversions = [
-        lambda x: {"time": float(x)},
-        lambda x: {"name": x},
-        lambda x: {"version": int(x)},
-        lambda x: {"method": int(x)},
-    ]
-    return _read_data(file, ["Patch Applied"], conversions)
+    return _read_data(file, PATCH_APPLIED)
+
+
+# [REDIS] [Patch Signaled] [1701942945820.407715] [9c9a07a85d3400869ab93eeb10c75524d804a987] [0] [9]
+PATCH_SIGNALED = RedisEntry(
+    ["Patch Signaled"],
+    [
+        Field("time", float),
+        Field("name"),
+        Field("version", int),
+        Field("method", int),
+    ],
+)
 
 
 def read_patch_signaled(file: str) -> pd.DataFrame:
-    # [REDIS] [Patch Signaled] [1701942945820.407715] [9c9a07a85d3400869ab93eeb10c75524d804a987] [0] [9]
-    conversions = [
-        lambda x: {"time": float(x)},
-        lambda x: {"name": x},
-        lambda x: {"version": int(x)},
-        lambda x: {"method": int(x)},
-    ]
-    return _read_data(file, ["Patch Signaled"], conversions)
+    return _read_data(file, PATCH_SIGNALED)
+
+
+# [REDIS] [Received Patch] [%lf] [%.40s] [%.40s] [%d] [%d]
+PATCH_RECEIVED = RedisEntry(
+    ["Patch Received"],
+    [
+        Field("time", float),
+        Field("name"),
+        Field("sender"),
+        Field("version", int),
+        Field("method", int),
+    ],
+)
 
 
 def read_patch_received(file: str) -> pd.DataFrame:
-    # [REDIS] [Received Patch] [%lf] [%.40s] [%.40s] [%d] [%d]
-    conversions = [
-        lambda x: {"time": float(x)},
-        lambda x: {"name": x},
-        lambda x: {"sender": x},
-        lambda x: {"version": int(x)},
-        lambda x: {"method": int(x)},
-    ]
-    return _read_data(file, ["Patch Received"], conversions)
+    return _read_data(file, PATCH_RECEIVED)
+
+
+# [REDIS] [Received Patch] [%lf] [%.40s] [%.40s] [%d] [%d]
+PATCH_SENT = RedisEntry(
+    ["Patch Sent"],
+    [
+        Field("time", float),
+        Field("name"),
+        Field("receiver"),
+        Field("version", int),
+    ],
+)
 
 
 def read_patch_sent(file: str) -> pd.DataFrame:
-    # [REDIS] [Received Patch] [%lf] [%.40s] [%.40s] [%d] [%d]
-    conversions = [
-        lambda x: {"time": float(x)},
-        lambda x: {"name": x},
-        lambda x: {"receiver": x},
-        lambda x: {"version": int(x)},
-    ]
-    return _read_data(file, ["Patch Sent"], conversions)
+    return _read_data(file, PATCH_SENT)
+
+
+# [REDIS] [Received Patch] [%lf] [%.40s] [%.40s] [%d] [%d]
+PATCH_REQUEST = RedisEntry(
+    ["Patch Request"],
+    [
+        Field("time", float),
+        Field("name"),
+        Field("receiver"),
+        Field("version", int),
+    ],
+)
 
 
 def read_patch_request(file: str) -> pd.DataFrame:
-    # [REDIS] [Received Patch] [%lf] [%.40s] [%.40s] [%d] [%d]
-    conversions = [
-        lambda x: {"time": float(x)},
-        lambda x: {"name": x},
-        lambda x: {"receiver": x},
-        lambda x: {"version": int(x)},
-    ]
-    return _read_data(file, ["Patch Request"], conversions)
+    return _read_data(file, PATCH_REQUEST)
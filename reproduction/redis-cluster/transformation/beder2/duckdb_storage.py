@@ -5,29 +5,64 @@ import gc
 import multiprocessing as mp
 import os
 import threading
+import time
 from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
-from typing import Optional
+from queue import Empty
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 import duckdb
 import pandas as pd
 import sqlparse
 
+import arrow_transport
+import compact_schema
+from arrow_transport import ArrowInput
 from future_collector import FutureCollector
+from ingest_queue import CHUNK_ROWS, ByteBudget
 
 STAGING_PREFIX = "tmp_staging_"
 
+# table_name of the manifest rows that mark a run as completely loaded (see DuckDBStorage.record_complete)
+MANIFEST_COMPLETE = "<complete>"
+
+# Tables that store every object once, identified by the content hash (column). They are not part of a run.
+CONTENT_ADDRESSED_TABLES = {"patch_elf_object": "hash"}
+
+# DuckDBStorageThread buffers inserted DataFrames per table. A buffer is appended once it has FLUSH_ROWS rows,
+# FLUSH_BYTES bytes (without the contents of strings) or its oldest frame is FLUSH_INTERVAL_S seconds old.
+# Buffered frames count against the ByteBudget of the queue; if the buffers use up half of it, the largest is flushed.
+FLUSH_ROWS = 1_000_000
+FLUSH_BYTES = 256 * 1024 * 1024
+FLUSH_INTERVAL_S = 5.0
+
+# Sharded storage (see beder2 --sharded): Every experiment is a directory (shard) with one Parquet file per table in
+# <output>.shards. The output database only contains views that read the tables of all shards.
+SHARDS_SUFFIX = ".shards"
+
+
+# The result of the query is inserted into a table. The query is executed by the storage (i.e., the thread owning
+# the connection), so e.g. a read_csv(...) query does not send any data through the queue.
+class QueryInput:
+    def __init__(self, query: str):
+        self.query: str = query
+
 
 class Storage:
     def insert(self, table: str, df_input_data: pd.DataFrame):
         pass
 
+    def insert_query(self, table: str, query: str):
+        pass
+
 
 class DuckDBStorage(Storage):
-    def __init__(self, database_file: str):
+    def __init__(self, database_file: str, compact: bool = False):
         super().__init__()
         self._database_file = database_file
         self._con: Optional[duckdb.DuckDBPyConnection] = None
         self._tables_creation_order: List[str] = []
+        # Use the compact physical schema (see compact_schema). Inserted data is converted by the storage.
+        self._compact: bool = compact
 
     def connect(self, read_only: bool = False) -> DuckDBStorage:
         if self._con is not None:
@@ -42,12 +77,7 @@ class DuckDBStorage(Storage):
         self._con = None
 
     def create_tables(self):
-        with open(
-            os.path.join(
-                os.path.realpath(os.path.dirname(__file__)), "queries/create.sql"
-            )
-        ) as f:
-            sql = f.read()
+        sql = self._read_query("create.sql")
 
         # Block to get creation order
         statements = sqlparse.parse(sql)
@@ -62,7 +92,96 @@ class DuckDBStorage(Storage):
             ][0]
             self._tables_creation_order.append(table_name.get_name())
 
-        self._con.execute(sql)
+        has_compact_schema = compact_schema.exists(self._con)
+        if not self._compact:
+            if has_compact_schema:
+                raise ValueError(
+                    f"{self._database_file} uses the compact schema. Use --compact-schema to add data."
+                )
+            self._con.execute(sql)
+        else:
+            if not has_compact_schema and len(self._get_tables()) > 0:
+                raise ValueError(
+                    f"{self._database_file} does not use the compact schema. It cannot be used with --compact-schema."
+                )
+            compact_schema.create(self._con, sql, self._get_tables_creation_order())
+        self._migrate_patch_elf()
+        self._create_views()
+
+    def _create_views(self):
+        # The views are replaced, so they always have the current definition.
+        for stmt in sqlparse.parse(self._read_query("views.sql")):
+            if stmt.get_type().startswith("CREATE"):
+                self._con.execute(str(stmt))
+
+    def _migrate_patch_elf(self):
+        # Databases created before the sections were stored by content hash have a patch_elf table (in the compact
+        # schema: a table in COMPACT_SCHEMA and a view in main). Its rows are moved into patch_elf_object and
+        # patch_elf_file, then the table is dropped and replaced by the view of views.sql.
+        # The file contents are unknown, so the hash of a migrated file is the MD5 of its sections (prefixed with
+        # "migrated-", it never equals a SHA-256 of a file). section_index, symbols and relocations are NULL.
+        schemas = [
+            row[0]
+            for row in self._con.execute(
+                "SELECT schema_name FROM duckdb_tables() WHERE database_name = current_database() "
+                "AND table_name = 'patch_elf';"
+            ).fetchall()
+        ]
+        if "main" not in schemas and compact_schema.COMPACT_SCHEMA not in schemas:
+            return
+        print(f"[START] {datetime.datetime.now()} Migrate patch_elf")
+        files = """
+            SELECT
+                run_id,
+                file_name,
+                'migrated-' || md5(string_agg(
+                    concat_ws('/', section_name, size_bytes, type), ',' ORDER BY section_name, size_bytes, type
+                )) AS hash
+            FROM main.patch_elf
+            GROUP BY run_id, file_name
+        """
+        self._con.execute("BEGIN TRANSACTION;")
+        try:
+            self._insert_select(
+                "patch_elf_object",
+                f"""
+                SELECT DISTINCT f.hash, e.section_name, e.size_bytes, e.type
+                FROM main.patch_elf AS e
+                JOIN ({files}) AS f ON e.run_id IS NOT DISTINCT FROM f.run_id
+                    AND e.file_name IS NOT DISTINCT FROM f.file_name
+                WHERE f.hash NOT IN (SELECT hash FROM patch_elf_object)
+                """,
+            )
+            self._insert_select(
+                "patch_elf_file", f"SELECT file_name, hash, run_id FROM ({files})"
+            )
+            if "main" in schemas:
+                self._con.execute("DROP TABLE main.patch_elf;")
+            else:
+                self._con.execute("DROP VIEW main.patch_elf;")
+                self._con.execute(
+                    f"DROP TABLE {compact_schema.COMPACT_SCHEMA}.patch_elf;"
+                )
+                self._con.execute(
+                    f"DROP TABLE IF EXISTS {compact_schema.LOGICAL_SCHEMA}.patch_elf;"
+                )
+            self._con.execute("COMMIT;")
+        except Exception as e:
+            self._con.execute("ROLLBACK;")
+            raise e
+        print(f"[END] {datetime.datetime.now()} Migrate patch_elf")
+
+    def create_derived_tables(self):
+        # Tables derived from all loaded runs (see queries/derived.sql)
+        print(f"[START] {datetime.datetime.now()} Create derived tables")
+        self._con.execute(self._read_query("derived.sql"))
+        print(f"[END] {datetime.datetime.now()} Create derived tables")
+
+    def _read_query(self, file: str) -> str:
+        with open(
+            os.path.join(os.path.realpath(os.path.dirname(__file__)), "queries", file)
+        ) as f:
+            return f.read()
 
     def _get_tables(self) -> List[str]:
         return [tbl[0] for tbl in self._con.execute("SHOW TABLES;").fetchall()]
@@ -72,26 +191,333 @@ class DuckDBStorage(Storage):
         return list(self._tables_creation_order)
 
     def insert(self, table: str, df_input_data: pd.DataFrame):
+        if self._compact:
+            self._insert_data_frame(table, df_input_data)
+            return
         query = f"INSERT INTO {table}({', '.join(df_input_data.columns)}) SELECT * FROM df_input_data;"
         print(query)
         self._con.execute(query)
 
+    def insert_query(self, table: str, query: str):
+        self._insert_select(table, query)
+
+    def _insert_select(self, table: str, query: str):
+        if self._compact:
+            compact_schema.insert(self._con, table, query)
+            return
+        self._con.execute(f"INSERT INTO {table} BY NAME {query};")
+
+    def _insert_data_frame(self, table: str, df_input_data: pd.DataFrame):
+        if not self._compact:
+            self._con.append(table, df_input_data, by_name=True)
+            return
+        self._con.register("df_input_data", df_input_data)
+        try:
+            compact_schema.insert(self._con, table, "SELECT * FROM df_input_data")
+        finally:
+            self._con.unregister("df_input_data")
+
+    def _attach_staging(self, file: str, alias: str, timeout_s: float = 60):
+        # Pool workers may still be exiting (and holding the lock of their staging file) although all tasks are done.
+        deadline = time.time() + timeout_s
+        while True:
+            try:
+                self._con.execute(f"ATTACH '{file}' AS {alias} (READ_ONLY);")
+                return
+            except duckdb.IOException as e:
+                if "lock" not in str(e) or time.time() > deadline:
+                    raise e
+                time.sleep(0.5)
+
+    def get_manifest(self) -> Dict[str, List[Tuple[str, int, float]]]:
+        # run_id -> [(file, size_bytes, mtime)] of the completely loaded runs
+        manifest: Dict[str, List[Tuple[str, int, float]]] = {}
+        for run_id, file, size_bytes, mtime in self._con.execute(
+            "SELECT DISTINCT run_id, file, size_bytes, mtime FROM ingest_manifest WHERE table_name = ?;",
+            [MANIFEST_COMPLETE],
+        ).fetchall():
+            manifest.setdefault(run_id, []).append((file, size_bytes, mtime))
+        return manifest
+
+    def record_complete(self, run_id: str, files: List[Tuple[str, int, float]]):
+        # files: All files of the run directory (file, size_bytes, mtime) before the run was loaded. They must only be
+        # recorded once all data of the run is stored, otherwise an interrupted load is skipped next time.
+        self._insert_data_frame(
+            "ingest_manifest",
+            pd.DataFrame(
+                {
+                    "run_id": [run_id] * len(files),
+                    "file": [file for file, _, _ in files],
+                    "size_bytes": [size_bytes for _, size_bytes, _ in files],
+                    "mtime": [mtime for _, _, mtime in files],
+                    "table_name": [MANIFEST_COMPLETE] * len(files),
+                }
+            ),
+        )
+
+    def get_run_ids(self) -> List[str]:
+        return [
+            row[0] for row in self._con.execute("SELECT run_id FROM run;").fetchall()
+        ]
+
+    def delete_run(self, run_id: str):
+        # Content addressed objects may be used by other runs. They are kept.
+        tables = [
+            table
+            for table in self._get_tables_creation_order()
+            if table not in CONTENT_ADDRESSED_TABLES
+        ]
+        if self._compact:
+            compact_schema.delete_run(self._con, tables, run_id)
+            return
+        for table in tables:
+            self._con.execute(f"DELETE FROM {table} WHERE run_id = ?;", [run_id])
+
+    def export_shard(self, shard_dir: str):
+        # Every table of main (views and the compact representation are not exported) is written to
+        # <shard_dir>/<table>.parquet.
+        os.makedirs(shard_dir, exist_ok=True)
+        for (table,) in self._con.execute(
+            "SELECT table_name FROM duckdb_tables() WHERE database_name = current_database() "
+            "AND schema_name = 'main';"
+        ).fetchall():
+            file = os.path.join(shard_dir, f"{table}.parquet").replace("'", "''")
+            self._con.execute(f"COPY {table} TO '{file}' (FORMAT PARQUET);")
+
+    def create_shard_views(self, shards_dir: str):
+        # The views read the files of all shards when they are queried, so shards can be added, replaced and
+        # deleted without changing the views. Only tables that are in at least one shard get a view.
+        tables = sorted(
+            {
+                file.removesuffix(".parquet")
+                for shard in os.listdir(shards_dir)
+                if os.path.isdir(os.path.join(shards_dir, shard))
+                for file in os.listdir(os.path.join(shards_dir, shard))
+                if file.endswith(".parquet")
+            }
+        )
+        for table in tables:
+            files = os.path.join(shards_dir, "*", f"{table}.parquet").replace("'", "''")
+            # The same object may be in several shards.
+            distinct = "DISTINCT " if table in CONTENT_ADDRESSED_TABLES else ""
+            self._con.execute(
+                f"CREATE OR REPLACE VIEW {table} AS SELECT {distinct}* FROM read_parquet('{files}', "
+                "union_by_name = true);"
+            )
+        self._create_views()
+
+    def merge_staging(self, staging_dir: str):
+        # Copies the data of all staging files (see DuckDBStagingStorage) with one INSERT per table.
+        aliases = []
+        for file in sorted(os.listdir(staging_dir)):
+            if not (file.startswith(STAGING_PREFIX) and file.endswith(".duckdb")):
+                continue
+            alias = file.removesuffix(".duckdb")
+            self._attach_staging(os.path.join(staging_dir, file), alias)
+            aliases.append(alias)
+        if len(aliases) == 0:
+            return
+
+        for table in self._get_tables_creation_order():
+            print(f"[START] {datetime.datetime.now()} Merge staging {table}")
+            staged = " UNION ALL ".join(
+                f"SELECT * FROM {alias}.{table}" for alias in aliases
+            )
+            if table in CONTENT_ADDRESSED_TABLES:
+                # The same object may be in several staging files and in the database already.
+                key = CONTENT_ADDRESSED_TABLES[table]
+                staged = f"SELECT DISTINCT * FROM ({staged}) WHERE {key} NOT IN (SELECT {key} FROM {table})"
+            self._insert_select(table, staged)
+            print(f"[END] {datetime.datetime.now()} Merge staging {table}")
+
+        for alias in aliases:
+            self._con.execute(f"DETACH {alias};")
+
 
 class StorageProcessCollector(Storage):
-    def __init__(self, queue: mp.JoinableQueue):
+    def __init__(
+        self,
+        queue: mp.JoinableQueue,
+        transport_dir: Optional[str] = None,
+        budget: Optional[ByteBudget] = None,
+        chunk_rows: int = CHUNK_ROWS,
+    ):
         self._queue: mp.JoinableQueue = queue
+        # If set, DataFrames are written as Arrow IPC files into this directory instead of pickling them through
+        # the queue.
+        self._transport_dir: Optional[str] = transport_dir
+        # If set, inserts block while the DataFrames in the queue use up the budget.
+        self._budget: Optional[ByteBudget] = budget
+        self._chunk_rows: int = chunk_rows
 
     def insert(self, table: str, df_input_data: pd.DataFrame):
-        self._queue.put((table, df_input_data))
+        # Empty DataFrames are not inserted at all.
+        for start in range(0, len(df_input_data), self._chunk_rows):
+            end = start + self._chunk_rows
+            self._put(table, df_input_data.iloc[start:end])
+
+    def _put(self, table: str, df_input_data: pd.DataFrame):
+        size_bytes = int(df_input_data.memory_usage(index=False, deep=True).sum())
+        if self._budget is not None:
+            self._budget.acquire(size_bytes)
+        if self._transport_dir is not None:
+            self._queue.put(
+                (
+                    table,
+                    arrow_transport.write(self._transport_dir, df_input_data),
+                    size_bytes,
+                )
+            )
+            return
+        self._queue.put((table, df_input_data, size_bytes))
+
+    def insert_query(self, table: str, query: str):
+        self._queue.put((table, QueryInput(query), 0))
+
+
+# Records the file the data comes from in the ingest manifest for every insert. These rows only tell where the data
+# of a table comes from, whether a run is loaded completely is recorded by DuckDBStorage.record_complete.
+class ManifestStorage(Storage):
+    def __init__(self, storage: Storage, run_id: str, file: Union[str, List[str]]):
+        # If the data comes from several files, every file is recorded.
+        self._storage: Storage = storage
+        self._run_id: str = run_id
+        self._files: List[str] = [
+            os.path.realpath(f) for f in ([file] if isinstance(file, str) else file)
+        ]
+        # Stat the files before they are read. Changes while reading are detected on the next load.
+        stats = [os.stat(f) if os.path.exists(f) else None for f in self._files]
+        self._size_bytes: List[Optional[int]] = [
+            stat.st_size if stat else None for stat in stats
+        ]
+        self._mtime: List[Optional[float]] = [
+            stat.st_mtime if stat else None for stat in stats
+        ]
+
+    def record(self, table: str, rows: Optional[int]):
+        self._storage.insert(
+            "ingest_manifest",
+            pd.DataFrame(
+                {
+                    "run_id": [self._run_id] * len(self._files),
+                    "file": self._files,
+                    "size_bytes": self._size_bytes,
+                    "mtime": self._mtime,
+                    "table_name": [table] * len(self._files),
+                    # The rows per file are not known if there are several files.
+                    "rows": [rows if len(self._files) == 1 else None]
+                    * len(self._files),
+                }
+            ),
+        )
+
+    def insert(self, table: str, df_input_data: pd.DataFrame):
+        self._storage.insert(table, df_input_data)
+        self.record(table, len(df_input_data))
+
+    def insert_query(self, table: str, query: str):
+        self._storage.insert_query(table, query)
+        # The number of rows is not known here.
+        self.record(table, None)
+
+
+# Connections of DuckDBStagingStorage by (staging dir, pid). The storage object itself is pickled for every task,
+# so the connection of a process is kept here.
+_staging_storages: Dict[Tuple[str, int], DuckDBStorage] = {}
+
+
+class DuckDBStagingStorage(Storage):
+    # Every process writes into its own DuckDB file (tmp_staging_<slot>.duckdb) in the staging directory, so inserts
+    # are not serialized through a single writer. The files are merged with DuckDBStorage.merge_staging.
+    # A process uses the first file that no other process has open (DuckDB locks open files). Files are reused by
+    # later processes (e.g. the pools of the next runs), so there are only as many files as concurrent processes.
+    def __init__(self, staging_dir: str):
+        self._staging_dir: str = staging_dir
+
+    def _connect(self) -> DuckDBStorage:
+        slot = 0
+        while True:
+            storage = DuckDBStorage(
+                os.path.join(self._staging_dir, f"{STAGING_PREFIX}{slot}.duckdb")
+            )
+            try:
+                return storage.connect()
+            except duckdb.IOException as e:
+                if "lock" not in str(e):
+                    raise e
+                slot += 1
+
+    def _storage(self) -> DuckDBStorage:
+        # Processes may be forked. Never reuse the connection of the parent process.
+        key = (self._staging_dir, os.getpid())
+        if key not in _staging_storages:
+            storage = self._connect()
+            storage.create_tables()
+            _staging_storages[key] = storage
+        return _staging_storages[key]
+
+    def close(self):
+        # Closes the staging file of this process, so it can be merged.
+        storage = _staging_storages.pop((self._staging_dir, os.getpid()), None)
+        if storage is not None:
+            storage.close()
+
+    def insert(self, table: str, df_input_data: pd.DataFrame):
+        # Each insert is committed on its own. Data that is only in the WAL of a file is read when merging.
+        self._storage()._con.append(table, df_input_data, by_name=True)
+
+    def insert_query(self, table: str, query: str):
+        self._storage().insert_query(table, query)
+
+
+# Buffered DataFrames of one table that are appended at once.
+class InsertBuffer:
+    def __init__(self, table: str):
+        self.table: str = table
+        self.frames: List[pd.DataFrame] = []
+        self.rows: int = 0
+        self.bytes: int = 0
+        # Bytes of the frames that are reserved in the ByteBudget. They are released when the buffer is flushed.
+        self.reserved_bytes: int = 0
+        self.created: float = time.time()
+
+    def add(self, df_input_data: pd.DataFrame, reserved_bytes: int):
+        self.frames.append(df_input_data)
+        self.rows += len(df_input_data)
+        self.bytes += int(df_input_data.memory_usage(index=False).sum())
+        self.reserved_bytes += reserved_bytes
+
+    def is_full(self) -> bool:
+        return self.rows >= FLUSH_ROWS or self.bytes >= FLUSH_BYTES
+
+    def data(self) -> pd.DataFrame:
+        if len(self.frames) == 1:
+            return self.frames[0]
+        return pd.concat(self.frames, ignore_index=True)
 
 
 class DuckDBStorageThread(DuckDBStorage, threading.Thread):
-    def __init__(self, database_file: str, queue: mp.JoinableQueue):
-        super().__init__(database_file)
+    def __init__(
+        self,
+        database_file: str,
+        queue: mp.JoinableQueue,
+        compact: bool = False,
+        budget: Optional[ByteBudget] = None,
+    ):
+        super().__init__(database_file, compact)
         self._queue: mp.JoinableQueue = queue
+        # The budget of the producers (see StorageProcessCollector). Queue items carry their reserved bytes.
+        self._budget: Optional[ByteBudget] = budget
+        self._error: Optional[Exception] = None
+        # (table, columns) -> buffer. Only frames with the same columns are concatenated, missing columns would
+        # change the types of the other frames.
+        self._buffers: Dict[Tuple[str, Tuple[str, ...]], InsertBuffer] = {}
 
     def insert(self, table: str, df_input_data: pd.DataFrame):
-        self._queue.put((table, df_input_data))
+        self._queue.put((table, df_input_data, 0))
+
+    def insert_query(self, table: str, query: str):
+        self._queue.put((table, QueryInput(query), 0))
 
     def create_tables(self):
         super().create_tables()
@@ -100,19 +526,128 @@ class DuckDBStorageThread(DuckDBStorage, threading.Thread):
 
     def close(self):
         self._queue.join()
-        self._queue.put((None, None))
+        self._queue.put((None, None, 0))
         self._queue.join()
         super().close()
+        if self._error is not None:
+            raise self._error
+
+    def _insert_arrow(self, table: str, arrow_input: ArrowInput):
+        with arrow_transport.read(arrow_input) as arrow_table:
+            self._con.register("arrow_input_data", arrow_table)
+            try:
+                self._insert_select(table, "SELECT * FROM arrow_input_data")
+            finally:
+                self._con.unregister("arrow_input_data")
+
+    def _insert(self, table: str, insert: Callable[[], None]):
+        print(f"[START] {datetime.datetime.now()} Insert {table}")
+        try:
+            insert()
+        except Exception as e:
+            # Keep consuming the queue, otherwise close() waits forever. The error is raised on close().
+            print(f"Error while inserting data into table {table}")
+            print(e)
+            self._error = e
+        print(f"[END] {datetime.datetime.now()} Insert {table}")
+
+    def _flush(self, key: Tuple[str, Tuple[str, ...]]):
+        buffer = self._buffers.pop(key)
+        print(
+            f"Flush {len(buffer.frames)} frames ({buffer.rows} rows) of {buffer.table}"
+        )
+        self._insert(
+            buffer.table,
+            lambda: self._insert_data_frame(buffer.table, buffer.data()),
+        )
+        if self._budget is not None and buffer.reserved_bytes > 0:
+            self._budget.release(buffer.reserved_bytes)
+
+    def _flush_run(self, table: str):
+        # All tables reference the run (the compact schema needs the run_key), so it is always inserted first.
+        if table == compact_schema.RUN_TABLE:
+            return
+        for key in [key for key in self._buffers if key[0] == compact_schema.RUN_TABLE]:
+            self._flush(key)
+
+    def _flush_all(self):
+        for key in sorted(
+            self._buffers, key=lambda k: k[0] != compact_schema.RUN_TABLE
+        ):
+            self._flush(key)
+
+    def _flush_expired(self) -> Optional[float]:
+        # Flushes all buffers older than FLUSH_INTERVAL_S. Returns the time until the next buffer expires.
+        now = time.time()
+        for key in [
+            key
+            for key, buffer in self._buffers.items()
+            if now - buffer.created >= FLUSH_INTERVAL_S
+        ]:
+            self._flush_run(key[0])
+            if key in self._buffers:
+                self._flush(key)
+        if len(self._buffers) == 0:
+            return None
+        return max(
+            0.0,
+            min(buffer.created for buffer in self._buffers.values())
+            + FLUSH_INTERVAL_S
+            - time.time(),
+        )
+
+    def _buffer(self, table: str, df_input_data: pd.DataFrame, size_bytes: int):
+        # size_bytes: The bytes reserved in the budget. They stay reserved while the frame is buffered.
+        if len(df_input_data) == 0:
+            if self._budget is not None and size_bytes > 0:
+                self._budget.release(size_bytes)
+            return
+        key = (table, tuple(df_input_data.columns))
+        if key not in self._buffers:
+            self._buffers[key] = InsertBuffer(table)
+        self._buffers[key].add(df_input_data, size_bytes)
+        if self._buffers[key].is_full():
+            self._flush_run(table)
+            self._flush(key)
+        elif (
+            self._budget is not None
+            and sum(buffer.reserved_bytes for buffer in self._buffers.values())
+            >= self._budget.budget_bytes() / 2
+        ):
+            # The buffers use up half of the budget. Flush the largest one, so the producers do not wait for the
+            # buffers to expire.
+            key = max(self._buffers, key=lambda k: self._buffers[k].reserved_bytes)
+            self._flush_run(key[0])
+            if key in self._buffers:
+                self._flush(key)
 
     def run(self):
         while True:
-            table, df_input_data = self._queue.get()
+            try:
+                table, df_input_data, size_bytes = self._queue.get(
+                    timeout=self._flush_expired()
+                )
+            except Empty:
+                continue
 
             # Abort gracefully
             if table is None and df_input_data is None:
+                # Everything that is still buffered is inserted before close() returns.
+                self._flush_all()
                 self._queue.task_done()
                 break
-            print(f"[START] {datetime.datetime.now()} Insert {table}")
-            self._con.append(table, df_input_data, by_name=True)
-            print(f"[END] {datetime.datetime.now()} Insert {table}")
+            if isinstance(df_input_data, QueryInput):
+                self._flush_run(table)
+                self._insert(
+                    table, lambda: self._insert_select(table, df_input_data.query)
+                )
+            elif isinstance(df_input_data, ArrowInput):
+                self._flush_run(table)
+                self._insert(table, lambda: self._insert_arrow(table, df_input_data))
+            else:
+                # Buffered DataFrames count against the budget until they are flushed.
+                self._buffer(table, df_input_data, size_bytes)
+                size_bytes = 0
+            if self._budget is not None and size_bytes > 0:
+                self._budget.release(size_bytes)
             self._queue.task_done()
@@ -12,11 +12,12 @@ class FutureCollector:
         return f
 
     def shutdown(self):
-        self.pool.shutdown(wait=False)
         for future in concurrent.futures.as_completed(self.futures.keys()):
             try:
                 future.result()
             except Exception as e:
                 print(f"Error in function: {self.futures[future]}")
+                self.pool.shutdown(wait=False, cancel_futures=True)
                 raise e
+        # Wait until the workers exited. A shutdown(wait=False) before would skip waiting.
         self.pool.shutdown()
@@ -0,0 +1,223 @@
+import datetime
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser, Namespace
+from typing import Any, Dict, List, Tuple
+
+import duckdb
+import psutil
+
+# Measures the ingest of beder2, e.g. of experiments written by synthetic_experiment.py:
+#   python beder2/synthetic_experiment.py --output /tmp/synthetic --runs 4
+#   python beder2/ingest_benchmark.py --benchmark /tmp/synthetic --repeat 3 --bulk-latencies
+# Unknown arguments are passed to beder2. Every repetition loads into a new database (and patch ELF cache).
+# Reported per run: wall time, rows/s and MB/s (input files), peak RSS of beder2 and all its processes and the time
+# the DuckDB writer spent per table (from the [START]/[END] lines of the log).
+BEDER2_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Peak RSS is sampled with this interval.
+SAMPLE_INTERVAL_S = 0.1
+
+LOG_STEP_PATTERN = re.compile(r"^\[(START|END)\] (\S+ \S+) (.+)$")
+CREATE_PATTERN = re.compile(
+    r"CREATE\s+(?:OR\s+REPLACE\s+)?(?:TABLE|VIEW)\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)",
+    re.IGNORECASE,
+)
+
+
+def _derived_tables() -> List[str]:
+    # Derived tables and views contain rows of the loaded tables. They do not count as loaded rows.
+    names = []
+    for file in ["derived.sql", "views.sql"]:
+        with open(os.path.join(BEDER2_DIR, "queries", file)) as f:
+            names += CREATE_PATTERN.findall(f.read())
+    return names
+
+
+def _input_bytes(dirs: List[str]) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, file))
+        for input_dir in dirs
+        for root, _, files in os.walk(input_dir)
+        for file in files
+    )
+
+
+def _tree_rss(process: psutil.Process) -> int:
+    rss = 0
+    for p in [process, *process.children(recursive=True)]:
+        try:
+            rss += p.memory_info().rss
+        except psutil.NoSuchProcess:
+            pass
+    return rss
+
+
+def _step_times(log_file: str) -> Dict[str, float]:
+    # Seconds per step (e.g. 'Insert latencies'). Steps of several processes may overlap, so their times are
+    # summed up.
+    started: Dict[str, List[datetime.datetime]] = {}
+    times: Dict[str, float] = {}
+    with open(log_file) as f:
+        for line in f:
+            match = LOG_STEP_PATTERN.match(line.strip())
+            if match is None:
+                continue
+            event, timestamp, step = match.groups()
+            timestamp = datetime.datetime.fromisoformat(timestamp)
+            if event == "START":
+                started.setdefault(step, []).append(timestamp)
+            elif len(started.get(step, [])) > 0:
+                duration = (timestamp - started[step].pop()).total_seconds()
+                times[step] = times.get(step, 0.0) + duration
+    return times
+
+
+def _table_rows(database_file: str) -> Dict[str, int]:
+    con = duckdb.connect(database_file, read_only=True)
+    try:
+        return {
+            table: con.execute(f"SELECT COUNT(*) FROM {table};").fetchone()[0]
+            for (table,) in con.execute("SHOW TABLES;").fetchall()
+        }
+    finally:
+        con.close()
+
+
+def run_once(
+    input_args: List[str], input_dirs: List[str], beder2_args: List[str], work_dir: str
+) -> Dict[str, Any]:
+    output = os.path.join(work_dir, "benchmark.duckdb")
+    log_file = os.path.join(work_dir, "beder2.log")
+    command = [sys.executable, BEDER2_DIR, *input_args, "--output", output]
+    if "--patch-elf-cache" not in beder2_args:
+        command += ["--patch-elf-cache", os.path.join(work_dir, "patch-elf-cache")]
+    command += beder2_args
+    print(command)
+
+    peak_rss_bytes = 0
+    start = time.time()
+    with open(log_file, "w") as log:
+        process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)
+        ps_process = psutil.Process(process.pid)
+        while process.poll() is None:
+            try:
+                peak_rss_bytes = max(peak_rss_bytes, _tree_rss(ps_process))
+            except psutil.NoSuchProcess:
+                pass
+            time.sleep(SAMPLE_INTERVAL_S)
+    wall_s = time.time() - start
+    if process.returncode != 0:
+        with open(log_file) as f:
+            print("".join(f.readlines()[-30:]))
+        raise subprocess.CalledProcessError(process.returncode, command)
+
+    table_rows = _table_rows(output)
+    derived = _derived_tables()
+    rows = sum(count for table, count in table_rows.items() if table not in derived)
+    input_bytes = _input_bytes(input_dirs)
+    return {
+        "wall_s": wall_s,
+        "rows": rows,
+        "rows_per_s": rows / wall_s,
+        "input_mb": input_bytes / 1024 / 1024,
+        "mb_per_s": input_bytes / 1024 / 1024 / wall_s,
+        "peak_rss_mb": peak_rss_bytes / 1024 / 1024,
+        "table_rows": table_rows,
+        "step_s": _step_times(log_file),
+    }
+
+
+def _print_run(index: int, result: Dict[str, Any]):
+    print(
+        f"Run {index}: {result['wall_s']:.2f} s, {result['rows']:,} rows ({result['rows_per_s']:,.0f} rows/s), "
+        f"{result['input_mb']:.1f} MB ({result['mb_per_s']:.2f} MB/s), peak RSS {result['peak_rss_mb']:.1f} MB"
+    )
+
+
+def _print_steps(result: Dict[str, Any]):
+    steps: List[Tuple[str, float]] = sorted(
+        result["step_s"].items(), key=lambda step: step[1], reverse=True
+    )
+    print(f"{'Step':<45} {'Rows':>12} {'Time (s)':>10}")
+    for step, seconds in steps:
+        table = step.split()[-1]
+        rows = result["table_rows"].get(table)
+        print(f"{step:<45} {'' if rows is None else f'{rows:,}':>12} {seconds:>10.2f}")
+
+
+def _parse_arguments(input_args: List[str]) -> Tuple[Namespace, List[str]]:
+    parser = ArgumentParser(
+        description="Benchmark the ingest of beder2. Unknown arguments are passed to beder2."
+    )
+    input_parser = parser.add_mutually_exclusive_group(required=True)
+    input_parser.add_argument(
+        "--experiment", help="The directory containing the experiment."
+    )
+    input_parser.add_argument(
+        "--benchmark", help="The directory containing all the experiment directories."
+    )
+
+    parser.add_argument(
+        "--repeat",
+        help="The number of times the data is loaded.",
+        type=int,
+        default=1,
+    )
+
+    parser.add_argument(
+        "--work-dir",
+        help="Directory of the databases and logs of the runs. They are deleted after every run.",
+        default=tempfile.gettempdir(),
+    )
+
+    parser.add_argument(
+        "--json",
+        help="Write the results of all runs to this file (e.g. to compare them with a later benchmark).",
+        default=None,
+    )
+    return parser.parse_known_args(input_args)
+
+
+def main(input_args: List[str]):
+    args, beder2_args = _parse_arguments(input_args)
+    if args.experiment:
+        input_args = ["--experiment", args.experiment]
+        input_dirs = [args.experiment]
+    else:
+        input_args = ["--benchmark", args.benchmark]
+        input_dirs = [args.benchmark]
+
+    results = []
+    for index in range(1, args.repeat + 1):
+        work_dir = tempfile.mkdtemp(prefix="beder2-benchmark-", dir=args.work_dir)
+        try:
+            result = run_once(input_args, input_dirs, beder2_args, work_dir)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        results.append(result)
+        _print_run(index, result)
+
+    # Steps of the median run
+    median_run = sorted(results, key=lambda result: result["wall_s"])[len(results) // 2]
+    _print_steps(median_run)
+    print(
+        f"Median: {statistics.median(result['wall_s'] for result in results):.2f} s, "
+        f"{statistics.median(result['rows_per_s'] for result in results):,.0f} rows/s, "
+        f"{statistics.median(result['mb_per_s'] for result in results):.2f} MB/s, "
+        f"peak RSS {max(result['peak_rss_mb'] for result in results):.1f} MB (max)"
+    )
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump({"beder2_args": beder2_args, "runs": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
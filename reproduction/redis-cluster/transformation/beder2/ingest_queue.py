@@ -0,0 +1,45 @@
+import threading
+from multiprocessing.managers import SyncManager
+
+# Rows per DataFrame that is sent through the ingest queue. Larger DataFrames are split.
+CHUNK_ROWS = 100_000
+
+
+# Limits the bytes of the DataFrames in the ingest queue. Producers reserve the bytes of a DataFrame before putting
+# it into the queue and block while the budget is used up. The storage thread releases them once the DataFrame is
+# inserted (DataFrames it buffers keep their bytes until the buffer is flushed). The object lives in the manager
+# process, so all worker processes share it.
+class ByteBudget:
+    def __init__(self, budget_bytes: int):
+        self._budget_bytes: int = budget_bytes
+        self._used_bytes: int = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, size_bytes: int):
+        with self._condition:
+            # A DataFrame that is larger than the budget is only put into an empty queue.
+            self._condition.wait_for(
+                lambda: self._used_bytes == 0
+                or self._used_bytes + size_bytes <= self._budget_bytes
+            )
+            self._used_bytes += size_bytes
+
+    def release(self, size_bytes: int):
+        with self._condition:
+            self._used_bytes -= size_bytes
+            self._condition.notify_all()
+
+    def budget_bytes(self) -> int:
+        return self._budget_bytes
+
+    def used_bytes(self) -> int:
+        with self._condition:
+            return self._used_bytes
+
+
+# Manager of the ingest queue and its ByteBudget.
+class IngestManager(SyncManager):
+    pass
+
+
+IngestManager.register("ByteBudget", ByteBudget)
@@ -1,17 +1,19 @@
 import hashlib
-import multiprocessing
 import os
 import random
 import re
+import shutil
 import sys
+import tempfile
 from argparse import ArgumentParser, Namespace
 from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from functools import reduce
 from multiprocessing.managers import BaseManager
-from typing import Callable, List, Optional
+from typing import Callable, List, Optional, Tuple, Union
 
 import pandas as pd
 
+import arrow_transport
 import data.cluster_status as cluster_status
 import data.db_keys as db_keys
 import data.experiment_info as experiment_info
@@ -22,18 +24,57 @@ import data.redis_log as redis_log
 import data.redis_network as redis_network
 import data.redis_network_summary as redis_network_summary
 import data.wf_log as wf_log
+import data.wf_log_multiplex as wf_log_multiplex
 import data.wf_log_redis as wf_log_redis
 from duckdb_storage import (
+    FLUSH_BYTES,
+    SHARDS_SUFFIX,
+    DuckDBStagingStorage,
     DuckDBStorage,
     DuckDBStorageThread,
+    ManifestStorage,
     Storage,
     StorageProcessCollector,
 )
 from future_collector import FutureCollector
+from ingest_queue import CHUNK_ROWS, ByteBudget, IngestManager
+from scheduler import Task, TaskScheduler, default_memory_budget_bytes
 
 USE_RANDOM_RUN_ID = False
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# (table, file name) of the network and IO files of every node
+NETWORK_FILES = [
+    ("redis_all_network", "network-all.csv"),
+    ("redis_cluster_network", "network-cluster.csv"),
+    ("redis_io_write", "io-write-all.csv"),
+    ("redis_io_read", "io-read-all.csv"),
+]
+
+# (table, log entry, count entries, time division)
+WF_LOG_TABLES = [
+    ("wf_l_birth", wf_log.BIRTH, False, 1),
+    ("wf_l_death", wf_log.DEATH, False, 1),
+    ("wf_l_apply", wf_log.APPLY, True, 1),
+    ("wf_l_finished", wf_log.FINISHED, True, 1),
+    ("wf_l_migrated", wf_log.MIGRATED, True, 1),
+    ("wf_l_quiescence", wf_log.QUIESCENCE, True, 1),
+    ("wf_l_reach_quiescence", wf_log.REACH_QUIESCENCE, True, 1),
+    ("wf_l_as_new", wf_log.AS_NEW, True, 1),
+    ("wf_l_as_delete", wf_log.AS_DELETE, True, 1),
+    ("wf_l_as_switch", wf_log.AS_SWITCH, True, 1),
+    ("wf_l_patched", wf_log.PATCHED, True, 1),
+    ("wf_l_pte", wf_log.PTE, True, 1),
+    ("wf_l_vma", wf_log.VMA, True, 1),
+    ("wf_l_e2e_patched", wf_log.E2E_PATCHED, True, 1),
+    ("wf_r_new_patch", wf_log_redis.NEW_PATCH, True, 1000),
+    ("wf_r_patch_applied", wf_log_redis.PATCH_APPLIED, True, 1000),
+    ("wf_r_patch_signaled", wf_log_redis.PATCH_SIGNALED, True, 1000),
+    ("wf_r_patch_received", wf_log_redis.PATCH_RECEIVED, True, 1000),
+    ("wf_r_patch_sent", wf_log_redis.PATCH_SENT, True, 1000),
+    ("wf_r_patch_request", wf_log_redis.PATCH_REQUEST, True, 1000),
+]
+
 
 def get_run_dirs(experiment_dir: str, success_only: bool) -> List[str]:
     run_dirs = [
@@ -50,18 +91,35 @@ def get_run_dirs(experiment_dir: str, success_only: bool) -> List[str]:
     return run_dirs
 
 
-def load_run(
+def plan_run(
     storage: Storage,
     run_dir: str,
     run_objects_name: str,
     wf_log_name: str,
-    experiment_dir: str,
-    workers: int,
-) -> None:
+    bulk_latencies: bool = False,
+    incremental: bool = False,
+    latency_histograms: str = "none",
+    bulk_network: bool = False,
+    patch_elf_cache: str = patch_elf.DEFAULT_CACHE_DIR,
+    wf_log_workers: int = 1,
+) -> List[Task]:
+    # Loads the run info and returns the file-level tasks that load the rest of the run.
     print(run_dir)
-    run_id, start_time = load_run_info_data(
-        storage, os.path.join(run_dir, run_objects_name)
-    )
+    run_objects_file = os.path.join(run_dir, run_objects_name)
+    run_id, start_time = load_run_info_data(storage, run_objects_file)
+
+    def source(file: Union[str, List[str]]) -> Storage:
+        # Every insert is recorded in the ingest manifest, so unchanged runs are skipped next time.
+        return ManifestStorage(storage, run_id, file) if incremental else storage
+
+    if incremental:
+        source(run_objects_file).record("run", 1)
+
+    tasks: List[Task] = []
+
+    def task(fn: Callable, file: Union[str, List[str]], *args):
+        tasks.append(Task(fn, [source(file), *args], file))
+
     latency_files = [
         os.path.join(run_dir, f)
         for f in os.listdir(run_dir)
@@ -69,34 +127,29 @@ def load_run(
     ]
     if len(latency_files) > 0:
         # All benchmarks are started at the same time. Just use first file for the info.
-        load_latencies_info(storage, latency_files[0], run_id)
+        task(load_latencies_info, latency_files[0], latency_files[0], run_id)
 
-    # pool = ThreadPoolExecutor(max_workers=6)
-    pool = FutureCollector(ProcessPoolExecutor(max_workers=workers))
-    # pool = FutureCollector(ProcessPoolExecutor(max_workers=3))
     for latency_file in latency_files:
-        pool.submit(
+        task(
             load_latencies,
-            storage,
+            latency_file,
             latency_file,
             run_id,
             start_time,
+            bulk_latencies,
+            latency_histograms,
         )
-    pool.submit(
-        load_failover,
-        storage,
-        os.path.join(run_dir, "failover.yaml"),
-        run_id,
-        start_time,
-    )
-    pool.submit(
+    failover_file = os.path.join(run_dir, "failover.yaml")
+    task(load_failover, failover_file, failover_file, run_id, start_time)
+    cluster_status_file = os.path.join(run_dir, "cluster", "cluster-status.yaml")
+    task(
         load_cluster_status,
-        storage,
-        os.path.join(run_dir, "cluster", "cluster-status.yaml"),
+        cluster_status_file,
+        cluster_status_file,
         run_id,
         start_time,
     )
-    for node_dir, port in [
+    node_dirs = [
         (node_dir, int(port))
         for node_dir, port in [
             (os.path.join(run_dir, "cluster", node_dir), node_dir)
@@ -104,98 +157,133 @@ def load_run(
             if node_dir != "patches"
         ]
         if os.path.isdir(node_dir)
-    ]:
-        pool.submit(
+    ]
+    if bulk_network:
+        # One task per table that reads the files of all nodes at once.
+        for table, name in NETWORK_FILES:
+            network_files = [
+                os.path.join(node_dir, name)
+                for node_dir, _ in node_dirs
+                if os.path.exists(os.path.join(node_dir, name))
+            ]
+            if len(network_files) > 0:
+                task(
+                    load_redis_network_bulk,
+                    network_files,
+                    table,
+                    network_files,
+                    run_id,
+                    start_time,
+                )
+    for node_dir, port in node_dirs:
+        network_summary_file = os.path.join(node_dir, "network-summary.yaml")
+        task(
             load_redis_network_summary,
-            storage,
-            os.path.join(node_dir, "network-summary.yaml"),
-            run_id,
-            port,
-            start_time,
-        )
-        pool.submit(
-            load_redis_network,
-            storage,
-            "redis_all_network",
-            os.path.join(node_dir, "network-all.csv"),
-            run_id,
-            port,
-            start_time,
-        )
-        pool.submit(
-            load_redis_network,
-            storage,
-            "redis_cluster_network",
-            os.path.join(node_dir, "network-cluster.csv"),
-            run_id,
-            port,
-            start_time,
-        )
-        pool.submit(
-            load_redis_network,
-            storage,
-            "redis_io_write",
-            os.path.join(node_dir, "io-write-all.csv"),
+            network_summary_file,
+            network_summary_file,
             run_id,
             port,
             start_time,
         )
-        pool.submit(
-            load_redis_network,
-            storage,
-            "redis_io_read",
-            os.path.join(node_dir, "io-read-all.csv"),
-            run_id,
-            port,
-            start_time,
-        )
-
-        pool.submit(
+        for table, name in NETWORK_FILES if not bulk_network else []:
+            network_file = os.path.join(node_dir, name)
+            task(
+                load_redis_network,
+                network_file,
+                table,
+                network_file,
+                run_id,
+                port,
+                start_time,
+            )
+
+        wf_log_file = os.path.join(node_dir, wf_log_name)
+        task(
             load_wf_log,
-            storage,
-            os.path.join(node_dir, wf_log_name),
+            wf_log_file,
+            wf_log_file,
             run_id,
             port,
             start_time,
+            wf_log_workers,
         )
-        pool.submit(
+        redis_log_file = os.path.join(node_dir, "redis.stdout.log")
+        task(
             load_redis_log_bgsave,
-            storage,
-            os.path.join(node_dir, "redis.stdout.log"),
+            redis_log_file,
+            redis_log_file,
             run_id,
             port,
             start_time,
         )
-        pool.submit(
+        task(
             load_redis_log_failover,
-            storage,
-            os.path.join(node_dir, "redis.stdout.log"),
+            redis_log_file,
+            redis_log_file,
             run_id,
             port,
             start_time,
         )
-        pool.submit(
+        task(
             load_redis_log_restart,
-            storage,
-            os.path.join(node_dir, "redis.stdout.log"),
+            redis_log_file,
+            redis_log_file,
             run_id,
             port,
             start_time,
         )
-        # load_wf_log(
-        # storage, os.path.join(node_dir, wf_log_name), run_id, port, start_time
-        # )
-        pool.submit(
-            load_rdb_file,
-            storage,
-            os.path.join(node_dir, "dump.rdb"),
-            run_id,
-            port,
-        )
-    # load_rdb_file(storage, os.path.join(node_dir, "dump.rdb"), run_id, port)
-    pool.shutdown()
+        rdb_file = os.path.join(node_dir, "dump.rdb")
+        task(load_rdb_file, rdb_file, rdb_file, run_id, port)
 
     patches_dir: str = os.path.join(run_dir, "cluster", "patches")
+    task(load_patches, patches_dir, patches_dir, run_id, patch_elf_cache)
+    return tasks
+
+
+def load_run(
+    storage: Storage,
+    run_dir: str,
+    run_objects_name: str,
+    wf_log_name: str,
+    experiment_dir: str,
+    workers: int,
+    bulk_latencies: bool = False,
+    incremental: bool = False,
+    latency_histograms: str = "none",
+    bulk_network: bool = False,
+    patch_elf_cache: str = patch_elf.DEFAULT_CACHE_DIR,
+    wf_log_workers: int = 1,
+) -> None:
+    tasks = plan_run(
+        storage,
+        run_dir,
+        run_objects_name,
+        wf_log_name,
+        bulk_latencies,
+        incremental,
+        latency_histograms,
+        bulk_network,
+        patch_elf_cache,
+        wf_log_workers,
+    )
+    if isinstance(storage, DuckDBStagingStorage):
+        # The run info is written in this process. DuckDB is not fork safe, the workers forked below must not
+        # inherit the open staging connection.
+        storage.close()
+    # pool = ThreadPoolExecutor(max_workers=6)
+    pool = FutureCollector(ProcessPoolExecutor(max_workers=workers))
+    # pool = FutureCollector(ProcessPoolExecutor(max_workers=3))
+    for task in tasks:
+        pool.submit(task.fn, *task.args)
+    pool.shutdown()
+
+
+def load_patches(
+    storage: Storage,
+    patches_dir: str,
+    run_id: str,
+    patch_elf_cache: str = patch_elf.DEFAULT_CACHE_DIR,
+) -> None:
     # Patches are all the same. We can just take the last directory...
     patch_files = [
         os.path.join(patches_dir, f)
@@ -216,9 +304,15 @@ def load_run(
     patch_data["run_id"] = run_id
     storage.insert("patch_file", patch_data)
 
-    elf_data = patch_elf.read_patch_elf(patch_files)
-    elf_data["run_id"] = run_id
-    storage.insert("patch_elf", elf_data)
+    elf_files = patch_elf.read_patch_elf_files(patch_files, patch_elf_cache)
+    elf_files["run_id"] = run_id
+    storage.insert("patch_elf_file", elf_files)
+    # The sections of each patch are only inserted if they are not in the database yet.
+    for file_hash in elf_files["hash"].unique():
+        storage.insert_query(
+            "patch_elf_object",
+            patch_elf.read_patch_elf_object_query(patch_elf_cache, file_hash),
+        )
 
 
 def load_cluster_status(
@@ -232,8 +326,7 @@ def load_cluster_status(
     storage.insert("cluster_status", cluster_status_data)
 
 
-def load_run_info_data(storage: Storage, run_objects_file: str) -> str:
-    print("Loading run info data")
+def read_run_info_data(run_objects_file: str) -> Tuple[pd.DataFrame, str]:
     run_data = experiment_info.read_run_info_data(run_objects_file)
     run_data["benchmark_framework_end_time_s"] = (
         run_data["benchmark_framework_end_time"]
@@ -249,6 +342,12 @@ def load_run_info_data(storage: Storage, run_objects_file: str) -> str:
     if USE_RANDOM_RUN_ID:
         run_hash.update(f"{random.random()}".encode("UTF-8"))
     run_id = run_hash.hexdigest()
+    return run_data, run_id
+
+
+def load_run_info_data(storage: Storage, run_objects_file: str) -> str:
+    print("Loading run info data")
+    run_data, run_id = read_run_info_data(run_objects_file)
 
     run_data["run_id"] = run_id
     storage.insert("run", run_data)
@@ -266,14 +365,32 @@ def load_failover(
 
 
 def load_latencies(
-    storage: Storage, latencies_file: str, run_id: str, start_time: float
+    storage: Storage,
+    latencies_file: str,
+    run_id: str,
+    start_time: float,
+    bulk: bool = False,
+    histograms: str = "none",
 ) -> None:
     if not os.path.exists(latencies_file):
         return
+    if bulk:
+        # DuckDB reads the file itself. Only the query is sent to the storage.
+        query = latencies.read_latencies_query(latencies_file, run_id, start_time)
+        if histograms != "none":
+            storage.insert_query("latency_histogram", latencies.histogram_query(query))
+        if histograms != "only":
+            storage.insert_query("latencies", query)
+        return
     latencies_data = latencies.read_latencies(latencies_file)
     latencies_data["run_id"] = run_id
     latencies_data["time_s"] = latencies_data["time"] - start_time
-    storage.insert("latencies", latencies_data)
+    if histograms != "none":
+        histogram_data = latencies.histogram(latencies_data)
+        histogram_data["run_id"] = run_id
+        storage.insert("latency_histogram", histogram_data)
+    if histograms != "only":
+        storage.insert("latencies", latencies_data)
 
 
 def load_latencies_info(storage: Storage, latencies_file: str, run_id: str) -> float:
@@ -293,11 +410,7 @@ def load_latencies_info(storage: Storage, latencies_file: str, run_id: str) -> f
 def load_rdb_file(storage: Storage, rdb_file: str, run_id: str, port: int) -> None:
     if not os.path.exists(rdb_file):
         return
-    rdb_data = db_keys.read_redis_rdb_keys(
-        rdb_file,
-        os.path.join(SCRIPT_DIR, "redis-server"),
-        os.path.join(SCRIPT_DIR, "redis-cli"),
-    )
+    rdb_data = db_keys.read_rdb_keys(rdb_file)
     if rdb_data.empty:
         return
     rdb_data["port"] = port
@@ -324,6 +437,20 @@ def load_redis_network(
     storage.insert(table, data)
 
 
+def load_redis_network_bulk(
+    storage: Storage,
+    table: str,
+    network_files: List[str],
+    run_id: str,
+    start_time: int,
+) -> None:
+    # DuckDB reads the files of all nodes itself. Only the query is sent to the storage.
+    storage.insert_query(
+        table,
+        redis_network.read_redis_network_query(network_files, run_id, start_time),
+    )
+
+
 def load_redis_network_summary(
     storage: Storage, network_file: str, run_id: str, port: int, start_time: int
 ) -> None:
@@ -388,25 +515,33 @@ def load_redis_log_bgsave(
 
 
 def load_wf_log(
-    storage: Storage, wf_log_file: str, run_id: str, port: int, start_time: int
+    storage: Storage,
+    wf_log_file: str,
+    run_id: str,
+    port: int,
+    start_time: int,
+    workers: int = 1,
 ) -> None:
     if not os.path.exists(wf_log_file):
         return
 
     print("Loading WfPatch log")
 
+    # The log is read only once. Each line is routed to the table(s) it belongs to. Large logs are parsed in chunks
+    # by several processes.
+    entries = {table: entry for table, entry, _, _ in WF_LOG_TABLES}
+    try:
+        data_frames = wf_log_multiplex.read_data_frames(wf_log_file, entries, workers)
+    except ValueError as e:
+        print(e)
+        exit(1)
+
     def insert(
         table: str,
-        data_fn: Callable[[str], pd.DataFrame],
         do_count: Optional[bool] = None,
         time_division: int = 1,
     ) -> None:
-        try:
-            data = data_fn(wf_log_file)
-        except Exception as e:
-            print(f"Error while loading data for table {table}")
-            print(e)
-            exit(1)
+        data = data_frames[table]
         data["run_id"] = run_id
         data["port"] = port
         if "time" in data:
@@ -417,27 +552,47 @@ def load_wf_log(
             data["entry_counter"] = range(len(data))
         storage.insert(table, data)
 
-    insert("wf_l_birth", wf_log.read_birth_data)
-    insert("wf_l_death", wf_log.read_death_data)
-    insert("wf_l_apply", wf_log.read_apply_data, True)
-    insert("wf_l_finished", wf_log.read_finished_data, True)
-    insert("wf_l_migrated", wf_log.read_migrated_data, True)
-    insert("wf_l_quiescence", wf_log.read_quiescence_data, True)
-    insert("wf_l_reach_quiescence", wf_log.read_reach_quiescence_data, True)
-    insert("wf_l_as_new", wf_log.read_as_new_data, True)
-    insert("wf_l_as_delete", wf_log.read_as_delete_data, True)
-    insert("wf_l_as_switch", wf_log.read_as_switch_data, True)
-    insert("wf_l_patched", wf_log.read_patched_data, True)
-    insert("wf_l_pte", wf_log.read_pte_data, True)
-    insert("wf_l_vma", wf_log.read_vma_data, True)
-    insert("wf_l_e2e_patched", wf_log.read_e2e_patched_data, True)
-
-    insert("wf_r_new_patch", wf_log_redis.read_new_patch, True, 1000)
-    insert("wf_r_patch_applied", wf_log_redis.read_patch_applied, True, 1000)
-    insert("wf_r_patch_signaled", wf_log_redis.read_patch_signaled, True, 1000)
-    insert("wf_r_patch_received", wf_log_redis.read_patch_received, True, 1000)
-    insert("wf_r_patch_sent", wf_log_redis.read_patch_sent, True, 1000)
-    insert("wf_r_patch_request", wf_log_redis.read_patch_request, True, 1000)
+    for table, _, do_count, time_division in WF_LOG_TABLES:
+        insert(table, do_count, time_division)
+
+
+def snapshot_run_dir(run_dir: str) -> List[Tuple[str, int, float]]:
+    # (file, size_bytes, mtime) of all files of the run directory
+    files = []
+    for directory, _, names in os.walk(run_dir):
+        for name in names:
+            file = os.path.realpath(os.path.join(directory, name))
+            stat = os.stat(file)
+            files.append((file, stat.st_size, stat.st_mtime))
+    return sorted(files)
+
+
+def filter_unchanged_runs(
+    conn: DuckDBStorage, data_dirs: List[Tuple[str, str]], run_objects_name: str
+) -> Tuple[List[Tuple[str, str]], List[Tuple[str, List[Tuple[str, int, float]]]]]:
+    # A run is skipped if it was loaded completely before and its run directory still contains the same files (same
+    # sizes and modification times). Otherwise, its data is deleted and the run is loaded again.
+    # Returns the runs to load and (run_id, snapshot of the run directory) of every run to load. The snapshots are
+    # taken before the runs are loaded and recorded once all data is stored (see DuckDBStorage.record_complete).
+    manifest = conn.get_manifest()
+    loaded_run_ids = conn.get_run_ids()
+
+    changed_dirs = []
+    snapshots = []
+    for experiment_dir, run_dir in data_dirs:
+        _, run_id = read_run_info_data(os.path.join(run_dir, run_objects_name))
+        snapshot = snapshot_run_dir(run_dir)
+        if sorted(manifest.get(run_id, [])) == snapshot:
+            print(f"Skipping {run_dir}. Run is already loaded and unchanged.")
+            continue
+        if run_id in loaded_run_ids or run_id in manifest:
+            print(
+                f"Run {run_dir} changed or was not loaded completely. Deleting its data before loading it again."
+            )
+            conn.delete_run(run_id)
+        changed_dirs.append((experiment_dir, run_dir))
+        snapshots.append((run_id, snapshot))
+    return changed_dirs, snapshots
 
 
 def _parse_arguments(input_args: List[str]) -> Namespace:
@@ -466,6 +621,27 @@ def _parse_arguments(input_args: List[str]) -> Namespace:
         default=3,
     )
 
+    parser.add_argument(
+        "--global-scheduler",
+        help="Load all runs with one process pool (--workers) instead of --root-workers pools of --sub-workers. "
+        "Every run is split into file-level tasks that are started largest-first within --memory-budget-mb.",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--workers",
+        help="The number of workers of --global-scheduler",
+        type=int,
+        default=os.cpu_count(),
+    )
+    parser.add_argument(
+        "--memory-budget-mb",
+        help="The estimated memory (4 times the input file size per task) of all running tasks of "
+        "--global-scheduler must fit into this budget. Default: Half of the physical memory.",
+        type=int,
+        default=None,
+    )
+
     parser.add_argument(
         "--success-only",
         help="Read only data for successful benchmark runs",
@@ -489,6 +665,122 @@ def _parse_arguments(input_args: List[str]) -> Namespace:
         default=USE_RANDOM_RUN_ID,
     )
 
+    parser.add_argument(
+        "--bulk-latencies",
+        help="Let DuckDB read the latency files directly (read_csv) instead of loading them with pandas. "
+        "The latencies are not sent through the queue.",
+        action="store_true",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--bulk-network",
+        help="Let DuckDB read the network and IO files of all nodes of a run in a single read_csv instead of "
+        "loading every file with pandas. The data is not sent through the queue.",
+        action="store_true",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--arrow-transport",
+        help="Send data to the DuckDB writer as Arrow IPC files in shared memory (/dev/shm). Only a small "
+        "descriptor is sent through the queue instead of the pickled DataFrame.",
+        action="store_true",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--staging",
+        help="Every worker process writes into its own DuckDB staging file (next to --output). The staging files "
+        "are merged into the output after all data is loaded.",
+        action="store_true",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--incremental",
+        help="Skip runs that were loaded completely before and whose run directory did not change since (same "
+        "files, sizes and modification times, see ingest_manifest). Other runs are deleted and loaded again.",
+        action="store_true",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--latency-histograms",
+        help="Build per-second latency histograms (log-linear buckets) per run and port in the latency_histogram "
+        "table. 'add' loads the histograms in addition to the latencies, 'only' does not load the latencies of "
+        "the single requests at all.",
+        choices=["none", "add", "only"],
+        default="none",
+    )
+
+    parser.add_argument(
+        "--compact-schema",
+        help="Store the data in a compact physical schema: INTEGER run keys instead of the run_id in every row, "
+        "numeric keys, 16 bit ports and ENUMs for labels. The tables are in the schema 'beder2_compact', the "
+        "tables in main are views with the usual columns. A database must always be loaded with or always without "
+        "it.",
+        action="store_true",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--skip-derived-tables",
+        help="Do not create the derived tables (initial_cluster_status, node_groups, patch_version_timeline, ...) "
+        "after loading. They are created from all runs in the database.",
+        action="store_true",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--patch-elf-cache",
+        help="Directory in which the sections of the patch files are cached by the hash of the file content.",
+        default=patch_elf.DEFAULT_CACHE_DIR,
+    )
+
+    parser.add_argument(
+        "--wf-log-workers",
+        help=f"WfPatch logs larger than {wf_log_multiplex.CHUNK_BYTES // 1024 // 1024} MB are split into chunks "
+        "that are parsed by up to this many processes. 1 parses every log in the process of its task. Every task "
+        "that loads a log starts its own processes, so the default divides the CPUs among the workers that load "
+        "files (--workers or --root-workers * --sub-workers).",
+        type=int,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--queue-memory-mb",
+        help="Memory budget of the DataFrames in the queue to the DuckDB writer, including the DataFrames the writer "
+        "buffers before inserting them. Workers block while the budget is used up. 0 disables the limit (the writer "
+        f"then buffers up to {FLUSH_BYTES // 1024 // 1024} MB per table).",
+        type=int,
+        default=1024,
+    )
+
+    parser.add_argument(
+        "--queue-chunk-rows",
+        help="DataFrames with more rows are split into chunks of this size before they are put into the queue.",
+        type=int,
+        default=CHUNK_ROWS,
+    )
+
+    parser.add_argument(
+        "--sharded",
+        help="Load every experiment into its own shard (<output>.shards/<experiment>, one Parquet file per table). "
+        "--output only contains views over all shards. Loading an experiment again only replaces its shard, "
+        "deleting the shard directory removes the experiment.",
+        action="store_true",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--shard-workers",
+        help="The number of experiments that are loaded into their shards at the same time with --sharded. Every "
+        "experiment uses its own workers (--root-workers or --workers).",
+        type=int,
+        default=1,
+    )
+
     parser.add_argument(
         "--output",
         help="The DuckDB database file to which the benchmark data should be added. If the database "
@@ -498,61 +790,207 @@ def _parse_arguments(input_args: List[str]) -> Namespace:
         type=str,
     )
 
-    return parser.parse_args(input_args)
-
-
-def main(input_args: List[str]):
-    args = _parse_arguments(input_args)
+    args = parser.parse_args(input_args)
+    if args.wf_log_workers is None:
+        file_workers = (
+            args.workers
+            if args.global_scheduler
+            else args.root_workers * args.sub_workers
+        )
+        args.wf_log_workers = max(1, (os.cpu_count() or 1) // file_workers)
+    if args.incremental and args.random_run_id:
+        parser.error(
+            "--incremental recognizes runs by their run id. It cannot be combined with --random-run-id."
+        )
+    if args.sharded and (args.incremental or args.compact_schema):
+        parser.error(
+            "--sharded loads every experiment from scratch. It cannot be combined with --incremental or "
+            "--compact-schema."
+        )
+    return args
 
-    global USE_RANDOM_RUN_ID
-    USE_RANDOM_RUN_ID = args.random_run_id
 
+def load(args: Namespace, experiments: List[str], output: str):
+    # Loads the experiments into the DuckDB database file output.
     # We create a shared queue.
-    m = multiprocessing.Manager()
+    m = IngestManager()
+    m.start()
     db_input_queue = m.JoinableQueue()
+    # Producers block while the DataFrames in the queue use up the budget.
+    budget: Optional[ByteBudget] = (
+        m.ByteBudget(args.queue_memory_mb * 1024 * 1024)
+        if args.queue_memory_mb > 0
+        else None
+    )
 
     # Shared queue is used to insert data into DUckDB. This class runs in a background thread.
-    storage = DuckDBStorageThread(args.output, db_input_queue)
+    storage = DuckDBStorageThread(output, db_input_queue, args.compact_schema, budget)
     conn: DuckDBStorage = storage.connect()
     conn.create_tables()
 
-    if args.experiment:
-        experiments = [args.experiment]
-    else:
-        experiments = [
-            os.path.join(args.benchmark, experiment)
-            for experiment in os.listdir(args.benchmark)
-            if os.path.isdir(os.path.join(args.benchmark, experiment))
-        ]
-    experiments = [os.path.realpath(exp) for exp in experiments]
-
     data_dirs = [
         (experiment_dir, run_dir)
         for experiment_dir in experiments
         for run_dir in get_run_dirs(experiment_dir, args.success_only)
     ]
-    # Wrapper object to wrap the shared queue and that collects the intems in the queue
-    collector: Storage = StorageProcessCollector(db_input_queue)
+    snapshots = []
+    if args.incremental:
+        data_dirs, snapshots = filter_unchanged_runs(
+            conn, data_dirs, args.run_objects_name
+        )
+    transport_dir: Optional[str] = (
+        arrow_transport.create_transport_dir() if args.arrow_transport else None
+    )
+    staging_dir: Optional[str] = (
+        tempfile.mkdtemp(
+            prefix=f"{os.path.basename(output)}.staging-",
+            dir=os.path.dirname(os.path.abspath(output)),
+        )
+        if args.staging
+        else None
+    )
+    collector: Storage
+    if staging_dir is not None:
+        # Workers write into their own DuckDB files. Nothing is sent through the queue.
+        collector = DuckDBStagingStorage(staging_dir)
+    else:
+        # Wrapper object to wrap the shared queue and that collects the intems in the queue
+        collector = StorageProcessCollector(
+            db_input_queue, transport_dir, budget, args.queue_chunk_rows
+        )
 
     # pool = ThreadPoolExecutor(max_workers=6)
     # pool = ProcessPoolExecutor(max_workers=3)
-    pool = FutureCollector(ProcessPoolExecutor(max_workers=args.root_workers))
-    for experiment_dir, run_dir in data_dirs:
-        pool.submit(
-            load_run,
-            collector,
-            run_dir,
-            args.run_objects_name,
-            args.wf_log_name,
-            experiment_dir,
-            args.sub_workers,
+    if args.global_scheduler:
+        scheduler = TaskScheduler(
+            args.workers,
+            (
+                args.memory_budget_mb * 1024 * 1024
+                if args.memory_budget_mb is not None
+                else default_memory_budget_bytes()
+            ),
         )
-    print("Done loading tasks.. Waiting for finish")
-    pool.shutdown()
+        for experiment_dir, run_dir in data_dirs:
+            for task in plan_run(
+                collector,
+                run_dir,
+                args.run_objects_name,
+                args.wf_log_name,
+                args.bulk_latencies,
+                args.incremental,
+                args.latency_histograms,
+                args.bulk_network,
+                args.patch_elf_cache,
+                args.wf_log_workers,
+            ):
+                scheduler.submit(task)
+        print("Done loading tasks.. Waiting for finish")
+        scheduler.run()
+    else:
+        pool = FutureCollector(ProcessPoolExecutor(max_workers=args.root_workers))
+        for experiment_dir, run_dir in data_dirs:
+            pool.submit(
+                load_run,
+                collector,
+                run_dir,
+                args.run_objects_name,
+                args.wf_log_name,
+                experiment_dir,
+                args.sub_workers,
+                args.bulk_latencies,
+                args.incremental,
+                args.latency_histograms,
+                args.bulk_network,
+                args.patch_elf_cache,
+                args.wf_log_workers,
+            )
+        print("Done loading tasks.. Waiting for finish")
+        pool.shutdown()
     print("Tasks finished, waiting for data to get loaded into DuckDB")
-    conn.close()
+    try:
+        if staging_dir is not None:
+            # The run info was inserted by this process.
+            collector.close()
+            print("Merging staging files")
+            conn.merge_staging(staging_dir)
+        conn.close()
+        if len(snapshots) > 0:
+            # The writer thread is finished, all data of the runs is stored.
+            manifest = DuckDBStorage(output, args.compact_schema).connect()
+            for run_id, snapshot in snapshots:
+                manifest.record_complete(run_id, snapshot)
+            manifest.close()
+        if not args.skip_derived_tables:
+            # The writer thread is finished. Its connection is closed.
+            derived = DuckDBStorage(output, args.compact_schema).connect()
+            derived.create_derived_tables()
+            derived.close()
+    finally:
+        if transport_dir is not None:
+            shutil.rmtree(transport_dir, ignore_errors=True)
+        if staging_dir is not None:
+            shutil.rmtree(staging_dir, ignore_errors=True)
     print("Done loading data into DuckDB :-)")
 
 
+def load_shard(args: Namespace, experiment_dir: str, shards_dir: str):
+    # The experiment is loaded into a DuckDB database file that is exported to a new shard. The old shard (if any) is
+    # only replaced once the new one is complete, so the views never read a partially written shard.
+    shard_dir = os.path.join(shards_dir, os.path.basename(experiment_dir))
+    work_dir = tempfile.mkdtemp(
+        prefix=f"{os.path.basename(shard_dir)}.",
+        dir=os.path.dirname(os.path.abspath(shards_dir)),
+    )
+    try:
+        database_file = os.path.join(work_dir, "shard.duckdb")
+        load(args, [experiment_dir], database_file)
+        storage = DuckDBStorage(database_file).connect(read_only=True)
+        storage.export_shard(os.path.join(work_dir, "shard"))
+        storage.close()
+        if os.path.exists(shard_dir):
+            os.rename(shard_dir, os.path.join(work_dir, "old"))
+        os.rename(os.path.join(work_dir, "shard"), shard_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def load_sharded(args: Namespace, experiments: List[str]):
+    # Every experiment is loaded into its own shard, --shard-workers experiments at the same time. --output only
+    # contains the views over all shards.
+    shards_dir = f"{args.output}{SHARDS_SUFFIX}"
+    os.makedirs(shards_dir, exist_ok=True)
+    pool = FutureCollector(ProcessPoolExecutor(max_workers=args.shard_workers))
+    for experiment_dir in experiments:
+        pool.submit(load_shard, args, experiment_dir, shards_dir)
+    pool.shutdown()
+
+    catalog = DuckDBStorage(args.output).connect()
+    catalog.create_shard_views(shards_dir)
+    catalog.close()
+    print("Done loading data into DuckDB :-)")
+
+
+def main(input_args: List[str]):
+    args = _parse_arguments(input_args)
+
+    global USE_RANDOM_RUN_ID
+    USE_RANDOM_RUN_ID = args.random_run_id
+
+    if args.experiment:
+        experiments = [args.experiment]
+    else:
+        experiments = [
+            os.path.join(args.benchmark, experiment)
+            for experiment in os.listdir(args.benchmark)
+            if os.path.isdir(os.path.join(args.benchmark, experiment))
+        ]
+    experiments = [os.path.realpath(exp) for exp in experiments]
+
+    if args.sharded:
+        load_sharded(args, experiments)
+        return
+    load(args, experiments, args.output)
+
+
 if __name__ == "__main__":
     main(sys.argv[1:])
@@ -61,6 +61,17 @@ CREATE TABLE IF NOT EXISTS run (
     patch_skip_patch_file BOOLEAN,
 );
 
+-- Files a run was loaded from (see beder2 --incremental)
+CREATE TABLE IF NOT EXISTS ingest_manifest (
+    file VARCHAR,
+    size_bytes BIGINT,
+    mtime DOUBLE,
+    table_name VARCHAR,
+    rows BIGINT,
+    -- References
+    run_id VARCHAR -- REFERENCES run(run_id)
+);
+
 CREATE TABLE IF NOT EXISTS latencies_info (
     start_time DOUBLE,
     end_time DOUBLE,
@@ -82,6 +93,19 @@ CREATE TABLE IF NOT EXISTS latencies (
     run_id VARCHAR -- REFERENCES run(run_id)
 );
 
+-- Number of requests per second (time_bucket_s = floor(time_s)) and latency bucket. Buckets are log-linear: Each
+-- power of two (in µs) is split into 64 buckets of [lower_ms, upper_ms). See beder2 --latency-histograms
+CREATE TABLE IF NOT EXISTS latency_histogram (
+    port INTEGER,
+    time_bucket_s INTEGER,
+    bucket INTEGER,
+    lower_ms DOUBLE,
+    upper_ms DOUBLE,
+    count BIGINT,
+    -- References
+    run_id VARCHAR -- REFERENCES run(run_id)
+);
+
 CREATE TABLE IF NOT EXISTS cluster_status (
     time DOUBLE,
     time_s DOUBLE,
@@ -336,11 +360,21 @@ CREATE TABLE IF NOT EXISTS patch_file (
     run_id VARCHAR -- REFERENCES run(run_id)
 );
 
-CREATE TABLE IF NOT EXISTS patch_elf (
-    file_name VARCHAR,
+-- Sections of a patch file (ELF object). Every file content (hash) is stored once, runs only reference it in
+-- patch_elf_file. The view patch_elf (see views.sql) contains the sections of every run.
+CREATE TABLE IF NOT EXISTS patch_elf_object (
+    hash VARCHAR,
+    section_index INTEGER,
     section_name VARCHAR,
     size_bytes INTEGER,
     type VARCHAR,
+    symbols INTEGER,
+    relocations INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS patch_elf_file (
+    file_name VARCHAR,
+    hash VARCHAR, -- REFERENCES patch_elf_object(hash)
     -- Reference
     run_id VARCHAR -- REFERENCES run(run_id)
 );
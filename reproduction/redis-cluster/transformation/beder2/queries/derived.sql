@@ -0,0 +1,61 @@
+-- Relations derived from the loaded data (see beder2 --skip-derived-tables). They are created again after every
+-- load, so they always contain all runs. The rows are sorted by (run_id, port, time_s), so the min/max indexes of
+-- DuckDB skip the rows of other runs and ports.
+
+-- Status of the nodes when the run started
+CREATE OR REPLACE TABLE initial_cluster_status AS
+SELECT cluster_status.*
+FROM cluster_status
+    JOIN (SELECT MIN(time) AS min_time, run_id FROM cluster_status GROUP BY run_id) USING(run_id)
+WHERE time = min_time
+ORDER BY run_id, port, time_s;
+
+-- A master and its replicas (ports contains all of them)
+CREATE OR REPLACE TABLE node_groups AS
+SELECT master_port,
+    LIST_SORT(LIST_APPEND(replica_ports, master_port)) AS ports,
+    run_id
+FROM (
+    SELECT masters.port AS master_port, LIST(replicas.port) AS replica_ports, run_id
+    FROM initial_cluster_status AS masters JOIN initial_cluster_status AS replicas USING(run_id)
+    WHERE masters.port = replicas.master_port
+    GROUP BY ALL
+)
+ORDER BY run_id, master_port;
+
+-- One row per node of a group. Join USING(run_id, port) instead of filtering node_groups with LIST_CONTAINS.
+CREATE OR REPLACE TABLE node_group_member AS
+SELECT run_id, port, master_port, ports
+FROM (SELECT run_id, UNNEST(ports) AS port, master_port, ports FROM node_groups)
+ORDER BY run_id, port;
+
+CREATE OR REPLACE TABLE master_replica_group_names AS
+SELECT
+    ports,
+    run_id,
+    'Gr. ' || row_number() OVER(PARTITION BY run_id ORDER BY master_port) AS node_name
+FROM node_groups
+ORDER BY run_id, node_name;
+
+-- The patch versions every node received, sent and applied (wf_r_*)
+CREATE OR REPLACE TABLE patch_version_timeline AS
+SELECT run_id, port, time, time_s, version, event, role
+FROM (
+    SELECT run_id, port, time, time_s, version, 'New Patch' AS event FROM wf_r_new_patch
+    UNION ALL
+    SELECT run_id, port, time, time_s, version, 'Patch Sent' AS event FROM wf_r_patch_sent
+    UNION ALL
+    SELECT run_id, port, time, time_s, version, 'Patch Request' AS event FROM wf_r_patch_request
+    UNION ALL
+    SELECT run_id, port, time, time_s, version, 'Patch Received' AS event FROM wf_r_patch_received
+    UNION ALL
+    SELECT run_id, port, time, time_s, version, 'Patch Signaled' AS event FROM wf_r_patch_signaled
+    UNION ALL
+    SELECT run_id, port, time, time_s, version, 'Patch Applied' AS event FROM wf_r_patch_applied
+)
+    LEFT JOIN (SELECT run_id, port, role FROM initial_cluster_status) USING(run_id, port)
+ORDER BY run_id, port, time_s;
+
+CREATE INDEX IF NOT EXISTS initial_cluster_status_run_port_time ON initial_cluster_status(run_id, port, time_s);
+CREATE INDEX IF NOT EXISTS node_group_member_run_port ON node_group_member(run_id, port);
+CREATE INDEX IF NOT EXISTS patch_version_timeline_run_port_time ON patch_version_timeline(run_id, port, time_s);
@@ -0,0 +1,11 @@
+-- Created after all tables and replaced on every load (see DuckDBStorage._create_views). Databases that were created
+-- before a view existed contain a table with the same name. It is migrated first (see DuckDBStorage._migrate_*).
+CREATE OR REPLACE VIEW patch_elf AS
+SELECT
+    f.file_name,
+    o.section_name,
+    o.size_bytes,
+    o.type,
+    f.run_id
+FROM patch_elf_file AS f
+JOIN patch_elf_object AS o ON f.hash = o.hash;
@@ -0,0 +1,292 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from argparse import ArgumentParser, Namespace
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import duckdb
+import pandas as pd
+
+from duckdb_storage import SHARDS_SUFFIX
+
+# Aggregations over a database loaded by beder2. They are computed by DuckDB, only the result is returned. Results
+# are cached as Parquet files (<cache dir>/<aggregation>-<key>.parquet). The key is derived from the fingerprint of
+# the database and the parameters, so a cached result is used until the database changes.
+#
+# Usage (e.g. in a notebook with the beder2 directory in sys.path):
+#   import query
+#   df = query.aggregate("all.duckdb", "rps_time", time_division=0.5)
+# or on the command line, e.g. to export results for the R plots:
+#   python beder2/query.py --database all.duckdb --output rps.parquet rps_time --time-division 0.5
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "beder2",
+    "query",
+)
+
+
+def rps_time(time_division: float = 0.5) -> str:
+    # Requests per time bucket (start, start + time_division) and run. Buckets without requests are 0.
+    gap = float(time_division)
+    return f"""
+        WITH ranges AS (
+            SELECT UNNEST(GENERATE_SERIES(0, FLOOR((total_duration_s - 1) / {gap})::INT)) * {gap} AS start,
+                run_id
+            FROM latencies_info
+        ), total_latencies AS (
+            SELECT FLOOR(time_s / {gap}) * {gap} AS start, run_id, COUNT(*) AS latencies
+            FROM latencies
+            WHERE time_s >= 0
+            GROUP BY ALL
+        )
+        SELECT run_id, start, COALESCE(latencies, 0) AS total_latencies,
+            COALESCE(latencies, 0) / {gap} AS rps
+        FROM ranges
+            LEFT JOIN total_latencies USING(run_id, start)
+        ORDER BY run_id, start
+    """
+
+
+def latency_percentiles(
+    window_s: float = 1.0, percentiles: Sequence[float] = (0.5, 0.99, 0.999)
+) -> str:
+    # Latency percentiles per time window and run. One column per percentile (p<percentile>, e.g. p0_99).
+    window = float(window_s)
+    quantiles = ", ".join(str(float(p)) for p in percentiles)
+    columns = ", ".join(
+        f"quantiles[{i + 1}] AS p{str(float(p)).replace('.', '_')}"
+        for i, p in enumerate(percentiles)
+    )
+    return f"""
+        SELECT run_id, start, requests, {columns}
+        FROM (
+            SELECT run_id,
+                FLOOR(time_s / {window}) * {window} AS start,
+                COUNT(*) AS requests,
+                QUANTILE_CONT(latency_ms, [{quantiles}]) AS quantiles
+            FROM latencies
+            GROUP BY ALL
+        )
+        ORDER BY run_id, start
+    """
+
+
+def synchronization_time() -> str:
+    # Time from the new patch (on the initial node) until the patch is applied on the last node, per run and patch
+    # version (see plot-synchronization-time-patch-boxplot-idle.R)
+    return """
+        SELECT run_id, version, start_s, end_s, end_s - start_s AS duration_s
+        FROM (SELECT run_id, version, MIN(time_s) AS start_s FROM wf_r_new_patch GROUP BY ALL)
+            JOIN (SELECT run_id, version, MAX(time_s) AS end_s FROM wf_r_patch_applied GROUP BY ALL)
+                USING(run_id, version)
+        ORDER BY run_id, version
+    """
+
+
+def failover_durations(name: str = "failover") -> str:
+    # Duration of every failover (or restart, see failover.name) and the node group of the node
+    escaped_name = name.replace("'", "''")
+    return f"""
+        SELECT DISTINCT run_id, port, ports, start_time_s, duration_ms / 1000. AS duration_s
+        FROM failover
+            JOIN node_group_member USING(run_id, port)
+        WHERE name = '{escaped_name}'
+        ORDER BY run_id, start_time_s, port
+    """
+
+
+# Derived tables (see queries/derived.sql) an aggregation reads. They are missing in databases loaded with
+# --skip-derived-tables.
+DERIVED_TABLES: Dict[str, List[str]] = {
+    "failover_durations": ["node_group_member"],
+}
+
+AGGREGATIONS: Dict[str, Callable[..., str]] = {
+    "rps_time": rps_time,
+    "latency_percentiles": latency_percentiles,
+    "synchronization_time": synchronization_time,
+    "failover_durations": failover_durations,
+}
+
+
+def fingerprint(database_file: str) -> str:
+    # Changes whenever the database (or its WAL) or a shard (see beder2 --sharded) is written.
+    parts = [os.path.realpath(database_file)]
+    # Shards are named, so adding or removing one changes the fingerprint as well.
+    shards_dir = f"{database_file}{SHARDS_SUFFIX}"
+    shard_files = sorted(
+        glob.glob(os.path.join(glob.escape(shards_dir), "*", "*.parquet"))
+    )
+    for file in [database_file, f"{database_file}.wal"]:
+        if os.path.exists(file):
+            stat = os.stat(file)
+            parts.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+    for file in shard_files:
+        stat = os.stat(file)
+        parts.append(
+            f"{os.path.relpath(file, shards_dir)}:{stat.st_size}:{stat.st_mtime_ns}"
+        )
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def cache_file(
+    database_file: str, aggregation: str, params: Dict[str, Any], cache_dir: str
+) -> str:
+    key = json.dumps(
+        {
+            "database": fingerprint(database_file),
+            "aggregation": aggregation,
+            "params": params,
+        },
+        sort_keys=True,
+    )
+    return os.path.join(
+        cache_dir, f"{aggregation}-{hashlib.sha256(key.encode()).hexdigest()}.parquet"
+    )
+
+
+def compute(database_file: str, aggregation: str, output: str, **params) -> None:
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(
+            f"Unknown aggregation {aggregation}. Available: {', '.join(AGGREGATIONS)}"
+        )
+    query = AGGREGATIONS[aggregation](**params)
+    con = duckdb.connect(database_file, read_only=True)
+    try:
+        existing = [row[0] for row in con.execute("SHOW TABLES;").fetchall()]
+        missing = [
+            table
+            for table in DERIVED_TABLES.get(aggregation, [])
+            if table not in existing
+        ]
+        if len(missing) > 0:
+            raise ValueError(
+                f"{aggregation} needs the derived tables {', '.join(missing)}, which {database_file} does not "
+                "contain. Load the database again without --skip-derived-tables to create them."
+            )
+        # Concurrent readers of the cache only see complete files.
+        fd, tmp_file = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(output)), suffix=".tmp"
+        )
+        os.close(fd)
+        try:
+            escaped_tmp_file = tmp_file.replace("'", "''")
+            con.execute(f"COPY ({query}) TO '{escaped_tmp_file}' (FORMAT PARQUET);")
+            os.replace(tmp_file, output)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+    finally:
+        con.close()
+
+
+def aggregate_file(
+    database_file: str,
+    aggregation: str,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    **params,
+) -> str:
+    # Returns the cached Parquet file with the result. It is computed if it is not cached yet.
+    os.makedirs(cache_dir, exist_ok=True)
+    file = cache_file(database_file, aggregation, params, cache_dir)
+    if not os.path.exists(file):
+        compute(database_file, aggregation, file, **params)
+    return file
+
+
+def aggregate(
+    database_file: str,
+    aggregation: str,
+    cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+    **params,
+) -> pd.DataFrame:
+    # Without cache_dir, the result is always computed.
+    if cache_dir is None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output = os.path.join(tmp_dir, f"{aggregation}.parquet")
+            compute(database_file, aggregation, output, **params)
+            return pd.read_parquet(output)
+    return pd.read_parquet(
+        aggregate_file(database_file, aggregation, cache_dir, **params)
+    )
+
+
+def _parse_arguments(input_args: List[str]) -> Namespace:
+    parser = ArgumentParser(
+        description="Compute an aggregation of a beder2 database and export it as Parquet file."
+    )
+    parser.add_argument(
+        "--database",
+        help="The DuckDB database file created by beder2.",
+        required=True,
+        type=str,
+    )
+    parser.add_argument(
+        "--output",
+        help="The Parquet file the result is written to.",
+        required=True,
+        type=str,
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Directory of the cached results.",
+        default=DEFAULT_CACHE_DIR,
+        type=str,
+    )
+    parser.add_argument(
+        "--no-cache",
+        help="Always compute the result. The cache is neither read nor written.",
+        action="store_true",
+        default=False,
+    )
+
+    aggregations = parser.add_subparsers(dest="aggregation", required=True)
+    rps_time_parser = aggregations.add_parser(
+        "rps_time", help="Requests per time bucket and run."
+    )
+    rps_time_parser.add_argument("--time-division", type=float, default=0.5)
+
+    latency_percentiles_parser = aggregations.add_parser(
+        "latency_percentiles", help="Latency percentiles per time window and run."
+    )
+    latency_percentiles_parser.add_argument("--window-s", type=float, default=1.0)
+    latency_percentiles_parser.add_argument(
+        "--percentiles", type=float, nargs="+", default=[0.5, 0.99, 0.999]
+    )
+
+    aggregations.add_parser(
+        "synchronization_time",
+        help="Time until a patch version is applied on all nodes per run and version.",
+    )
+
+    failover_durations_parser = aggregations.add_parser(
+        "failover_durations", help="Durations of failovers (or restarts) per node."
+    )
+    failover_durations_parser.add_argument(
+        "--name", choices=["failover", "restart"], default="failover"
+    )
+    return parser.parse_args(input_args)
+
+
+def main(input_args: List[str]):
+    args = _parse_arguments(input_args)
+    params = {
+        name: value
+        for name, value in vars(args).items()
+        if name not in ["database", "output", "cache_dir", "no_cache", "aggregation"]
+    }
+    if args.no_cache:
+        compute(args.database, args.aggregation, args.output, **params)
+        return
+    shutil.copyfile(
+        aggregate_file(args.database, args.aggregation, args.cache_dir, **params),
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,101 @@
+import bisect
+import concurrent.futures
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+import psutil
+
+# Estimated peak memory of a task per byte of its input file (e.g. a CSV parsed by pandas).
+MEMORY_PER_INPUT_BYTE = 4
+
+# Modules imported once by the fork server. Workers are forked from it and do not import them again.
+PRELOAD_MODULES = ["pandas", "duckdb", "loader"]
+
+
+# A single file-level task, e.g. loading one latency file. Some tasks read several files at once.
+class Task:
+    def __init__(
+        self,
+        fn: Callable,
+        args: Sequence[Any],
+        input_file: Union[str, List[str], None],
+    ):
+        self.fn: Callable = fn
+        self.args: Sequence[Any] = args
+        input_files = [input_file] if isinstance(input_file, str) else input_file
+        self.input_bytes: int = sum(
+            os.path.getsize(f) for f in input_files or [] if os.path.isfile(f)
+        )
+
+    def memory_bytes(self) -> int:
+        return self.input_bytes * MEMORY_PER_INPUT_BYTE
+
+
+def default_memory_budget_bytes() -> int:
+    return psutil.virtual_memory().total // 2
+
+
+# One process pool for all tasks of all runs. Tasks are started largest-first. A task is only started if its
+# estimated memory fits into the memory budget next to the running tasks. If the largest waiting task does not fit,
+# the largest task that fits is started instead. A task that is larger than the budget runs alone.
+class TaskScheduler:
+    def __init__(self, workers: int, memory_budget_bytes: int):
+        self._workers: int = workers
+        self._memory_budget_bytes: int = memory_budget_bytes
+        # Sorted by memory, smallest first. The largest task is at the end.
+        self._tasks: List[Task] = []
+        self._task_memory: List[int] = []
+
+        # Workers must not inherit the state of the loader (e.g. the DuckDB connection or the storage thread).
+        # Options are passed to the tasks explicitly, globals of the main process are not available in the workers.
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(PRELOAD_MODULES)
+        self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+    def submit(self, task: Task):
+        index = bisect.bisect_right(self._task_memory, task.memory_bytes())
+        self._tasks.insert(index, task)
+        self._task_memory.insert(index, task.memory_bytes())
+
+    def _next_task(self, free_memory_bytes: int, running: int) -> Optional[Task]:
+        if len(self._tasks) == 0:
+            return None
+        # Largest task that fits into the free memory
+        index = bisect.bisect_right(self._task_memory, free_memory_bytes) - 1
+        if index < 0:
+            if running > 0:
+                return None
+            # Nothing fits, but nothing is running. Run the largest task alone.
+            index = len(self._tasks) - 1
+        self._task_memory.pop(index)
+        return self._tasks.pop(index)
+
+    def run(self):
+        running: Dict[Future, Task] = {}
+        used_memory_bytes = 0
+        try:
+            while len(self._tasks) > 0 or len(running) > 0:
+                while len(running) < self._workers:
+                    task = self._next_task(
+                        self._memory_budget_bytes - used_memory_bytes, len(running)
+                    )
+                    if task is None:
+                        break
+                    running[self._pool.submit(task.fn, *task.args)] = task
+                    used_memory_bytes += task.memory_bytes()
+
+                done, _ = concurrent.futures.wait(
+                    running.keys(), return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    task = running.pop(future)
+                    used_memory_bytes -= task.memory_bytes()
+                    try:
+                        future.result()
+                    except Exception as e:
+                        print(f"Error in function: {task.fn}")
+                        raise e
+        finally:
+            self._pool.shutdown(cancel_futures=True)
@@ -0,0 +1,580 @@
+import hashlib
+import os
+import random
+import struct
+import sys
+from argparse import ArgumentParser, Namespace
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import yaml
+
+# Writes synthetic experiments in the layout of the patch benchmark, so the ingest of beder2 can be measured without
+# real experiment output (see ingest_benchmark.py):
+#   <output>/<experiment>/<run>/
+#       SUCCESS, experiment_objects.yaml, failover.yaml, latencies.<port>.csv (one per master)
+#       cluster/cluster-status.yaml, cluster/patches/patch-<n>.o
+#       cluster/<port>/redis.stderr.log (WfPatch and [REDIS] lines), redis.stdout.log, network-all.csv,
+#           network-cluster.csv, io-write-all.csv, io-read-all.csv, network-summary.yaml, dump.rdb (the keys of the
+#           benchmark of the master and RDB_LOAD_KEYS keys of the data load)
+# The same seed always writes the same files.
+FIRST_PORT = 7000
+START_TIME = 1_700_000_000.0
+# Idle time between two runs of an experiment
+RUN_GAP_S = 60.0
+
+# Keys of the data load (load-<n>) in every dump.rdb. The loader does not store them.
+RDB_LOAD_KEYS = 100
+RDB_VALUE = b"x" * 32
+
+NETWORK_FILES = [
+    "network-all.csv",
+    "network-cluster.csv",
+    "io-write-all.csv",
+    "io-read-all.csv",
+]
+
+
+class Node:
+    def __init__(self, port: int, master_port: Optional[int]):
+        self.port: int = port
+        # None for masters
+        self.master_port: Optional[int] = master_port
+        self.stderr: List[Tuple[float, str]] = []
+        self.stdout: List[Tuple[float, str]] = []
+
+    def is_master(self) -> bool:
+        return self.master_port is None
+
+
+def _redis_log_line(time: float, role: str, message: str) -> str:
+    # 78674:M 24 Jan 2024 13:09:08.597 * Starting BGSAVE for SYNC with target: replicas sockets
+    date_time = datetime.fromtimestamp(time).strftime("%d %b %Y %H:%M:%S.%f")[:-3]
+    return f"4242:{role} {date_time} * {message}"
+
+
+def _cluster_nodes(nodes: int) -> Dict[int, Node]:
+    # The first half of the nodes are masters, the others are their replicas (round-robin).
+    masters = max(1, nodes // 2)
+    cluster = {}
+    for index in range(nodes):
+        port = FIRST_PORT + index
+        master_port = None if index < masters else FIRST_PORT + index % masters
+        cluster[port] = Node(port, master_port)
+    return cluster
+
+
+def _write_elf_object(file: str, rng: random.Random, text_bytes: int, relocations: int):
+    # A minimal ELF64 relocatable object (x86-64) with the sections of a patch: .text, .rela.text, .symtab, .strtab
+    # and .shstrtab.
+    text = bytes(rng.getrandbits(8) for _ in range(text_bytes))
+    strtab = b"\0patch_function\0"
+    symtab = bytes(24) + struct.pack("<IBBHQQ", 1, (1 << 4) | 2, 0, 1, 0, text_bytes)
+    rela = b"".join(
+        struct.pack("<QQq", rng.randrange(max(1, text_bytes - 4)), (1 << 32) | 2, -4)
+        for _ in range(relocations)
+    )
+    names = ["", ".text", ".rela.text", ".symtab", ".strtab", ".shstrtab"]
+    name_offsets = []
+    shstrtab = b""
+    for name in names:
+        name_offsets.append(len(shstrtab))
+        shstrtab += name.encode() + b"\0"
+
+    data = [text, rela, symtab, strtab, shstrtab]
+    offsets = []
+    offset = 64
+    for section in data:
+        offsets.append(offset)
+        offset += len(section)
+    # (type, flags, link, info, alignment, entry size) of every section but the NULL section
+    headers = [
+        (1, 6, 0, 0, 16, 0),
+        (4, 0x40, 3, 1, 8, 24),
+        (2, 0, 4, 1, 8, 24),
+        (3, 0, 0, 0, 1, 0),
+        (3, 0, 0, 0, 1, 0),
+    ]
+    section_headers = bytes(64) + b"".join(
+        struct.pack(
+            "<IIQQQQIIQQ",
+            name_offsets[index + 1],
+            sh_type,
+            flags,
+            0,
+            offsets[index],
+            len(data[index]),
+            link,
+            info,
+            alignment,
+            entry_size,
+        )
+        for index, (sh_type, flags, link, info, alignment, entry_size) in enumerate(
+            headers
+        )
+    )
+    elf_header = struct.pack(
+        "<16sHHIQQQIHHHHHH",
+        b"\x7fELF\x02\x01\x01" + bytes(9),
+        1,
+        62,
+        1,
+        0,
+        0,
+        offset,
+        0,
+        64,
+        0,
+        0,
+        64,
+        len(names),
+        len(names) - 1,
+    )
+    with open(file, "wb") as f:
+        f.write(elf_header + b"".join(data) + section_headers)
+
+
+def _rdb_string(value: bytes) -> bytes:
+    # Length (6, 14 or 32 bit) and the plain string (see rdb.py)
+    length = len(value)
+    if length < 64:
+        return bytes([length]) + value
+    if length < 16384:
+        return struct.pack(">H", 0x4000 | length) + value
+    return b"\x80" + struct.pack(">I", length) + value
+
+
+def _write_rdb(file: str, keys: List[str]):
+    # An RDB file of Redis 7 (version 11) with a string value per key. The checksum is 0, Redis does not verify it.
+    with open(file, "wb") as f:
+        f.write(b"REDIS0011")
+        f.write(b"\xfa" + _rdb_string(b"redis-ver") + _rdb_string(b"7.0.11"))
+        f.write(b"\xfe\x00")
+        value = _rdb_string(RDB_VALUE)
+        for key in [f"load-{i}" for i in range(RDB_LOAD_KEYS)] + keys:
+            f.write(b"\x00" + _rdb_string(key.encode()) + value)
+        f.write(b"\xff" + bytes(8))
+
+
+def _write_latencies(
+    file: str,
+    rng: np.random.Generator,
+    port: int,
+    start_time: float,
+    seconds: float,
+    rps: int,
+    threads: int,
+    clients: int,
+) -> List[str]:
+    # Returns the keys of the requests
+    requests = int(seconds * rps)
+    df = pd.DataFrame(
+        {
+            "thread_id": np.arange(requests) % threads,
+            "latency_ms": rng.lognormal(-0.7, 0.5, requests),
+            "time": start_time + np.sort(rng.uniform(0, seconds, requests)),
+            "port": port,
+            "client_id": rng.integers(0, clients, requests),
+            "key": "memtier-"
+            + pd.Series(rng.integers(0, 1_000_000, requests)).astype(str),
+        }
+    )
+    with open(file, "w") as f:
+        f.write(f"start_time: {start_time}\nend_time: {start_time + seconds}\n")
+        df.to_csv(f, index=False, float_format="%.6f")
+    return sorted(df["key"].unique())
+
+
+def _write_network(
+    file: str, rng: np.random.Generator, start_time: float, seconds: float, rate: int
+):
+    samples = int(seconds * rate)
+    pd.DataFrame(
+        {
+            "bytes": rng.integers(64, 64 * 1024, samples),
+            "time": start_time + np.sort(rng.uniform(0, seconds, samples)),
+        }
+    ).to_csv(file, index=False, header=False, float_format="%.6f")
+
+
+def _patch(
+    cluster: Dict[int, Node],
+    rng: random.Random,
+    time: float,
+    name: str,
+    path: str,
+    version: int,
+    threads: int,
+):
+    # One patch: Registered on the first master, sent to all other nodes and applied by every node.
+    origin = cluster[FIRST_PORT]
+    origin.stderr.append(
+        (
+            time,
+            f"[REDIS] [New Patch Registered] [{time * 1000:f}] [{name}] [{version}] [1] [1]",
+        )
+    )
+    for node in cluster.values():
+        received = time + rng.uniform(0.001, 0.01)
+        if node is not origin:
+            origin.stderr.append(
+                (
+                    time,
+                    f"[REDIS] [Patch Sent] [{time * 1000:f}] [{name}] [{node.port}] [{version}]",
+                )
+            )
+            node.stderr.append(
+                (
+                    received,
+                    f"[REDIS] [Patch Request] [{received * 1000:f}] [{name}] [{origin.port}] [{version}]",
+                )
+            )
+            node.stderr.append(
+                (
+                    received,
+                    f"[REDIS] [Patch Received] [{received * 1000:f}] [{name}] [{origin.port}] [{version}] [1]",
+                )
+            )
+        signaled = received + rng.uniform(0.0001, 0.001)
+        node.stderr.append(
+            (
+                signaled,
+                f"[REDIS] [Patch Signaled] [{signaled * 1000:f}] [{name}] [{version}] [1]",
+            )
+        )
+        applied = signaled + rng.uniform(0.001, 0.05)
+        lines = [
+            f'- [apply, {signaled:.9f}, local, {threads}, "(null)"]',
+            f'- [address-space-new, {rng.uniform(0.5, 3):.4f}, "(null)"]',
+            f"- [VmPTE-before, {rng.randrange(100, 200)}]",
+            f"- [vma-count-before, {version}, r-xp, FILE-BACKED, 25, 864, 0, 0, 68, 524]",
+        ]
+        for thread in range(threads):
+            lines.append(
+                f'- [reach-quiescence-point, {rng.uniform(0.001, 0.01):.4f}, "connection_handler", "(null)", '
+                f"{thread}]"
+            )
+        lines.append(f'- [quiescence, {rng.uniform(0.1, 0.5):.4f}, "(null)"]')
+        for thread in range(threads):
+            lines.append(
+                f'- [migrated, {rng.uniform(0.1, 0.3):.4f}, {version}, "connection_handler", "(null)", {thread}]'
+            )
+        lines += [
+            f"- [address-space-switch, {rng.uniform(0.01, 0.02):.4f}]",
+            f'- [patched, {rng.uniform(10, 20):.4f}, "{path}", "(null)"]',
+            f"- [VmPTE-after, {rng.randrange(100, 200)}]",
+            f"- [vma-count-after, {version}, r-xp, FILE-BACKED, 26, 868, 0, 0, 72, 524]",
+            f'- [finished, {rng.uniform(10, 20):.4f}, "(null)"]',
+            f'- [e2e-patch, {applied:.6f}, {(applied - signaled) * 1000:.4f}, 1, "(null)"]',
+            f'- [address-space-delete, {rng.uniform(0.0001, 0.001):.4f}, "(null)"]',
+        ]
+        node.stderr += [(signaled, line) for line in lines]
+        node.stderr.append(
+            (
+                applied,
+                f"[REDIS] [Patch Applied] [{applied * 1000:f}] [{name}] [{version}] [1]",
+            )
+        )
+
+
+def generate_run(
+    run_dir: str,
+    seed: int,
+    start_time: float,
+    nodes: int,
+    seconds: float,
+    rps: int,
+    patches: int,
+    threads: int,
+    network_rate: int,
+):
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    cluster_dir = os.path.join(run_dir, "cluster")
+    patches_dir = os.path.join(cluster_dir, "patches")
+    os.makedirs(patches_dir, exist_ok=True)
+    cluster = _cluster_nodes(nodes)
+    end_time = start_time + seconds
+    clients = 4 * threads
+
+    # Patches are applied one after the other in the middle of the run.
+    patch_paths = []
+    for version in range(1, patches + 1):
+        path = os.path.join(patches_dir, f"patch-{version}.o")
+        _write_elf_object(path, rng, rng.randrange(256, 4096), rng.randrange(1, 32))
+        with open(path, "rb") as f:
+            name = hashlib.sha1(f.read()).hexdigest()
+        patch_time = start_time + seconds * (0.4 + 0.2 * version / (patches + 1))
+        _patch(cluster, rng, patch_time, name, path, version, threads)
+        patch_paths.append(path)
+
+    # The first replica of the first master takes over after 3/4 of the run. The other replica (if any) restarts.
+    failover_after_s = seconds * 0.75
+    replicas = [node for node in cluster.values() if not node.is_master()]
+    status_changes: List[Tuple[float, Dict[int, Optional[int]]]] = [
+        (start_time, {node.port: node.master_port for node in cluster.values()})
+    ]
+    if len(replicas) > 0:
+        replica = replicas[0]
+        master = cluster[replica.master_port]
+        failover_start = start_time + failover_after_s
+        failover_end = failover_start + rng.uniform(0.2, 1.0)
+        replica.stdout.append(
+            (failover_start, "Manual failover user request accepted.")
+        )
+        replica.stdout.append(
+            (failover_end, "Failover election won: I'm the new master.")
+        )
+        with open(os.path.join(run_dir, "failover.yaml"), "w") as f:
+            yaml.dump(
+                {
+                    failover_end: {
+                        "name": "failover",
+                        "port": replica.port,
+                        "start_time": failover_start,
+                        "end_time": failover_end,
+                        "duration_ms": (failover_end - failover_start) * 1000,
+                        "actions": [
+                            {
+                                "action": "failover start",
+                                "action_time": failover_start,
+                                "action_duration_ms": 0.0,
+                            },
+                            {
+                                "action": "failover end",
+                                "action_time": failover_end,
+                                "action_duration_ms": (failover_end - failover_start)
+                                * 1000,
+                            },
+                        ],
+                    }
+                },
+                f,
+            )
+        masters = dict(status_changes[0][1])
+        masters[replica.port] = None
+        masters[master.port] = replica.port
+        status_changes.append((failover_end, masters))
+    if len(replicas) > 1:
+        restarted = replicas[1]
+        restart = start_time + failover_after_s + 1
+        restarted.stdout.append((restart, "User requested shutdown..."))
+        restarted.stdout.append(
+            (
+                restart + rng.uniform(0.5, 2),
+                "MASTER <-> REPLICA sync: Finished with success",
+            )
+        )
+
+    for node in cluster.values():
+        role = "M" if node.is_master() else "S"
+        if not node.is_master():
+            cluster[node.master_port].stdout.append(
+                (
+                    start_time + 0.1,
+                    "Starting BGSAVE for SYNC with target: replicas sockets",
+                )
+            )
+        node.stdout.append((end_time, "User requested shutdown..."))
+        node.stdout.append((end_time, "Saving the final RDB snapshot before exiting."))
+
+        node_dir = os.path.join(cluster_dir, str(node.port))
+        os.makedirs(node_dir, exist_ok=True)
+        for thread in range(threads):
+            birth = start_time + rng.uniform(0, 0.1)
+            node.stderr.append(
+                (
+                    birth,
+                    f'- [birth, {birth * 1000:.2f}, "connection_handler", "(null)", {thread}]',
+                )
+            )
+            node.stderr.append(
+                (
+                    end_time,
+                    f'- [death, {(end_time - birth) * 1000:.2f}, "connection_handler", "(null)", {thread}]',
+                )
+            )
+        with open(os.path.join(node_dir, "redis.stderr.log"), "w") as f:
+            f.writelines(
+                f"{line}\n"
+                for _, line in sorted(node.stderr, key=lambda entry: entry[0])
+            )
+        with open(os.path.join(node_dir, "redis.stdout.log"), "w") as f:
+            f.writelines(
+                f"{_redis_log_line(time, role, message)}\n"
+                for time, message in sorted(node.stdout, key=lambda entry: entry[0])
+            )
+        for file in NETWORK_FILES:
+            _write_network(
+                os.path.join(node_dir, file), np_rng, start_time, seconds, network_rate
+            )
+        with open(os.path.join(node_dir, "network-summary.yaml"), "w") as f:
+            f.writelines(
+                f"ClusterPacketsProcessed: {packets}\n"
+                for packets in np.cumsum(np_rng.integers(0, 1000, int(seconds)))
+            )
+
+    keys = {}
+    for node in cluster.values():
+        if node.is_master():
+            keys[node.port] = _write_latencies(
+                os.path.join(run_dir, f"latencies.{node.port}.csv"),
+                np_rng,
+                node.port,
+                start_time,
+                seconds,
+                rps,
+                threads,
+                clients,
+            )
+    # Replicas have the same keys as their master.
+    for node in cluster.values():
+        _write_rdb(
+            os.path.join(cluster_dir, str(node.port), "dump.rdb"),
+            keys[node.port if node.is_master() else node.master_port],
+        )
+
+    with open(os.path.join(cluster_dir, "cluster-status.yaml"), "w") as f:
+        for second in range(int(seconds)):
+            time = start_time + second
+            masters = [
+                masters for changed, masters in status_changes if changed <= time
+            ][-1]
+            yaml.dump(
+                {
+                    time: {
+                        port: {
+                            "role": "master" if master_port is None else "slave",
+                            "master_port": master_port,
+                        }
+                        for port, master_port in masters.items()
+                    }
+                },
+                f,
+            )
+
+    with open(os.path.join(run_dir, "experiment_objects.yaml"), "w") as f:
+        yaml.dump(
+            {
+                "name": os.path.basename(os.path.dirname(run_dir)),
+                "commit": f"{seed:040x}",
+                "patch_generation": {"patches": patches, "patch_paths": patch_paths},
+                "benchmark": {
+                    "name": "synthetic",
+                    "time_s": seconds,
+                    "clients": clients,
+                    "threads": threads,
+                    "framework_start_time": start_time,
+                    "framework_end_time": end_time,
+                },
+                "redis_cluster": {"status_every_s": 1},
+                "patch": {"method": "wfpatch"},
+                "failover": {"failover_after_s": failover_after_s},
+                "success": True,
+            },
+            f,
+            sort_keys=False,
+        )
+    open(os.path.join(run_dir, "SUCCESS"), "w").close()
+
+
+def generate(
+    output_dir: str,
+    experiments: int,
+    runs: int,
+    nodes: int,
+    seconds: float,
+    rps: int,
+    patches: int,
+    threads: int,
+    network_rate: int,
+    seed: int,
+):
+    for experiment in range(experiments):
+        for run in range(runs):
+            run_dir = os.path.join(output_dir, f"experiment-{experiment}", str(run))
+            print(run_dir)
+            generate_run(
+                run_dir,
+                seed + experiment * runs + run,
+                START_TIME + (experiment * runs + run) * (seconds + RUN_GAP_S),
+                nodes,
+                seconds,
+                rps,
+                patches,
+                threads,
+                network_rate,
+            )
+
+
+def _parse_arguments(input_args: List[str]) -> Namespace:
+    parser = ArgumentParser(
+        description="Write synthetic experiments (e.g. to benchmark beder2, see ingest_benchmark.py). Every master "
+        "gets a benchmark with its own latencies file."
+    )
+    parser.add_argument(
+        "--output",
+        help="The directory the experiments are written to (<output>/experiment-<n>/<run>).",
+        required=True,
+        type=str,
+    )
+    parser.add_argument(
+        "--experiments", help="The number of experiments.", type=int, default=1
+    )
+    parser.add_argument(
+        "--runs", help="The number of runs per experiment.", type=int, default=2
+    )
+    parser.add_argument(
+        "--nodes",
+        help="The number of Redis nodes per run. Half of them are masters, the others replicas.",
+        type=int,
+        default=4,
+    )
+    parser.add_argument(
+        "--seconds", help="The duration of every run.", type=float, default=60
+    )
+    parser.add_argument(
+        "--rps",
+        help="Requests per second of every benchmark (master).",
+        type=int,
+        default=10_000,
+    )
+    parser.add_argument(
+        "--patches", help="The number of patches per run.", type=int, default=2
+    )
+    parser.add_argument(
+        "--threads",
+        help="Threads per node (WfPatch entries per patch and thread).",
+        type=int,
+        default=4,
+    )
+    parser.add_argument(
+        "--network-rate",
+        help="Rows per second of every network and IO file.",
+        type=int,
+        default=100,
+    )
+    parser.add_argument("--seed", help="Seed of the random data.", type=int, default=0)
+    return parser.parse_args(input_args)
+
+
+def main(input_args: List[str]):
+    args = _parse_arguments(input_args)
+    generate(
+        args.output,
+        args.experiments,
+        args.runs,
+        args.nodes,
+        args.seconds,
+        args.rps,
+        args.patches,
+        args.threads,
+        args.network_rate,
+        args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
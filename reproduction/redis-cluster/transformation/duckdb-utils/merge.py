@@ -5,12 +5,27 @@ import subprocess
 import sys
 import tempfile
 from argparse import ArgumentParser, Namespace
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import duckdb
 
 SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
 
 DOWNLOAD_DUCKDB_VERSION_SCRIPT = os.path.join(SCRIPT_DIR, "download-duckdb-version")
 
+# The merge itself runs in the DuckDB version of the Python module. Files of other versions are converted with the
+# DuckDB CLI of their version (EXPORT DATABASE as Parquet, IMPORT DATABASE with the other version).
+ENGINE_VERSION = duckdb.__version__
+
+# Tables with this column are merged per run. Whether a run is merged is decided once against the run table of the
+# destination: Runs it already contains are skipped in all tables, so a run is never merged partially.
+RUN_ID = "run_id"
+RUN_TABLE = "run"
+
+# Alias of the attached source database
+SOURCE = "source"
+
 
 def download_duckdb_version(version: str) -> str:
     print(f"Downloading DuckDB v{version}..")
@@ -18,82 +33,257 @@ def download_duckdb_version(version: str) -> str:
     return os.path.join(SCRIPT_DIR, f"duckdb-{version}")
 
 
+def _escape(value: str) -> str:
+    return value.replace("'", "''")
+
+
+def _export_parquet(version: str, database_file: str, export_dir: str) -> None:
+    export_sql = f"EXPORT DATABASE '{_escape(export_dir)}' (FORMAT PARQUET)"
+    if version == ENGINE_VERSION:
+        con = duckdb.connect(database_file, read_only=True)
+        try:
+            con.execute(export_sql)
+        finally:
+            con.close()
+        return
+    export_cmd = [
+        download_duckdb_version(version),
+        database_file,
+        "-readonly",
+        "-c",
+        export_sql,
+    ]
+    print(export_cmd)
+    subprocess.run(export_cmd, check=True)
+
+
+def _import_parquet(version: str, database_file: str, export_dir: str) -> None:
+    import_sql = f"IMPORT DATABASE '{_escape(export_dir)}'"
+    if version == ENGINE_VERSION:
+        con = duckdb.connect(database_file)
+        try:
+            con.execute(import_sql)
+        finally:
+            con.close()
+        return
+    import_cmd = [download_duckdb_version(version), database_file, "-c", import_sql]
+    print(import_cmd)
+    subprocess.run(import_cmd, check=True)
+
+
+def convert(
+    source_version: str,
+    source_file: str,
+    destination_version: str,
+    destination_file: str,
+) -> None:
+    print(f"Converting {source_file} (v{source_version}) to v{destination_version}")
+    with tempfile.TemporaryDirectory() as export_dir:
+        _export_parquet(source_version, source_file, export_dir)
+        _import_parquet(destination_version, destination_file, export_dir)
+
+
+def _merge_table(
+    con: duckdb.DuckDBPyConnection,
+    destination: str,
+    table: str,
+    create_sql: Optional[str],
+    new_runs: List[str],
+) -> None:
+    # Every table has its own cursor, so tables are inserted in parallel.
+    cursor = con.cursor()
+    try:
+        if create_sql is not None:
+            cursor.execute(create_sql)
+        source_columns = _columns(cursor, table)
+        columns = ", ".join(f'"{column}"' for column in source_columns)
+        # Tables without runs (e.g. content-addressed objects) only get the rows they do not contain yet.
+        query = f'SELECT {columns} FROM {SOURCE}."{table}" EXCEPT SELECT {columns} FROM "{destination}"."{table}"'
+        parameters: List[List[str]] = []
+        if RUN_ID in source_columns:
+            # Rows without a run are treated like rows of a table without runs.
+            query = (
+                f'SELECT {columns} FROM {SOURCE}."{table}" WHERE {RUN_ID} IN (SELECT UNNEST(?::VARCHAR[])) '
+                f'UNION ALL (SELECT {columns} FROM {SOURCE}."{table}" WHERE {RUN_ID} IS NULL '
+                f'EXCEPT SELECT {columns} FROM "{destination}"."{table}")'
+            )
+            parameters = [new_runs]
+        rows = cursor.execute(
+            f'INSERT INTO "{destination}"."{table}" ({columns}) {query};', parameters
+        ).fetchone()[0]
+        print(f"{table}: {rows} rows")
+    finally:
+        cursor.close()
+
+
+def _columns(con: duckdb.DuckDBPyConnection, table: str) -> List[str]:
+    # Columns of a table of the source
+    return [
+        column
+        for column, in con.execute(
+            "SELECT column_name FROM duckdb_columns() WHERE database_name = ? AND schema_name = 'main' "
+            "AND table_name = ? ORDER BY column_index;",
+            [SOURCE, table],
+        ).fetchall()
+    ]
+
+
+def _objects(
+    con: duckdb.DuckDBPyConnection, catalog: str, name_column: str, database: str
+) -> Dict[str, Optional[str]]:
+    # Name and CREATE statement of the tables, indexes or views of the main schema of an attached database
+    return dict(
+        con.execute(
+            f"SELECT {name_column}, sql FROM {catalog} WHERE database_name = ? AND schema_name = 'main';",
+            [database],
+        ).fetchall()
+    )
+
+
+def _new_runs(
+    con: duckdb.DuckDBPyConnection,
+    destination: str,
+    tables: Dict[str, Optional[str]],
+    existing_tables: Dict[str, Optional[str]],
+) -> List[str]:
+    # Runs of the source that the run table of the destination does not contain. Without a run table in the source,
+    # the runs are the run IDs of all its tables.
+    if RUN_TABLE in tables:
+        source_runs = f"SELECT {RUN_ID} FROM {SOURCE}.{RUN_TABLE}"
+    else:
+        source_runs = " UNION ".join(
+            f'SELECT {RUN_ID} FROM {SOURCE}."{table}"'
+            for table in tables
+            if RUN_ID in _columns(con, table)
+        )
+        if source_runs == "":
+            return []
+    existing_runs = (
+        f'AND NOT EXISTS (SELECT 1 FROM "{destination}".{RUN_TABLE} AS d WHERE d.{RUN_ID} = s.{RUN_ID})'
+        if RUN_TABLE in existing_tables
+        else ""
+    )
+    return [
+        run_id
+        for run_id, in con.execute(
+            f"SELECT DISTINCT {RUN_ID} FROM ({source_runs}) AS s WHERE {RUN_ID} IS NOT NULL {existing_runs};"
+        ).fetchall()
+    ]
+
+
+def merge_src_into_dst(
+    con: duckdb.DuckDBPyConnection, source_file: str, jobs: int
+) -> None:
+    print("###" * 10)
+    print(f"Merging {source_file}")
+    con.execute(f"ATTACH '{_escape(source_file)}' AS {SOURCE} (READ_ONLY);")
+    try:
+        other_schemas = con.execute(
+            "SELECT DISTINCT schema_name FROM duckdb_tables() WHERE database_name = ? AND schema_name != 'main';",
+            [SOURCE],
+        ).fetchall()
+        if len(other_schemas) > 0:
+            raise ValueError(
+                f"{source_file} contains tables outside of the main schema ({other_schemas}). "
+                "Only the main schema is merged."
+            )
+
+        # The database of the destination file is named after the file.
+        destination = con.execute("SELECT current_database();").fetchone()[0]
+        tables = _objects(con, "duckdb_tables()", "table_name", SOURCE)
+        views = _objects(con, "duckdb_views()", "view_name", SOURCE)
+        existing_tables = _objects(con, "duckdb_tables()", "table_name", destination)
+        existing_views = _objects(con, "duckdb_views()", "view_name", destination)
+        new_runs = _new_runs(con, destination, tables, existing_tables)
+        print(f"{len(new_runs)} new runs")
+
+        # A name may be a table in one database and a view in the other, e.g. beder2 replaced the patch_elf table by
+        # a view over patch_elf_file and patch_elf_object. Tables are only merged into tables and views only created
+        # if the name is free. beder2 migrates such tables whenever it loads into the database (e.g. with
+        # --incremental), so merge databases with the same schema to keep all data.
+        for table in [table for table in tables if table in existing_views]:
+            print(
+                f"Warning: {table} is a table in {source_file} but a view in the output. The table is not merged."
+            )
+        for view in [view for view in views if view in existing_tables]:
+            print(
+                f"Warning: {view} is a view in {source_file} but a table in the output. The view is not created."
+            )
+
+        # Independent tables are inserted in parallel. Indexes and views are created afterwards, so they neither slow
+        # down the inserts nor reference tables that do not exist yet.
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = [
+                pool.submit(
+                    _merge_table,
+                    con,
+                    destination,
+                    table,
+                    create_sql if table not in existing_tables else None,
+                    new_runs,
+                )
+                for table, create_sql in tables.items()
+                if table not in existing_views
+            ]
+            for future in futures:
+                future.result()
+
+        existing_indexes = _objects(con, "duckdb_indexes()", "index_name", destination)
+        for index, create_sql in _objects(
+            con, "duckdb_indexes()", "index_name", SOURCE
+        ).items():
+            if index not in existing_indexes and create_sql is not None:
+                con.execute(create_sql)
+        for view, create_sql in views.items():
+            if view not in existing_views and view not in existing_tables:
+                con.execute(create_sql)
+    finally:
+        con.execute(f"DETACH {SOURCE};")
+
+
 def merge(
     source_version: str,
     source_files: List[str],
     destination_version: str,
     destination_file: str,
+    jobs: int,
 ) -> None:
-    source_duckdb_file = download_duckdb_version(source_version)
-    destination_duckdb_file = download_duckdb_version(destination_version)
-
-    if not os.path.exists(destination_file) and source_version == destination_version:
-        # Special case: If source and target version are the same AND the file to merge into does not exist yet,
-        # use the first (biggest) source file as a basis.
-        print(f"Using {source_files[0]} as a basis for the output.")
-        shutil.copyfile(source_files[0], destination_file)
-        source_files = source_files[1:]
-
-    def merge_src_into_dst(source_file: str):
-        print("###" * 10)
-        print(f"Merging {source_file}")
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            export_cmd = [
-                source_duckdb_file,
-                source_file,
-                "-readonly",
-                "-c",
-                f"EXPORT DATABASE '{tmp_dir}'",
-            ]
-            print(export_cmd)
-            subprocess.run(export_cmd, check=True)
-
-            def load(check_for_error=True):
-                load_cmd = [
-                    destination_duckdb_file,
-                    destination_file,
-                    "-no-stdin",
-                    "-init",
-                    os.path.join(tmp_dir, "load.sql"),
-                ]
-                print(load_cmd)
-                proc = subprocess.run(
-                    load_cmd,
-                    check=True,
-                    stdout=subprocess.PIPE if check_for_error else None,
-                    stderr=subprocess.PIPE if check_for_error else None,
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(destination_file)) as tmp_dir:
+        # The merge always writes a file of the engine version. It is converted to the destination version at the
+        # end.
+        if destination_version == ENGINE_VERSION:
+            merge_file = destination_file
+        else:
+            merge_file = os.path.join(tmp_dir, "merge.duckdb")
+            if os.path.exists(destination_file):
+                convert(
+                    destination_version, destination_file, ENGINE_VERSION, merge_file
                 )
 
-                if check_for_error:
-                    error = proc.stderr.decode("UTF-8")
-                    if "Error:" in error:
-                        print("Error while loading data..")
-                        raise subprocess.CalledProcessError(
-                            1, " ".join(load_cmd), stderr=error
-                        )
-
-            try:
-                # Try to load data
-                load()
-            except subprocess.CalledProcessError:
-                print(
-                    "Loading data failed. Maybe schema was not created. Creating schema..."
-                )
-                # Schema may not exists, try to create schema first and load again
-                schema_cmd = [
-                    destination_duckdb_file,
-                    destination_file,
-                    "-no-stdin",
-                    "-init",
-                    os.path.join(tmp_dir, "schema.sql"),
-                ]
-                print(schema_cmd)
-                subprocess.run(schema_cmd, check=True)
+        if not os.path.exists(merge_file) and source_version == ENGINE_VERSION:
+            # Special case: If the source has the engine version AND the file to merge into does not exist yet,
+            # use the first (biggest) source file as a basis.
+            print(f"Using {source_files[0]} as a basis for the output.")
+            shutil.copyfile(source_files[0], merge_file)
+            source_files = source_files[1:]
 
-                load()
+        con = duckdb.connect(merge_file)
+        try:
+            for src_file in source_files:
+                if source_version == ENGINE_VERSION:
+                    merge_src_into_dst(con, src_file, jobs)
+                    continue
+                converted_file = os.path.join(tmp_dir, "source.duckdb")
+                convert(source_version, src_file, ENGINE_VERSION, converted_file)
+                merge_src_into_dst(con, converted_file, jobs)
+                os.remove(converted_file)
+        finally:
+            con.close()
 
-    for src_file in source_files:
-        merge_src_into_dst(src_file)
+        if merge_file != destination_file:
+            if os.path.exists(destination_file):
+                os.remove(destination_file)
+            convert(ENGINE_VERSION, merge_file, destination_version, destination_file)
 
 
 def parse_args(input_args: List[str]) -> Namespace:
@@ -123,6 +313,12 @@ def parse_args(input_args: List[str]) -> Namespace:
         help="The output file in which all DuckDB files are merged into. "
         "--destination-version defines the version of this file.",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="The number of tables that are merged in parallel.",
+    )
     return parser.parse_args(input_args)
 
 
@@ -145,7 +341,13 @@ def main(input_args: List[str]) -> None:
     database_files = sorted(database_files, key=os.path.getsize, reverse=True)
     print(f"Using database files: {database_files}")
 
-    merge(args.source_version, database_files, args.destination_version, output_file)
+    merge(
+        args.source_version,
+        database_files,
+        args.destination_version,
+        output_file,
+        args.jobs,
+    )
 
 
 if __name__ == "__main__":